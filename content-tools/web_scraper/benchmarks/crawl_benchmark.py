@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Crawl benchmark: every spider against local synthetic sites
+
+Serves help-center and marketing sites of the requested sizes from a local
+HTTP server (see synthetic_sites.py) and runs each spider against them, in
+its own process and a throwaway copy of the project so the real
+knowledge-base and HTTP cache are left alone. Politeness delays and the
+adaptive throttle are off: this measures the crawler, not the sites.
+
+Each run records pages per second, peak RSS and output bytes, with the git
+commit, to a JSON-lines results file, and is compared with the latest run
+of the same spider and size at another commit:
+
+    python benchmarks/crawl_benchmark.py                          # all spiders, 100 and 1,000 pages
+    python benchmarks/crawl_benchmark.py support_spider --sizes 100 10000 100000
+    python benchmarks/crawl_benchmark.py --results /tmp/bench.jsonl --keep
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from synthetic_sites import HELP_CENTER, MARKETING, serve
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.jsonl')
+
+# The host each spider crawls, the kind of site it is and the spider arguments
+SPIDERS = {
+    'universal_spider': {
+        'host': 'www.example-competitor.com',
+        'kind': MARKETING,
+        'args': {
+            'website_name': 'benchmark',
+            'start_url': 'https://www.example-competitor.com/',
+            'allowed_domains': 'example-competitor.com'
+        }
+    },
+    'brightmove_spider': {'host': 'brightmove.com', 'kind': MARKETING, 'args': {}},
+    'support_spider': {'host': 'support.brightmove.com', 'kind': HELP_CENTER, 'args': {}},
+    'inovium_spider': {'host': 'www.inovium.com', 'kind': MARKETING, 'args': {}}
+}
+
+# Crawl as fast as the local server allows, from a cold start
+BENCHMARK_SETTINGS = {
+    'ROBOTSTXT_OBEY': False,
+    'DOWNLOAD_DELAY': 0,
+    'ADAPTIVE_THROTTLE_ENABLED': False,
+    'RESUMABLE_CRAWLS': False,
+    'TELNETCONSOLE_ENABLED': False,
+    'LOG_LEVEL': 'WARNING'
+}
+
+
+def git_commit():
+    """Short commit hash of the project, with '+dirty' for uncommitted changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--', '.'], cwd=PROJECT_DIR,
+                               capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ('+dirty' if dirty else '')
+
+
+def copy_project(run_dir):
+    """Copy scrapy.cfg and the web_scraper package into a run directory"""
+    project = os.path.join(run_dir, 'project')
+    os.makedirs(project)
+    shutil.copy(os.path.join(PROJECT_DIR, 'scrapy.cfg'), project)
+    shutil.copytree(os.path.join(PROJECT_DIR, 'web_scraper'), os.path.join(project, 'web_scraper'),
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    return project
+
+
+def tree_bytes(*paths):
+    total = 0
+    for path in paths:
+        for root, _, files in os.walk(path):
+            total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+def run_worker(spec):
+    """Inside the benchmark process: run one spider in the project copy"""
+    os.chdir(spec['project'])
+    sys.path.insert(0, spec['project'])
+    os.environ['SCRAPY_SETTINGS_MODULE'] = 'web_scraper.settings'
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    settings.setdict(BENCHMARK_SETTINGS, priority='cmdline')
+    settings.setdict({
+        'CONCURRENT_REQUESTS': spec['concurrency'],
+        'CONCURRENT_REQUESTS_PER_DOMAIN': spec['concurrency'],
+        'BENCHMARK_SITE_URL': spec['site_url'],
+        'BENCHMARK_HOSTS': spec['hosts'],
+        'DOWNLOADER_MIDDLEWARES': dict(settings.getdict('DOWNLOADER_MIDDLEWARES'),
+                                       **{'synthetic_sites.LocalSiteMiddleware': 1})
+    }, priority='cmdline')
+    process = CrawlerProcess(settings)
+    crawler = process.create_crawler(spec['spider'])
+    process.crawl(crawler, **spec['args'])
+    process.start()
+    stats = crawler.stats.get_stats()
+    print(json.dumps({
+        'pages': stats.get('response_received_count', 0),
+        'items': stats.get('item_scraped_count', 0),
+        'seconds': (stats['finish_time'] - stats['start_time']).total_seconds(),
+        'finish_reason': stats.get('finish_reason')
+    }))
+
+
+def run_benchmark(spider, size, site_url, concurrency, keep):
+    """Run one spider in a child process; returns its result record"""
+    run_dir = tempfile.mkdtemp(prefix=f'bench-{spider}-{size}-')
+    try:
+        project = copy_project(run_dir)
+        spec = {
+            'spider': spider,
+            'args': SPIDERS[spider]['args'],
+            'project': project,
+            'site_url': site_url,
+            'hosts': [config['host'] for config in SPIDERS.values()],
+            'concurrency': concurrency
+        }
+        log_path = os.path.join(run_dir, 'crawl.log')
+        started = time.monotonic()
+        with open(log_path, 'w') as log:
+            process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--worker', json.dumps(spec)],
+                                       stdout=subprocess.PIPE, stderr=log, text=True)
+            output = process.stdout.read()
+            # wait4 gives the resource usage of this child alone
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+        wall = time.monotonic() - started
+
+        lines = output.strip().splitlines()
+        if process.returncode != 0 or not lines:
+            with open(log_path) as log:
+                tail = log.read()[-2000:]
+            raise RuntimeError(f"{spider} exited with {process.returncode}:\n{tail}")
+        crawl = json.loads(lines[-1])
+
+        # Inovium writes its knowledge-base one level above the project
+        output_bytes = tree_bytes(os.path.join(project, 'knowledge-base'), os.path.join(run_dir, 'knowledge-base'))
+        return {
+            'commit': git_commit(),
+            'recorded_at': datetime.now().isoformat(timespec='seconds'),
+            'spider': spider,
+            'size': size,
+            'pages': crawl['pages'],
+            'items': crawl['items'],
+            'finish_reason': crawl['finish_reason'],
+            'seconds': round(crawl['seconds'], 3),
+            'wall_seconds': round(wall, 3),
+            'pages_per_second': round(crawl['pages'] / crawl['seconds'], 1) if crawl['seconds'] else None,
+            # ru_maxrss is in kilobytes on Linux and bytes on macOS
+            'peak_rss_mb': round(usage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+            'output_bytes': output_bytes,
+            'cache_bytes': tree_bytes(os.path.join(project, '.scrapy')),
+            'concurrency': concurrency,
+            'python': platform.python_version(),
+            'machine': platform.node()
+        }
+    finally:
+        if keep:
+            print(f"   kept {run_dir}")
+        else:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+def load_results(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_result(results, result):
+    """Latest earlier result for the same spider and size at another commit"""
+    for earlier in reversed(results):
+        if (earlier['spider'], earlier['size']) == (result['spider'], result['size']) \
+                and earlier.get('commit') != result['commit']:
+            return earlier
+    return None
+
+
+def change(now, before):
+    if not before:
+        return ''
+    return f" ({(now - before) / before * 100:+.0f}%)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the spiders against local synthetic sites')
+    parser.add_argument('spiders', nargs='*', help=f"Spiders to run: {', '.join(SPIDERS)} (default: all)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000], help='Site sizes in pages (100 to 100000)')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent requests')
+    parser.add_argument('--results', default=DEFAULT_RESULTS, help='JSON-lines file the results are appended to')
+    parser.add_argument('--keep', action='store_true', help='Keep the run directories (logs and outputs)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(json.loads(args.worker))
+        return 0
+
+    spiders = args.spiders or list(SPIDERS)
+    unknown = [spider for spider in spiders if spider not in SPIDERS]
+    if unknown:
+        print(f"❌ Unknown spiders: {', '.join(unknown)}")
+        return 1
+    earlier = load_results(args.results)
+    print(f"🏁 Benchmarking {', '.join(spiders)} at {', '.join(f'{size:,}' for size in args.sizes)} pages")
+    print("=" * 50)
+
+    failed = 0
+    for size in args.sizes:
+        server = serve({config['host']: (config['kind'], size) for config in SPIDERS.values()})
+        site_url = f"http://127.0.0.1:{server.server_port}"
+        try:
+            for spider in spiders:
+                try:
+                    result = run_benchmark(spider, size, site_url, args.concurrency, args.keep)
+                except RuntimeError as e:
+                    failed += 1
+                    print(f"❌ {spider} @ {size:,}: {e}")
+                    continue
+                before = previous_result(earlier, result) or {}
+                print(f"✅ {spider} @ {size:,}: {result['pages']:,} pages in {result['seconds']:.1f}s, "
+                      f"{result['pages_per_second']} pages/s{change(result['pages_per_second'], before.get('pages_per_second'))}, "
+                      f"peak RSS {result['peak_rss_mb']} MB{change(result['peak_rss_mb'], before.get('peak_rss_mb'))}, "
+                      f"output {result['output_bytes'] / 1024:,.0f} KB{change(result['output_bytes'], before.get('output_bytes'))}")
+                if before:
+                    print(f"   compared with {before['commit']} ({before['recorded_at']})")
+                with open(args.results, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(result) + '\n')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    print(f"\n📊 Results appended to {args.results}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: parse CPU per page for the old response.css() extraction
+versus the single-pass extract_page()
+
+Usage:
+    python benchmarks/extraction_benchmark.py saved_pages/ [more.html ...]
+
+Save some support-site article pages first, e.g.
+    curl -o saved_pages/article.html https://support.brightmove.com/en/articles/...
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scrapy.http import HtmlResponse
+
+from web_scraper.extraction import extract_page
+
+
+def css_extract(response):
+    """The selectors support_spider ran per article page before extract_page()"""
+    return {
+        'title': response.css('title::text').get(),
+        'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
+        'paragraphs': [p.strip() for p in response.css('p::text').getall() if p.strip()],
+        'lists': [l.strip() for l in response.css('ul li::text, ol li::text').getall() if l.strip()],
+        'code_blocks': [c.strip() for c in response.css('code::text, pre::text').getall() if c.strip()],
+        'images': [img.strip() for img in response.css('img::attr(alt)').getall() if img.strip()],
+        'links': response.css('a::attr(href)').getall()
+    }
+
+
+def load_pages(paths):
+    """Read HTML files (or every .html file in a directory) into memory"""
+    pages = []
+    for path in paths:
+        files = sorted(glob.glob(os.path.join(path, '*.html'))) if os.path.isdir(path) else [path]
+        for file_path in files:
+            with open(file_path, 'rb') as f:
+                pages.append((file_path, f.read()))
+    return pages
+
+
+def time_extractor(pages, extractor, rounds):
+    """CPU seconds per page, parsing included, best of the rounds"""
+    best = None
+    for _ in range(rounds):
+        start = time.process_time()
+        for file_path, body in pages:
+            # A fresh response per call so the lxml parse is part of the cost
+            response = HtmlResponse(url='https://support.brightmove.com/en/articles/benchmark', body=body, encoding='utf-8')
+            extractor(response)
+        elapsed = (time.process_time() - start) / len(pages)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark page extraction CPU per page')
+    parser.add_argument('paths', nargs='+', help='Saved HTML files or directories of .html files')
+    parser.add_argument('--rounds', type=int, default=5, help='Timed rounds; the best one is reported')
+    parser.add_argument('--repeat', type=int, default=20, help='Times each page is extracted per round')
+    args = parser.parse_args()
+
+    pages = load_pages(args.paths) * args.repeat
+    if not pages:
+        print("❌ No HTML pages found")
+        return 1
+
+    def parse_only(response):
+        response.selector
+
+    results = [
+        ('parse only', time_extractor(pages, parse_only, args.rounds)),
+        ('response.css (before)', time_extractor(pages, css_extract, args.rounds)),
+        ('extract_page (after)', time_extractor(pages, extract_page, args.rounds))
+    ]
+
+    print(f"📄 {len(pages) // args.repeat} page(s), {args.repeat} repeats, best of {args.rounds} rounds")
+    print("=" * 50)
+    for label, seconds in results:
+        print(f"{label:<24} {seconds * 1000:8.2f} ms CPU/page")
+    print("=" * 50)
+    before, after = results[1][1], results[2][1]
+    print(f"⚡ Speed-up: {before / after:.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
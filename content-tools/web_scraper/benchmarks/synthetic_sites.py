@@ -0,0 +1,296 @@
+"""
+Synthetic websites shaped like the ones the spiders crawl, served locally
+
+Pages are generated on request from their path, so a 100,000-page site
+costs no disk and every run serves identical HTML:
+
+- a help center (support.brightmove.com): /en/ lists collections, each
+  collection lists its articles, and articles have headings, paragraphs,
+  steps, code samples and related-article links carrying tracking
+  parameters, plus locale and search links the URL policy must reject;
+- marketing sites (brightmove.com, www.inovium.com, a competitor): every
+  page carries a large header and footer navigation and the same
+  announcement, company blurb, office list and legal text, and the home
+  page links to every page, the way the marketing-site spiders discover
+  them. It also links every tenth page a second time with a campaign query
+  string, which serves the same page: a near duplicate.
+
+All hosts are served by one HTTP server under /<host>/<path>;
+LocalSiteMiddleware sends the spiders' requests for those hosts there and
+gives the responses back their original URLs, so the spiders' own domain
+checks and URL policies run unchanged.
+"""
+
+import random
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+HELP_CENTER = 'help_center'
+MARKETING = 'marketing'
+
+WORDS = (
+    'candidate job posting applicant pipeline recruiter resume interview offer '
+    'workflow report dashboard integration email calendar onboarding client '
+    'placement timesheet invoice permission user role field search filter export '
+    'staffing talent sourcing compliance payroll analytics automation portal'
+).split()
+
+# Marketing site sections, matching the category keywords of the spiders
+SECTIONS = (
+    'features', 'solutions', 'pricing', 'testimonials', 'case-studies', 'products',
+    'services', 'about', 'blog', 'integrations', 'api', 'team', 'partners', 'careers'
+)
+
+# Articles per help center collection
+ARTICLES_PER_COLLECTION = 50
+
+# Every this many marketing pages, the home page also links a campaign variant
+CAMPAIGN_EVERY = 10
+
+
+def _rng(*parts):
+    return random.Random(zlib.crc32('/'.join(str(part) for part in parts).encode('utf-8')))
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _title(rng, words=4):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).title()
+
+
+def _slug(title):
+    return title.lower().replace(' ', '-')
+
+
+def _page(title, body, description=''):
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{title}</title>'
+        f'<meta name="description" content="{description}"><meta name="keywords" content="{title.lower()}">'
+        f'</head><body>{body}</body></html>'
+    )
+
+
+class HelpCenter:
+    """A help center of collections and articles, `size` pages in all"""
+
+    def __init__(self, host, size):
+        self.host = host
+        self.collections = max(1, size // (ARTICLES_PER_COLLECTION + 1))
+        self.articles = max(0, size - 1 - self.collections)
+
+    def collection_url(self, number):
+        return f"/en/collections/{number}-{_slug(_title(_rng(self.host, 'c', number), 2))}"
+
+    def article_url(self, number):
+        return f"/en/articles/{number}-{_slug(_title(_rng(self.host, 'a', number)))}"
+
+    def render(self, path):
+        if path in ('/en', '/en/'):
+            return self.home()
+        parts = path.strip('/').split('/')
+        if len(parts) == 3 and parts[0] == 'en' and parts[2].split('-')[0].isdigit():
+            number = int(parts[2].split('-')[0])
+            if parts[1] == 'collections' and number < self.collections:
+                return self.collection(number)
+            if parts[1] == 'articles' and number < self.articles:
+                return self.article(number)
+        return None
+
+    def home(self):
+        links = ''.join(
+            f'<li><a class="collection-link" href="{self.collection_url(c)}">{_title(_rng(self.host, "c", c), 2)}</a></li>'
+            for c in range(self.collections)
+        )
+        body = (
+            '<header><nav><a href="/en/">Help Center</a><a href="/fr/">Français</a><a href="/de/">Deutsch</a>'
+            '<a href="https://brightmove.com/">BrightMove</a></nav></header>'
+            '<h1>How can we help?</h1><form action="/en/search"><input name="q" placeholder="Search for articles..."></form>'
+            f'<p>Advice and answers from the BrightMove team.</p><ul class="collections">{links}</ul>'
+        )
+        return _page('BrightMove Help Center', body, 'Advice and answers from the BrightMove team')
+
+    def collection(self, number):
+        rng = _rng(self.host, 'c', number)
+        name = _title(rng, 2)
+        articles = range(number, self.articles, self.collections)
+        links = ''.join(
+            f'<div class="article-link"><a href="{self.article_url(a)}">{_title(_rng(self.host, "a", a))}</a>'
+            f'<p>{_sentence(_rng(self.host, "s", a), 12)}</p></div>'
+            for a in articles
+        )
+        body = (
+            f'<nav class="breadcrumbs"><a href="/en/">All collections</a></nav><h1>{name}</h1>'
+            f'<p>{_sentence(rng, 15)}</p><p>{len(articles)} articles</p>{links}'
+        )
+        return _page(f'{name} | BrightMove Help Center', body)
+
+    def article(self, number):
+        rng = _rng(self.host, 'a', number)
+        title = _title(rng)
+        collection = number % self.collections
+        sections = []
+        for _ in range(rng.randint(2, 5)):
+            paragraphs = ''.join(f'<p>{_sentence(rng, rng.randint(15, 40))}</p>' for _ in range(rng.randint(2, 5)))
+            steps = ''.join(f'<li>{_sentence(rng, 8)}</li>' for _ in range(rng.randint(0, 6)))
+            sections.append(f'<h2>{_title(rng, 3)}</h2>{paragraphs}' + (f'<ol>{steps}</ol>' if steps else ''))
+        if number % 7 == 0:
+            sections.append(f'<pre><code>GET /api/v1/{rng.choice(WORDS)}s?page=1</code></pre>')
+        related = ''.join(
+            f'<li><a href="{self.article_url(other)}?utm_source=related#top">{_title(_rng(self.host, "a", other))}</a></li>'
+            for other in (rng.randrange(self.articles) for _ in range(3 if self.articles else 0))
+        )
+        body = (
+            f'<nav class="breadcrumbs"><a href="/en/">All collections</a> '
+            f'<a href="{self.collection_url(collection)}">{_title(_rng(self.host, "c", collection), 2)}</a></nav>'
+            f'<article><h1>{title}</h1><img src="/static/{number}.png" alt="{title} screenshot">{"".join(sections)}</article>'
+            f'<aside><h3>Related articles</h3><ul>{related}</ul></aside>'
+            f'<footer><a href="/en/search?q={rng.choice(WORDS)}">Search</a>'
+            f'<a href="/fr/articles/{number}">Français</a><a href="mailto:support@brightmove.com">Contact</a></footer>'
+        )
+        return _page(f'{title} | BrightMove Help Center', body, _sentence(rng, 12))
+
+
+class MarketingSite:
+    """A marketing site with nav-heavy pages, `size` pages in all"""
+
+    def __init__(self, host, size):
+        self.host = host
+        self.pages = max(0, size - 1)
+
+    def page_url(self, number):
+        section = SECTIONS[number % len(SECTIONS)]
+        return f"/{section}/{_slug(_title(_rng(self.host, 'p', number), 3))}-{number}"
+
+    def render(self, path):
+        if path in ('', '/'):
+            return self.home()
+        parts = path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] in SECTIONS:
+            number = parts[1].rsplit('-', 1)[-1]
+            if number.isdigit() and int(number) < self.pages and self.page_url(int(number)) == path.rstrip('/'):
+                return self.page(int(number))
+        return None
+
+    def campaign_url(self, number):
+        """A query-string variant of a page, which serves the same page"""
+        return f"{self.page_url(number)}?utm_campaign=spring"
+
+    def chrome(self):
+        """Header and footer repeated on every page: navigation, and the same text blocks"""
+        site = _rng(self.host, 'chrome')
+        header = ''.join(
+            f'<li><a href="{self.page_url(n)}">{SECTIONS[n % len(SECTIONS)].replace("-", " ").title()}</a></li>'
+            for n in range(min(self.pages, 30))
+        )
+        footer = ''.join(
+            f'<li><a href="{self.page_url(n)}">{_title(_rng(self.host, "p", n), 3)}</a></li>'
+            for n in range(min(self.pages, 40))
+        )
+        offices = ''.join(f'<li>{_title(site, 2)} office</li>' for _ in range(4))
+        return (
+            f'<header><p class="announcement">{_sentence(site, 12)}</p><nav><ul class="menu">{header}</ul></nav>'
+            f'<a class="cta" href="/pricing/">Request a demo</a></header>',
+            f'<footer><nav><ul>{footer}</ul></nav><p>{_sentence(site, 30)}</p><ul class="offices">{offices}</ul>'
+            f'<p>Copyright {self.host}. All rights reserved.</p>'
+            f'<a href="mailto:sales@{self.host}">Contact sales</a><a href="javascript:void(0)">Chat</a></footer>'
+        )
+
+    def home(self):
+        rng = _rng(self.host, 'home')
+        header, footer = self.chrome()
+        directory = ''.join(f'<li><a href="{self.page_url(n)}">{_title(_rng(self.host, "p", n), 3)}</a></li>'
+                            for n in range(self.pages))
+        directory += ''.join(f'<li><a href="{self.campaign_url(n)}">{_title(_rng(self.host, "p", n), 3)}</a></li>'
+                             for n in range(0, self.pages, CAMPAIGN_EVERY))
+        body = (
+            f'{header}<section class="hero"><h1>{_title(rng, 5)}</h1><p>{_sentence(rng, 20)}</p>'
+            f'<button class="cta">Get started</button></section>'
+            f'<section class="features"><h2>Features</h2><ul>'
+            + ''.join(f'<li class="feature">{_sentence(rng, 8)}</li>' for _ in range(8)) +
+            f'</ul></section><section><h2>Explore</h2><ul class="directory">{directory}</ul></section>{footer}'
+        )
+        return _page(_title(rng, 3), body, _sentence(rng, 15))
+
+    def page(self, number):
+        rng = _rng(self.host, 'p', number)
+        title = _title(rng, 3)
+        header, footer = self.chrome()
+        paragraphs = ''.join(f'<p>{_sentence(rng, rng.randint(20, 50))}</p>' for _ in range(rng.randint(3, 8)))
+        bullets = ''.join(f'<li>{_sentence(rng, 7)}</li>' for _ in range(rng.randint(3, 10)))
+        quote = f'<blockquote class="testimonial">"{_sentence(rng, 20)}"</blockquote>' if number % 4 == 0 else ''
+        body = (
+            f'{header}<main><h1>{title}</h1><h2>{_title(rng, 4)}</h2>{paragraphs}<ul>{bullets}</ul>{quote}'
+            f'<h3>{_title(rng, 2)}</h3><p>{_sentence(rng, 25)}</p><a class="cta" href="/pricing/">Talk to us</a></main>{footer}'
+        )
+        return _page(title, body, _sentence(rng, 15))
+
+
+SITE_KINDS = {HELP_CENTER: HelpCenter, MARKETING: MarketingSite}
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    # {host: HelpCenter or MarketingSite}, set by serve()
+    sites = {}
+
+    def do_GET(self):
+        host, _, path = self.path.lstrip('/').partition('/')
+        site = self.sites.get(host)
+        html = site.render('/' + urlsplit(path).path) if site else None
+        if html is None:
+            self.send_error(404)
+            return
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(sites, port=0):
+    """Serve {host: (kind, size)} in a background thread; returns the server
+
+    The base URL to give LocalSiteMiddleware is http://127.0.0.1:<server.server_port>.
+    """
+    SiteHandler.sites = {host: SITE_KINDS[kind](host, size) for host, (kind, size) in sites.items()}
+    server = ThreadingHTTPServer(('127.0.0.1', port), SiteHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='synthetic-sites', daemon=True).start()
+    return server
+
+
+class LocalSiteMiddleware:
+    """Downloader middleware sending requests for the synthetic hosts to the local server
+
+    BENCHMARK_SITE_URL is the server's base URL and BENCHMARK_HOSTS the
+    hosts it serves. Install it first (priority 1), so a rewritten request
+    goes through the other middlewares only once and its response is
+    restored to its original URL last.
+    """
+
+    def __init__(self, base_url, hosts):
+        self.base_url = base_url.rstrip('/')
+        self.hosts = set(hosts)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings.get('BENCHMARK_SITE_URL'), crawler.settings.getlist('BENCHMARK_HOSTS'))
+
+    def process_request(self, request, spider):
+        parts = urlsplit(request.url)
+        if parts.hostname not in self.hosts or 'benchmark_url' in request.meta:
+            return None
+        local_url = f"{self.base_url}/{parts.hostname}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else '')
+        return request.replace(url=local_url, dont_filter=True, meta=dict(request.meta, benchmark_url=request.url))
+
+    def process_response(self, request, response, spider):
+        original = request.meta.get('benchmark_url')
+        return response.replace(url=original) if original else response
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Report on the link graphs of the scraped sites
+
+Every crawl saves the links between a site's pages, ranked with PageRank,
+to raw_data/link_graph.npz (see web_scraper.link_graph). This script lists
+each site's most linked-to pages and its orphans: pages that were crawled
+(from a sitemap, say) but that no other page of the site links to.
+
+    python link_report.py
+    python link_report.py --site brightmove/support --top 50
+    python link_report.py --orphans
+"""
+
+import argparse
+import os
+import sys
+
+from web_scraper.link_graph import graph_paths, load_link_graph, np
+
+
+def site_of(path):
+    """The site a graph belongs to: its directory under website_content"""
+    site_dir = os.path.dirname(os.path.dirname(path))
+    _, found, site = site_dir.rpartition(os.sep + 'website_content' + os.sep)
+    return site.replace(os.sep, '/') if found else site_dir
+
+
+def report(site, graph, top, orphans_only):
+    print(f"\n🕸️  {site}: {int(graph.fetched.sum())} pages crawled, {len(graph)} URLs, {graph.links} links")
+    print("-" * 50)
+    if not orphans_only:
+        print(f"Top {top} pages by PageRank:")
+        for number, (url, rank, in_degree) in enumerate(graph.top(top), 1):
+            print(f"{number:4}. {rank:.5f}  {in_degree:5} links in  {url}")
+    orphans = graph.orphans()
+    print(f"\nOrphaned pages ({len(orphans)}):")
+    for url in orphans:
+        print(f"  • {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Top pages and orphaned pages of each site's link graph")
+    parser.add_argument('--site', action='append', help='Only these sites, e.g. brightmove/support')
+    parser.add_argument('--top', type=int, default=20, help='Number of top pages to list')
+    parser.add_argument('--orphans', action='store_true', help='Only list the orphaned pages')
+    args = parser.parse_args()
+
+    if np is None:
+        print("❌ The link graphs need numpy (pip install numpy)")
+        sys.exit(1)
+
+    graphs = {site_of(path): path for path in graph_paths()}
+    if args.site:
+        graphs = {site: path for site, path in graphs.items() if site in args.site}
+    if not graphs:
+        print("❌ No link graph found; run a crawl first")
+        sys.exit(1)
+
+    for site, path in sorted(graphs.items()):
+        graph = load_link_graph(path)
+        if graph is None:
+            print(f"❌ {site}: cannot read {path}")
+            continue
+        report(site, graph, args.top, args.orphans)
+
+
+if __name__ == "__main__":
+    main()
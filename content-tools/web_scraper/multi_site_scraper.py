@@ -1,15 +1,51 @@
 #!/usr/bin/env python3
 """
 Multi-site web scraper for organizing content in knowledge-base
+
+Without a command it shows a menu; scheduled runs use the commands, which
+exit non-zero when a website fails and work from any directory:
+
+    python multi_site_scraper.py crawl                      # every website, one after the other
+    python multi_site_scraper.py crawl --concurrent --refresh
+    python multi_site_scraper.py crawl --site competitor1 --site partner1
+    python multi_site_scraper.py crawl --from-cache         # serve pages cached by earlier crawls
+    python multi_site_scraper.py list
 """
 
+import argparse
 import os
 import subprocess
 import sys
 import json
+import time
 from datetime import datetime
 
-# Website configurations
+from scrapy import signals
+from scrapy.crawler import CrawlerProcess
+from twisted.internet.error import ReactorNotRestartable
+
+# Let Scrapy find the project settings without changing directory
+os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'web_scraper.settings')
+
+from web_scraper.checkpoint import PROJECT_DIR
+from web_scraper.httpcache import serve_from_cache_settings
+from web_scraper.jobs import Job, create_crawler, project_settings
+from web_scraper.redis_frontier import shared_frontier_settings
+
+# universal_spider keeps its knowledge-base next to the project
+KNOWLEDGE_BASE_DIR = os.path.join(PROJECT_DIR, 'knowledge-base')
+
+# With a Redis URL here, every machine running this script shares each
+# website's frontier, so together they fetch every page once
+SHARED_FRONTIER_URL = os.environ.get('REDIS_FRONTIER_URL')
+
+# A refresh fetches this many of a website's known pages (or this share of
+# them), those most likely to have changed, and reuses the rest (see
+# web_scraper.revisit); a website's 'revisit_budget' overrides it
+DEFAULT_REVISIT_BUDGET = '10%'
+
+# Website configurations; a 'budget' caps a website's crawl (see
+# web_scraper.crawl_budget): pages, bytes, seconds and their soft_ variants
 WEBSITE_CONFIGS = {
     'brightmove': {
         'name': 'brightmove',
@@ -27,13 +63,15 @@ WEBSITE_CONFIGS = {
         'name': 'competitor1',
         'start_url': 'https://example-competitor.com',
         'allowed_domains': ['example-competitor.com'],
-        'category': 'competitors'
+        'category': 'competitors',
+        'budget': {'pages': 500, 'soft_pages': 400, 'seconds': 1800}
     },
     'partner1': {
         'name': 'partner1', 
         'start_url': 'https://example-partner.com',
         'allowed_domains': ['example-partner.com'],
-        'category': 'partners'
+        'category': 'partners',
+        'budget': {'pages': 500, 'soft_pages': 400, 'seconds': 1800}
     },
     'inovium': {
         'name': 'inovium',
@@ -45,7 +83,7 @@ WEBSITE_CONFIGS = {
 
 def create_knowledge_base_structure():
     """Create the main knowledge-base directory structure"""
-    knowledge_base = 'knowledge-base'
+    knowledge_base = KNOWLEDGE_BASE_DIR
     
     # Main directories
     main_dirs = [
@@ -74,23 +112,46 @@ def create_knowledge_base_structure():
     
     print("✅ Knowledge-base directory structure created")
 
-def run_spider(website_config):
-    """Run the universal spider for a specific website"""
-    print(f"🕷️  Scraping {website_config['name']}...")
+def website_job(website_config, refresh=False, from_cache=False):
+    """The universal_spider Job crawling a website
     
-    # Change to web_scraper directory
-    os.chdir('web_scraper')
+    refresh only revisits its likely changed pages; from_cache serves the
+    pages earlier crawls cached instead of fetching them again.
+    """
+    args = {
+        'website_name': website_config['name'],
+        'start_url': website_config['start_url'],
+        'allowed_domains': website_config['allowed_domains']
+    }
+    if website_config.get('sitemaps'):
+        args['sitemaps'] = True
+    if refresh:
+        args['revisit_budget'] = website_config.get('revisit_budget', DEFAULT_REVISIT_BUDGET)
+    settings = {}
+    if website_config.get('budget'):
+        settings['CRAWL_BUDGETS'] = {website_config['name']: website_config['budget']}
+    if SHARED_FRONTIER_URL:
+        settings.update(shared_frontier_settings(SHARED_FRONTIER_URL))
+    if from_cache:
+        settings.update(serve_from_cache_settings())
+    return Job('universal_spider', args, settings)
+
+def run_spider(website_config, refresh=False, from_cache=False):
+    """Run the universal spider for a specific website in a scrapy crawl process"""
+    print(f"🕷️  Scraping {website_config['name']}...")
     
     # Build the scrapy command with custom settings
-    cmd = [
-        'scrapy', 'crawl', 'universal_spider',
-        '-a', f"website_name={website_config['name']}",
-        '-a', f"start_url={website_config['start_url']}",
-        '-a', f"allowed_domains={','.join(website_config['allowed_domains'])}"
-    ]
+    job = website_job(website_config, refresh, from_cache)
+    cmd = ['scrapy', 'crawl', job.spider]
+    for name, value in job.args.items():
+        value = ','.join(value) if isinstance(value, list) else '1' if value is True else value
+        cmd += ['-a', f"{name}={value}"]
+    for name, value in job.settings.items():
+        cmd += ['-s', f"{name}={json.dumps(value) if isinstance(value, dict) else value}"]
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        # scrapy finds the project from scrapy.cfg in the working directory
+        result = subprocess.run(cmd, capture_output=True, text=True, cwd=PROJECT_DIR)
         
         if result.returncode == 0:
             print(f"✅ Successfully scraped {website_config['name']}")
@@ -104,12 +165,62 @@ def run_spider(website_config):
     except Exception as e:
         print(f"❌ Error scraping {website_config['name']}: {e}")
         return False
-    finally:
-        # Go back to main directory
-        os.chdir('..')
 
-def scrape_all_websites():
-    """Scrape all configured websites"""
+def run_spiders_in_process(website_configs, refresh=False, from_cache=False):
+    """Crawl several websites concurrently inside this process
+    
+    Every website gets its own crawler, and so its own downloader with the
+    project's per-domain politeness limits, but all of them share one reactor
+    and one Scrapy startup. Returns {website_id: success}.
+    """
+    process = CrawlerProcess(project_settings())
+    successes = {}
+    
+    def record_close(spider, reason, website_id):
+        successes[website_id] = reason == 'finished'
+    
+    def record_failure(failure, website_id):
+        print(f"❌ Error scraping {website_id}: {failure.getErrorMessage()}")
+        successes[website_id] = False
+    
+    for website_id, config in website_configs.items():
+        print(f"🕷️  Scheduling {config['name']}...")
+        job = website_job(config, refresh, from_cache)
+        crawler = create_crawler(process, job.spider, job.settings)
+        crawler.signals.connect(
+            lambda spider, reason, website_id=website_id: record_close(spider, reason, website_id),
+            signal=signals.spider_closed,
+            weak=False
+        )
+        d = process.crawl(crawler, **job.args)
+        d.addErrback(record_failure, website_id)
+    
+    # Blocks until every crawl has finished
+    try:
+        process.start()
+    except ReactorNotRestartable:
+        print("❌ In-process crawling can only run once per session; restart the scraper to crawl again")
+    return successes
+
+def load_crawl_summary(website_config):
+    """Read the fetched/unchanged/new page counts the spider wrote for a website"""
+    summary_file = os.path.join(KNOWLEDGE_BASE_DIR, 'website_content', website_config['name'], 'raw_data', 'crawl_summary.json')
+    if not os.path.exists(summary_file):
+        return {}
+    with open(summary_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def scrape_all_websites(concurrent=False, refresh=False, website_ids=None, from_cache=False):
+    """Scrape all configured websites, or those of website_ids
+    
+    With concurrent=True every website is crawled at the same time in this
+    process, so the run takes about as long as the slowest website instead of
+    the sum of all of them. The Twisted reactor cannot be restarted, so this
+    mode can only run once per process. With refresh=True each website only
+    fetches its revisit budget of pages, those most likely to have changed.
+    With from_cache=True pages cached by earlier crawls are served from the
+    HTTP cache instead of being fetched again.
+    """
     print("🚀 Starting multi-site web scraping")
     print("=" * 50)
     
@@ -117,18 +228,33 @@ def scrape_all_websites():
     create_knowledge_base_structure()
     
     results = {}
+    started = time.monotonic()
+    website_configs = {website_id: config for website_id, config in WEBSITE_CONFIGS.items()
+                       if website_ids is None or website_id in website_ids}
     
-    for website_id, config in WEBSITE_CONFIGS.items():
-        print(f"\n📋 Processing {config['name']}...")
-        success = run_spider(config)
+    if concurrent:
+        successes = run_spiders_in_process(website_configs, refresh=refresh, from_cache=from_cache)
+    
+    for website_id, config in website_configs.items():
+        if concurrent:
+            success = successes.get(website_id, False)
+        else:
+            print(f"\n📋 Processing {config['name']}...")
+            success = run_spider(config, refresh=refresh, from_cache=from_cache)
+        summary = load_crawl_summary(config) if success else {}
         results[website_id] = {
             'name': config['name'],
             'success': success,
+            'fetched': summary.get('fetched', 0),
+            'unchanged': summary.get('unchanged', 0),
+            'new': summary.get('new', 0),
+            'reused': summary.get('revisit_reused', 0),
+            'budget_exhausted': summary.get('budget_exhausted'),
             'timestamp': datetime.now().isoformat()
         }
     
     # Save scraping results
-    results_file = os.path.join('knowledge-base', 'scraping_results.json')
+    results_file = os.path.join(KNOWLEDGE_BASE_DIR, 'scraping_results.json')
     with open(results_file, 'w') as f:
         json.dump(results, f, indent=2)
     
@@ -138,16 +264,23 @@ def scrape_all_websites():
     successful = sum(1 for r in results.values() if r['success'])
     total = len(results)
     print(f"Successfully scraped: {successful}/{total} websites")
+    print(f"Elapsed time: {time.monotonic() - started:.1f}s")
     
     for website_id, result in results.items():
         status = "✅" if result['success'] else "❌"
-        print(f"{status} {result['name']}")
+        reused = f", reused: {result['reused']}" if result['reused'] else ''
+        budget = f", {result['budget_exhausted']} budget spent" if result['budget_exhausted'] else ''
+        print(f"{status} {result['name']} (fetched: {result['fetched']}, unchanged: {result['unchanged']}, new: {result['new']}{reused}{budget})")
+    
+    print(f"Pages fetched: {sum(r['fetched'] for r in results.values())}, "
+          f"unchanged: {sum(r['unchanged'] for r in results.values())}, "
+          f"new: {sum(r['new'] for r in results.values())}")
     
     return results
 
 def show_knowledge_base_structure():
     """Display the knowledge-base directory structure"""
-    knowledge_base = 'knowledge-base'
+    knowledge_base = KNOWLEDGE_BASE_DIR
     
     if not os.path.exists(knowledge_base):
         print("❌ Knowledge-base directory not found!")
@@ -198,22 +331,34 @@ def add_new_website():
     
     print(f"💾 Configuration saved to {config_file}")
 
-def main():
-    """Main function with menu"""
+def list_websites():
+    """Print the configured websites"""
+    print("\nConfigured websites:")
+    for website_id, config in WEBSITE_CONFIGS.items():
+        print(f"• {website_id}: {config['start_url']} ({config['category']})")
+
+def menu():
+    """Interactive menu"""
     while True:
         print("\n🌐 Multi-Site Web Scraper")
         print("=" * 30)
         print("1. Scrape all configured websites")
-        print("2. Scrape specific website")
-        print("3. Add new website configuration")
-        print("4. Show knowledge-base structure")
-        print("5. Exit")
+        print("2. Scrape all configured websites concurrently (single process)")
+        print("3. Refresh all configured websites (only pages likely to have changed)")
+        print("4. Scrape specific website")
+        print("5. Add new website configuration")
+        print("6. Show knowledge-base structure")
+        print("7. Exit")
         
-        choice = input("\nSelect an option (1-5): ").strip()
+        choice = input("\nSelect an option (1-7): ").strip()
         
         if choice == '1':
             scrape_all_websites()
         elif choice == '2':
+            scrape_all_websites(concurrent=True)
+        elif choice == '3':
+            scrape_all_websites(refresh=True)
+        elif choice == '4':
             print("\nConfigured websites:")
             for i, (website_id, config) in enumerate(WEBSITE_CONFIGS.items(), 1):
                 print(f"{i}. {config['name']} ({config['start_url']})")
@@ -228,15 +373,38 @@ def main():
                     print("❌ Invalid selection!")
             except ValueError:
                 print("❌ Please enter a valid number!")
-        elif choice == '3':
+        elif choice == '5':
             add_new_website()
-        elif choice == '4':
+        elif choice == '6':
             show_knowledge_base_structure()
-        elif choice == '5':
+        elif choice == '7':
             print("👋 Goodbye!")
             break
         else:
             print("❌ Invalid option!")
 
+def main():
+    parser = argparse.ArgumentParser(description='Scrape the configured websites into the knowledge-base (no command: menu)')
+    commands = parser.add_subparsers(dest='command')
+    crawl = commands.add_parser('crawl', help='Scrape the configured websites')
+    crawl.add_argument('--site', action='append', choices=list(WEBSITE_CONFIGS), help='Only these websites')
+    crawl.add_argument('--concurrent', action='store_true', help='Crawl the websites at the same time in this process')
+    crawl.add_argument('--refresh', action='store_true', help='Only fetch each website\'s revisit budget of likely changed pages')
+    crawl.add_argument('--from-cache', action='store_true', help='Serve pages cached by earlier crawls instead of fetching them again')
+    commands.add_parser('list', help='List the configured websites')
+    commands.add_parser('structure', help='Show the knowledge-base structure')
+    args = parser.parse_args()
+    
+    if args.command is None:
+        menu()
+    elif args.command == 'crawl':
+        results = scrape_all_websites(concurrent=args.concurrent, refresh=args.refresh, website_ids=args.site,
+                                      from_cache=args.from_cache)
+        sys.exit(0 if all(result['success'] for result in results.values()) else 1)
+    elif args.command == 'list':
+        list_websites()
+    elif args.command == 'structure':
+        show_knowledge_base_structure()
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
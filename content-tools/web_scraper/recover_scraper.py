@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Save the knowledge-base of crawls that were killed before they finished
+
+A crawl stores its records in raw_data/pages.jsonl as it goes and
+checkpoints them (see web_scraper.checkpoint); its knowledge-base files are
+only written when the spider closes. This script finds the checkpoints of
+crawls that never got that far and runs their spiders over the stored
+records, without the network, to write the files. Run it from the
+directory holding scrapy.cfg:
+
+    python recover_scraper.py                       # every interrupted crawl
+    python recover_scraper.py support_spider        # one spider
+    python recover_scraper.py universal_spider --site competitor1 --all
+    python recover_scraper.py --list
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Let Scrapy find the project settings without changing directory
+os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'web_scraper.settings')
+
+from web_scraper.checkpoint import find_checkpoints
+from web_scraper.replay import recover_all
+
+
+def checkpoint_name(checkpoint):
+    website = checkpoint['crawl_args'].get('website_name')
+    return f"{checkpoint['spider']}/{website}" if website else checkpoint['spider']
+
+
+def list_checkpoints(checkpoints):
+    """Print the state of each checkpointed crawl"""
+    print("\n💾 Checkpointed crawls:")
+    print("-" * 30)
+    for checkpoint in checkpoints:
+        print(f"• {checkpoint_name(checkpoint)}: {checkpoint['state']}, {checkpoint['records']} records "
+              f"at {checkpoint['saved_at']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the outputs of interrupted crawls from their stored records')
+    parser.add_argument('spiders', nargs='*', help='Spiders to recover (default: every checkpointed spider)')
+    parser.add_argument('--site', action='append', help='Only these universal_spider websites')
+    parser.add_argument('--all', action='store_true', help='Also rewrite the outputs of crawls that finished')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes to recover in')
+    parser.add_argument('--log-level', default='ERROR', help='Scrapy log level inside the recoveries')
+    parser.add_argument('--list', action='store_true', help='List the checkpointed crawls and exit')
+    args = parser.parse_args()
+
+    if not os.path.exists('scrapy.cfg'):
+        print("❌ Error: scrapy.cfg not found!")
+        print("Please run this script from the web_scraper project directory")
+        sys.exit(1)
+
+    checkpoints = find_checkpoints()
+    if args.spiders:
+        checkpoints = [c for c in checkpoints if c['spider'] in args.spiders]
+    if args.site:
+        checkpoints = [c for c in checkpoints if c['crawl_args'].get('website_name') in args.site]
+    if args.list:
+        list_checkpoints(checkpoints)
+        return
+    if not args.all:
+        checkpoints = [c for c in checkpoints if c['state'] != 'saved']
+
+    if not checkpoints:
+        print("✅ No interrupted crawls to recover")
+        return
+
+    print(f"🩹 Recovering {len(checkpoints)} interrupted crawls in {args.workers} processes")
+    print("=" * 50)
+    names = {checkpoint['path']: checkpoint_name(checkpoint) for checkpoint in checkpoints}
+    started = time.monotonic()
+    failed = 0
+    for summary in recover_all(checkpoints, workers=args.workers, settings={'LOG_LEVEL': args.log_level}):
+        name = names[summary['path']]
+        if 'error' in summary or summary['reason'] != 'finished':
+            failed += 1
+            print(f"❌ {name}: {summary.get('error') or summary['reason']}")
+        else:
+            print(f"✅ {name}: {summary['records']} records saved, {summary['dropped']} incomplete dropped "
+                  f"in {summary['elapsed']:.1f}s")
+
+    print(f"\n📊 Recovered {len(checkpoints) - failed}/{len(checkpoints)} crawls in {time.monotonic() - started:.1f}s")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
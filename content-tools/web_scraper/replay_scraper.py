@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Regenerate the knowledge-base from recorded crawls, without the network
+
+Every live crawl is recorded in the HTTP cache. This script feeds the
+newest recorded crawl of each spider (and each universal_spider website)
+back through the spider callbacks in a pool of processes, so changes to
+selectors or category keywords can be tried in minutes instead of a
+re-crawl at DOWNLOAD_DELAY. Run it from the directory holding scrapy.cfg:
+
+    python replay_scraper.py                        # everything recorded
+    python replay_scraper.py support_spider         # one spider
+    python replay_scraper.py universal_spider --site competitor1 --workers 4
+    python replay_scraper.py --list
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+# Let Scrapy find the project settings without changing directory
+os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'web_scraper.settings')
+
+from web_scraper.replay import find_recordings, latest_per_page_store, replay_all
+
+
+def recording_name(recording):
+    website = recording['crawl']['spider_args'].get('website_name')
+    return f"{recording['spider']}/{website}" if website else recording['spider']
+
+
+def list_recordings(recordings):
+    """Print the recorded crawl each spider would be replayed from"""
+    print("\n📼 Recorded crawls:")
+    print("-" * 30)
+    for recording in recordings:
+        crawl = recording['crawl']
+        opened = datetime.fromtimestamp(crawl['opened_at']).isoformat(timespec='seconds')
+        print(f"• {recording_name(recording)}: crawl {crawl['id']} of {opened}, {crawl['responses']} responses")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-run spider callbacks over recorded crawls')
+    parser.add_argument('spiders', nargs='*', help='Spiders to replay (default: every recorded spider)')
+    parser.add_argument('--site', action='append', help='Only these universal_spider websites')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes to replay in')
+    parser.add_argument('--log-level', default='ERROR', help='Scrapy log level inside the replays')
+    parser.add_argument('--list', action='store_true', help='List the recorded crawls and exit')
+    args = parser.parse_args()
+
+    if not os.path.exists('scrapy.cfg'):
+        print("❌ Error: scrapy.cfg not found!")
+        print("Please run this script from the web_scraper project directory")
+        sys.exit(1)
+
+    recordings = find_recordings()
+    if args.spiders:
+        recordings = [r for r in recordings if r['spider'] in args.spiders]
+    if args.site:
+        recordings = [r for r in recordings if r['crawl']['spider_args'].get('website_name') in args.site]
+    recordings = latest_per_page_store(recordings)
+
+    if not recordings:
+        print("❌ No recorded crawls found; run a live crawl first")
+        sys.exit(1)
+    if args.list:
+        list_recordings(recordings)
+        return
+
+    print(f"🔁 Replaying {len(recordings)} recorded crawls in {args.workers} processes")
+    print("=" * 50)
+    names = {recording['directory']: recording_name(recording) for recording in recordings}
+    started = time.monotonic()
+    failed = 0
+    for summary in replay_all(recordings, workers=args.workers, settings={'LOG_LEVEL': args.log_level}):
+        name = names[summary['directory']]
+        if 'error' in summary or summary['reason'] != 'finished' or summary['errors']:
+            failed += 1
+            print(f"❌ {name}: {summary.get('error') or summary['reason']}, callback errors: {summary.get('errors', 0)}")
+        else:
+            print(f"✅ {name}: {summary['responses']} responses, {summary['items']} items "
+                  f"in {summary['elapsed']:.1f}s (crawl {summary['crawl']})")
+
+    print(f"\n📊 Replayed {len(recordings) - failed}/{len(recordings)} crawls in {time.monotonic() - started:.1f}s")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
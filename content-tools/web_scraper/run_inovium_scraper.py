@@ -2,32 +2,43 @@
 """
 Inovium Web Scraper
 Scrapes Inovium's website content for knowledge base
+
+Without a command it shows a menu; scheduled runs use the commands, which
+work from any directory (crawl exits non-zero when the crawl fails):
+
+    python run_inovium_scraper.py crawl
+    python run_inovium_scraper.py summary
 """
 
+import argparse
+import json
 import os
 import subprocess
 import sys
 from datetime import datetime
 
+from web_scraper.checkpoint import PROJECT_DIR
+from web_scraper.sidecar import open_sidecar
+
+# inovium_spider keeps its knowledge-base one level above the project
+INOVIUM_DIR = os.path.join(os.path.dirname(PROJECT_DIR), 'knowledge-base', 'website_content', 'partners', 'inovium')
+
 def run_inovium_spider():
     """Run the Inovium spider to scrape their website"""
     print("🕷️  Starting Inovium website scraping...")
     print("=" * 50)
     
-    # Change to web_scraper directory
-    original_dir = os.getcwd()
-    os.chdir('web_scraper')
-    
     try:
-        # Run the Inovium spider
+        # Run the Inovium spider; scrapy finds the project from scrapy.cfg
+        # in the working directory
         cmd = ['scrapy', 'crawl', 'inovium_spider']
         
         print(f"Running command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = subprocess.run(cmd, capture_output=True, text=True, cwd=PROJECT_DIR)
         
         if result.returncode == 0:
             print("✅ Successfully scraped Inovium website")
-            print("📁 Content saved to knowledge-base/website_content/partners/inovium/")
+            print(f"📁 Content saved to {INOVIUM_DIR}/")
             return True
         else:
             print("❌ Failed to scrape Inovium website")
@@ -38,13 +49,10 @@ def run_inovium_spider():
     except Exception as e:
         print(f"❌ Error scraping Inovium: {e}")
         return False
-    finally:
-        # Go back to original directory
-        os.chdir(original_dir)
 
 def show_inovium_content():
     """Display the scraped Inovium content structure"""
-    inovium_dir = 'knowledge-base/website_content/partners/inovium'
+    inovium_dir = INOVIUM_DIR
     
     if not os.path.exists(inovium_dir):
         print("❌ Inovium content directory not found!")
@@ -67,7 +75,7 @@ def show_inovium_content():
 
 def show_inovium_summary():
     """Show a summary of scraped Inovium content"""
-    inovium_dir = 'knowledge-base/website_content/partners/inovium'
+    inovium_dir = INOVIUM_DIR
     
     if not os.path.exists(inovium_dir):
         print("❌ Inovium content not found!")
@@ -81,22 +89,32 @@ def show_inovium_summary():
         with open(index_file, 'r', encoding='utf-8') as f:
             print(f.read())
     
-    # Check for raw data
+    # Check for raw data; the sidecar's header has the counts, so the
+    # JSON is only parsed when the sidecar is missing or out of date
     raw_data_file = os.path.join(inovium_dir, 'raw_data', 'complete_scrape.json')
     if os.path.exists(raw_data_file):
-        import json
-        with open(raw_data_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            print(f"\n📊 Raw Data Summary:")
-            print(f"• Total pages scraped: {len(data.get('pages', []))}")
-            print(f"• Services found: {len(data.get('services', []))}")
-            print(f"• Solutions found: {len(data.get('solutions', []))}")
-            print(f"• Case studies found: {len(data.get('case_studies', []))}")
-            print(f"• Team info found: {len(data.get('team', []))}")
-            print(f"• Blog posts found: {len(data.get('blog_posts', []))}")
+        counts = raw_data_counts(raw_data_file)
+        print(f"\n📊 Raw Data Summary:")
+        print(f"• Total pages scraped: {counts.get('pages', 0)}")
+        print(f"• Services found: {counts.get('services', 0)}")
+        print(f"• Solutions found: {counts.get('solutions', 0)}")
+        print(f"• Case studies found: {counts.get('case_studies', 0)}")
+        print(f"• Team info found: {counts.get('team', 0)}")
+        print(f"• Blog posts found: {counts.get('blog_posts', 0)}")
 
-def main():
-    """Main function"""
+def raw_data_counts(raw_data_file):
+    """Number of entries in each section of complete_scrape.json"""
+    sidecar = open_sidecar(raw_data_file)
+    if sidecar is not None:
+        with sidecar:
+            return sidecar.counts
+    
+    with open(raw_data_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {key: len(value) for key, value in data.items() if isinstance(value, (list, dict))}
+
+def menu():
+    """Interactive menu"""
     print("🏢 Inovium Web Scraper")
     print("=" * 30)
     
@@ -129,5 +147,22 @@ def main():
         else:
             print("❌ Invalid option. Please select 1-4.")
 
+def main():
+    parser = argparse.ArgumentParser(description="Scrape Inovium's website into the knowledge-base (no command: menu)")
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('crawl', help='Scrape the Inovium website')
+    commands.add_parser('structure', help='Show the content structure')
+    commands.add_parser('summary', help='Show the content summary')
+    args = parser.parse_args()
+    
+    if args.command is None:
+        menu()
+    elif args.command == 'crawl':
+        sys.exit(0 if run_inovium_spider() else 1)
+    elif args.command == 'structure':
+        show_inovium_content()
+    elif args.command == 'summary':
+        show_inovium_summary()
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
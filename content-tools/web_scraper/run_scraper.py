@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 """
 Script to run the BrightMove web scraper and organize content in knowledge-base
+
+    python run_scraper.py                # crawl brightmove.com
+    python run_scraper.py --from-cache   # serve pages cached by earlier crawls instead of fetching them
 """
 
+import argparse
 import os
 import subprocess
 import sys
 
+from web_scraper.httpcache import serve_from_cache_settings
+
 def main():
+    parser = argparse.ArgumentParser(description='Scrape brightmove.com into the knowledge-base')
+    parser.add_argument('--from-cache', action='store_true', help='Serve pages cached by earlier crawls instead of fetching them again')
+    args = parser.parse_args()
+    
     print("🚀 Starting BrightMove Web Scraper")
     print("=" * 50)
     
@@ -46,9 +56,12 @@ def main():
     
     # Run the spider
     print("🕷️  Running spider...")
+    cmd = ['scrapy', 'crawl', 'brightmove_spider']
+    if args.from_cache:
+        for name, value in serve_from_cache_settings().items():
+            cmd += ['-s', f"{name}={value}"]
     try:
-        result = subprocess.run(['scrapy', 'crawl', 'brightmove_spider'], 
-                              capture_output=True, text=True)
+        result = subprocess.run(cmd, capture_output=True, text=True)
         
         if result.returncode == 0:
             print("✅ Spider completed successfully!")
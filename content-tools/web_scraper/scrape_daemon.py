@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Scraping daemon: Scrapy loaded once, crawls sent to it as jobs
+
+`serve` starts Scrapy and the reactor once and runs every crawl it is sent
+inside that process (see web_scraper.daemon for the API); the other
+commands talk to a running daemon. They all work from any directory:
+
+    python scrape_daemon.py serve                               # on .scrapy/scrape_daemon.sock
+    SCRAPE_DAEMON_TOKEN=... python scrape_daemon.py serve --address 127.0.0.1:6810
+    python scrape_daemon.py submit --site competitor1 --refresh --wait
+    python scrape_daemon.py submit --spider support_spider -s CRAWL_BUDGET_PAGES=500 --wait
+    python scrape_daemon.py status [JOB]
+    python scrape_daemon.py stop JOB
+
+On a TCP port the client commands need the same SCRAPE_DAEMON_TOKEN as the
+daemon. With --wait, submit exits non-zero unless every job finished, so a
+scheduler task (an Airflow BashOperator, say) fails with the crawl; Python
+callers can use web_scraper.daemon.DaemonClient instead.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Let Scrapy find the project settings without changing directory
+os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'web_scraper.settings')
+
+from multi_site_scraper import WEBSITE_CONFIGS, website_job
+from web_scraper.daemon import DEFAULT_ADDRESS, TOKEN_ENV, DaemonClient, listen
+from web_scraper.jobs import JobRunner, project_settings
+
+
+def site_job(name, refresh=False):
+    """The job of a website configured in multi_site_scraper.py"""
+    if name not in WEBSITE_CONFIGS:
+        raise KeyError(f"No website '{name}' in multi_site_scraper.py")
+    return website_job(WEBSITE_CONFIGS[name], refresh)
+
+
+def serve(address, max_jobs=None):
+    """Run the daemon until it is interrupted"""
+    from scrapy.utils.log import configure_logging
+    from scrapy.utils.reactor import install_reactor
+
+    settings = project_settings()
+    # The reactor Scrapy is configured for, installed before anything imports the default one
+    install_reactor(settings['TWISTED_REACTOR'], settings['ASYNCIO_EVENT_LOOP'])
+    from twisted.internet import reactor
+
+    configure_logging(settings)
+    runner = JobRunner(settings, max_jobs)
+    try:
+        listen(reactor, runner, address, site_job, os.environ.get(TOKEN_ENV))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    # Running crawls close their spiders, and so write their outputs, on the way out
+    reactor.addSystemEventTrigger('before', 'shutdown', runner.shutdown)
+    print(f"🕸️  Scraping daemon listening on {address}")
+    reactor.run()
+
+
+def key_value(pair):
+    name, sep, value = pair.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got '{pair}'")
+    return name, value
+
+
+def print_job(job):
+    stats = job['stats']
+    line = f"• {job['id']} {job['name']}: {job['state']}"
+    if job['reason']:
+        line += f" ({job['reason']})"
+    if stats:
+        line += (f", {stats.get('item_scraped_count', 0)} items from "
+                 f"{stats.get('downloader/response_count', 0)} responses")
+        if 'elapsed_time_seconds' in stats:
+            line += f" in {stats['elapsed_time_seconds']:.1f}s"
+    if job['error']:
+        line += f" - {job['error']}"
+    print(line)
+
+
+def submit(client, args):
+    if args.site:
+        specs = [{'site': site, 'refresh': args.refresh} for site in args.site]
+    else:
+        specs = [{'spider': args.spider, 'args': dict(args.arg or []), 'settings': dict(args.set or [])}]
+    jobs = []
+    for spec in specs:
+        job = client.submit(spec)
+        print(f"📨 Submitted {job['name']} as job {job['id']}")
+        jobs.append(job)
+    if not args.wait:
+        return True
+
+    print("⏳ Waiting for the jobs to finish...")
+    jobs = [client.wait(job['id'], args.poll) for job in jobs]
+    for job in jobs:
+        print_job(job)
+    return all(job['state'] == 'finished' for job in jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-lived scraping daemon and its client')
+    parser.add_argument('--address', default=os.environ.get('SCRAPE_DAEMON_ADDRESS', DEFAULT_ADDRESS),
+                        help=f'Unix socket path, or host:port (with {TOKEN_ENV} set), of the daemon')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='Run the daemon')
+    serve_parser.add_argument('--max-jobs', type=int, help='Jobs to run at once (default: SCRAPE_DAEMON_MAX_JOBS)')
+
+    submit_parser = commands.add_parser('submit', help='Submit crawl jobs')
+    target = submit_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--site', action='append', help='A website of multi_site_scraper.py (repeatable)')
+    target.add_argument('--spider', help='Any spider of the project')
+    submit_parser.add_argument('--refresh', action='store_true', help="Only fetch a website's revisit budget of pages")
+    submit_parser.add_argument('-a', dest='arg', action='append', type=key_value, help='Spider argument NAME=VALUE')
+    submit_parser.add_argument('-s', dest='set', action='append', type=key_value, help='Setting NAME=VALUE')
+    submit_parser.add_argument('--wait', action='store_true', help='Wait for the jobs and fail unless they all finish')
+    submit_parser.add_argument('--poll', type=float, default=5.0, help='Seconds between status checks while waiting')
+
+    status_parser = commands.add_parser('status', help='Show every job, or one in full')
+    status_parser.add_argument('job', nargs='?')
+
+    stop_parser = commands.add_parser('stop', help='Cancel a queued job or stop a running one')
+    stop_parser.add_argument('job')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.address, args.max_jobs)
+        return
+
+    client = DaemonClient(args.address)
+    try:
+        if args.command == 'submit':
+            if not submit(client, args):
+                sys.exit(1)
+        elif args.command == 'status' and args.job:
+            print(json.dumps(client.job(args.job), indent=2, ensure_ascii=False))
+        elif args.command == 'status':
+            status = client.jobs()
+            print(f"\n🕸️  {status['running']} running, {len(status['jobs'])} jobs")
+            for job in status['jobs']:
+                print_job(job)
+        elif args.command == 'stop':
+            print_job(client.stop(args.job))
+    except (OSError, RuntimeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Search the scraped knowledge-base
+
+Every crawl keeps a full-text index of its pages and category snippets in
+knowledge-base/search.sqlite (see web_scraper.search). This script queries
+it, best BM25 matches first:
+
+    python search_knowledge_base.py candidate import
+    python search_knowledge_base.py "job posting" --site brightmove/support --limit 20
+    python search_knowledge_base.py 'pricing NEAR(plan user, 5)' --raw --section pricing
+    python search_knowledge_base.py --sites
+"""
+
+import argparse
+import sys
+
+from web_scraper.search import SearchIndex, index_paths, search
+
+
+def list_sites(paths):
+    """Print what each index holds"""
+    print("\n🗂️  Indexed sites:")
+    print("-" * 30)
+    for path in paths:
+        index = SearchIndex(path)
+        try:
+            for site, counts in index.sites().items():
+                print(f"• {site}: {counts['pages']} pages, {counts['snippets']} category snippets")
+        finally:
+            index.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text search over the scraped knowledge-base')
+    parser.add_argument('query', nargs='*', help='Words to search for (all must match)')
+    parser.add_argument('--site', help='Only this site, e.g. brightmove/support or a universal_spider website name')
+    parser.add_argument('--section', help="Only pages ('page') or one category, e.g. pricing")
+    parser.add_argument('--limit', type=int, default=10, help='Number of results')
+    parser.add_argument('--raw', action='store_true', help='Treat the query as an FTS5 query expression')
+    parser.add_argument('--index', action='append', help='Index file to search (default: every knowledge-base index)')
+    parser.add_argument('--sites', action='store_true', help='List the indexed sites and exit')
+    args = parser.parse_args()
+
+    paths = args.index or index_paths()
+    if not paths:
+        print("❌ No search index found; run a crawl first")
+        sys.exit(1)
+    if args.sites:
+        list_sites(paths)
+        return
+    if not args.query:
+        parser.error('a query is required')
+
+    query = ' '.join(args.query)
+    hits = search(query, paths=paths, site=args.site, section=args.section, limit=args.limit, raw=args.raw)
+    if not hits:
+        print(f"🔍 No matches for {query!r}")
+        return
+    print(f"🔍 {len(hits)} matches for {query!r}")
+    print("=" * 50)
+    for number, hit in enumerate(hits, 1):
+        section = '' if hit['section'] == 'page' else f" [{hit['section']}]"
+        print(f"\n{number}. {hit['title'] or hit['url']}{section}")
+        print(f"   {hit['site']} • {hit['url']} • score {-hit['score']:.4g}")
+        print(f"   {' '.join(hit['snippet'].split())}")
+
+
+if __name__ == "__main__":
+    main()
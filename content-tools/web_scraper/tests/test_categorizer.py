@@ -0,0 +1,74 @@
+"""
+The compiled category rules (web_scraper.categorizer) against the substring checks they replaced
+"""
+
+import json
+import random
+
+import pytest
+
+from web_scraper.categorizer import RULES_FILE, Categorizer, load_categorizer
+
+
+with open(RULES_FILE, encoding='utf-8') as f:
+    PROFILES = json.load(f)
+
+
+def substring_categories(rules, url):
+    """The spiders' old categorize_content(): one any(keyword in url) per category"""
+    url_lower = url.lower()
+    return [rule['category'] for rule in rules if any(keyword in url_lower for keyword in rule['keywords'])]
+
+
+def urls(rules):
+    keywords = [keyword for rule in rules for keyword in rule['keywords']]
+    rng = random.Random(6)
+    yield 'https://www.example.com/'
+    for keyword in keywords:
+        yield f'https://www.example.com/{keyword}'
+        yield f'https://www.example.com/{keyword.upper()}/x'
+    for _ in range(500):
+        # Keywords run together, cut short and mixed with other text
+        parts = [rng.choice(keywords)[:rng.randint(2, 12)] for _ in range(rng.randint(1, 5))]
+        yield 'https://www.example.com/' + rng.choice(['', '-', '/', 'x']).join(parts)
+
+
+@pytest.mark.parametrize('profile', sorted(PROFILES))
+def test_matches_substring_checks(profile):
+    categorizer = load_categorizer(profile)
+    for url in urls(PROFILES[profile]):
+        assert categorizer.categorize(url) == substring_categories(PROFILES[profile], url), url
+
+
+def test_overlapping_keywords_select_every_category():
+    support = load_categorizer('support')
+    assert support.categorize('https://support.example.com/api/webhooks') == ['technical_docs', 'api_docs']
+    # 'user' and 'guide' are both user_guides keywords, 'guide' also help_articles
+    assert support.categorize('https://support.example.com/user-guide') == ['help_articles', 'user_guides']
+
+    website = load_categorizer('website')
+    assert website.categorize('https://www.example.com/customer-success-case-study') == [
+        'testimonials', 'case_studies'
+    ]
+    assert website.categorize('https://www.example.com/PRICING') == ['pricing']
+    assert website.categorize('https://www.example.com/about') == []
+
+
+def test_keyword_inside_another():
+    # 'he' and 'she' end at the same character; 'hers' runs past both
+    categorizer = Categorizer([
+        {'category': 'a', 'keywords': ['he'], 'fields': []},
+        {'category': 'b', 'keywords': ['she'], 'fields': []},
+        {'category': 'c', 'keywords': ['hers'], 'fields': ['paragraphs']},
+    ])
+    assert categorizer.categorize('ushe') == ['a', 'b']
+    assert categorizer.categorize('shers') == ['a', 'b', 'c']
+    assert categorizer.categorize('hhs') == []
+    assert categorizer.fields == {'a': (), 'b': (), 'c': ('paragraphs',)}
+
+
+def test_profiles_are_compiled_once():
+    assert load_categorizer('website') is load_categorizer('website')
+    assert load_categorizer('website').fields['testimonials'] == ('paragraphs',)
+    with pytest.raises(KeyError):
+        load_categorizer('missing')
@@ -0,0 +1,62 @@
+"""
+Job requests the scraping daemon (web_scraper.daemon) refuses
+"""
+
+import io
+import json
+
+import pytest
+from twisted.web.test.requesthelper import DummyRequest
+
+from web_scraper.daemon import JobsResource
+from web_scraper.jobs import Job, JobRunner, project_settings
+
+
+WEBSITES = {'brightmove': Job('universal_spider', {'website_name': 'brightmove'})}
+
+
+def site_job(name, refresh=False):
+    if name not in WEBSITES:
+        raise KeyError(f"No website '{name}'")
+    return WEBSITES[name]
+
+
+@pytest.fixture(scope='module')
+def resource():
+    return JobsResource(JobRunner(project_settings()), site_job)
+
+
+def post(resource, spec):
+    request = DummyRequest([b'jobs'])
+    request.method = b'POST'
+    request.requestHeaders.setRawHeaders(b'content-type', [b'application/json'])
+    request.content = io.BytesIO(json.dumps(spec).encode('utf-8'))
+    body = json.loads(resource.render(request))
+    return request.responseCode, body
+
+
+@pytest.mark.parametrize('website_name', [
+    '../x', '..', '.', 'a/b', '/tmp/x', 'a\\b', '.hidden', '', 'name\0', 'x\n'
+])
+def test_website_names_that_leave_the_knowledge_base(resource, website_name):
+    code, body = post(resource, {'spider': 'universal_spider', 'args': {'website_name': website_name}})
+    assert code == 400
+    assert 'website_name' in body['error']
+    assert not resource.runner.jobs
+
+
+@pytest.mark.parametrize('spec', [
+    {'site': '../x'},
+    {'site': 'unknown'},
+    {'spider': 'universal_spider', 'args': {'website_name': 'x'}, 'settings': {'FEEDS': {}}},
+    {'spider': 'universal_spider', 'args': {'website_name': ['x']}},
+])
+def test_other_invalid_jobs(resource, spec):
+    code, _ = post(resource, spec)
+    assert code == 400
+    assert not resource.runner.jobs
+
+
+@pytest.mark.parametrize('website_name', ['brightmove', 'support_brightmove', 'example-partner.com', 'Site2'])
+def test_plain_website_names(website_name):
+    assert Job('universal_spider', {'website_name': website_name}).name == f'universal_spider/{website_name}'
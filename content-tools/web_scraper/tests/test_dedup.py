@@ -0,0 +1,174 @@
+"""
+Boilerplate and near-duplicate detection (web_scraper.dedup) on the benchmark's synthetic marketing site
+"""
+
+import importlib.util
+import os
+
+import pytest
+import scrapy
+from scrapy.exceptions import DropItem
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from web_scraper.dedup import STATE_FILE, NearDuplicateIndex, PageDeduplicator, simhash
+from web_scraper.extraction import extract_page
+from web_scraper.items import WebScraperItem
+from web_scraper.pipelines import DeduplicationPipeline
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_synthetic_sites():
+    path = os.path.join(PROJECT_DIR, 'benchmarks', 'synthetic_sites.py')
+    spec = importlib.util.spec_from_file_location('synthetic_sites', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+synthetic_sites = load_synthetic_sites()
+
+
+def page_item(site, path):
+    """The page record universal_spider stores for a page of a synthetic site"""
+    url = f'https://{site.host}{path}'
+    response = HtmlResponse(url, body=site.render(path.split('?')[0]).encode('utf-8'), encoding='utf-8')
+    fields = extract_page(response)
+    return WebScraperItem(kind='page', url=url, categories=[], data={
+        'url': url,
+        'title': fields['title'],
+        'headlines': fields['headlines'],
+        'paragraphs': fields['paragraphs'],
+        'lists': fields['lists']
+    })
+
+
+@pytest.fixture
+def pipeline():
+    crawler = get_crawler(scrapy.Spider)
+    pipeline = DeduplicationPipeline.from_crawler(crawler)
+    pipeline.open_spider(scrapy.Spider(name='dedup_test'))
+    return pipeline
+
+
+def blocks(item):
+    return set(item['data']['paragraphs'] + item['data']['lists'])
+
+
+def test_site_boilerplate_is_dropped(pipeline):
+    site = synthetic_sites.MarketingSite('www.example-competitor.com', 40)
+    pages = [page_item(site, site.page_url(n)) for n in range(12)]
+    # The announcement, company blurb, offices and legal text are on every page
+    repeated = set.intersection(*(blocks(item) for item in pages))
+    assert len(repeated) == 7
+
+    spider = scrapy.Spider(name='dedup_test')
+    stored = [pipeline.process_item(item, spider) for item in pages]
+
+    # Kept until they have been seen on DEDUP_BOILERPLATE_MIN_PAGES pages, dropped after
+    for item in stored[:3]:
+        assert repeated <= blocks(item)
+    for item in stored[3:]:
+        assert not repeated & blocks(item)
+        assert item['data']['headlines'] and item['data']['paragraphs']
+    assert pipeline.stats.get_value('dedup/boilerplate_blocks') == 9 * len(repeated)
+
+
+def test_campaign_variants_are_near_duplicates(pipeline):
+    site = synthetic_sites.MarketingSite('www.example-competitor.com', 40)
+    spider = scrapy.Spider(name='dedup_test')
+    for n in range(site.pages):
+        pipeline.process_item(page_item(site, site.page_url(n)), spider)
+
+    for n in range(0, site.pages, synthetic_sites.CAMPAIGN_EVERY):
+        with pytest.raises(DropItem, match=site.page_url(n)):
+            pipeline.process_item(page_item(site, site.campaign_url(n)), spider)
+    assert pipeline.stats.get_value('dedup/near_duplicates') == 4
+    assert pipeline.stats.get_value('dedup/pages_seen') == site.pages + 4
+
+
+def test_other_kinds_pass_through(pipeline):
+    item = WebScraperItem(kind='company_info', url='https://www.example.com/', categories=[], data={'title': 'Example'})
+    assert pipeline.process_item(item, scrapy.Spider(name='dedup_test')) is item
+    assert pipeline.stats.get_value('dedup/pages_seen') is None
+
+
+def test_simhash_distance():
+    text = [
+        'Post jobs to every board from one screen and track each applicant through the pipeline.',
+        'Recruiters see interviews, offers and placements on one dashboard.'
+    ]
+    edited = [text[0].replace('every board', 'every job board'), text[1]]
+    other = ['Timesheets and invoices are exported to payroll each week with the client approvals attached.']
+
+    fingerprint, shingles = simhash(text)
+    assert shingles == 20
+    assert simhash(text) == (fingerprint, shingles)
+    assert bin(fingerprint ^ simhash(edited)[0]).count("1") <= 8
+    assert bin(fingerprint ^ simhash(other)[0]).count('1') > 12
+
+
+def test_near_duplicate_index():
+    index = NearDuplicateIndex(max_distance=3)
+    fingerprint = 0x0123456789abcdef
+    index.add(fingerprint, 'https://www.example.com/a')
+
+    # Three bits off, spread over the bands, is still a match; four is not
+    assert index.find(fingerprint ^ (1 | 1 << 20 | 1 << 63)) == 'https://www.example.com/a'
+    assert index.find(fingerprint ^ (1 | 1 << 20 | 1 << 40 | 1 << 63)) is None
+    assert list(index.entries()) == [(fingerprint, 'https://www.example.com/a')]
+
+
+def test_short_pages_never_match():
+    dedup = PageDeduplicator(min_shingles=8)
+    data = {'content': {'paragraphs': ['Contact us today.']}}
+    assert dedup.duplicate_of('https://www.example.com/a', data) is None
+    assert dedup.duplicate_of('https://www.example.com/b', data) is None
+
+
+def open_pipeline(state_dir, resuming):
+    crawler = get_crawler(scrapy.Spider, {'JOBDIR': str(state_dir)})
+    pipeline = DeduplicationPipeline.from_crawler(crawler)
+    spider = scrapy.Spider(name='dedup_test')
+    spider.resuming = resuming
+    pipeline.open_spider(spider)
+    return pipeline, spider
+
+
+def test_resumed_crawl_keeps_what_was_learned(tmp_path):
+    site = synthetic_sites.MarketingSite('www.example-competitor.com', 40)
+    pipeline, spider = open_pipeline(tmp_path, resuming=False)
+    for n in range(12):
+        pipeline.process_item(page_item(site, site.page_url(n)), spider)
+    pipeline.spider_closed(spider, 'shutdown')
+    assert (tmp_path / STATE_FILE).exists()
+
+    # The boilerplate is dropped from the first page after resuming, and the
+    # campaign variant of a page stored before the interruption is caught
+    resumed, spider = open_pipeline(tmp_path, resuming=True)
+    item = resumed.process_item(page_item(site, site.page_url(12)), spider)
+    assert resumed.stats.get_value('dedup/boilerplate_blocks') == 7
+    assert item['data']['paragraphs']
+    with pytest.raises(DropItem, match=site.page_url(10)):
+        resumed.process_item(page_item(site, site.campaign_url(10)), spider)
+
+    resumed.spider_closed(spider, 'finished')
+    assert not (tmp_path / STATE_FILE).exists()
+
+
+def test_fresh_crawl_ignores_saved_state(tmp_path):
+    site = synthetic_sites.MarketingSite('www.example-competitor.com', 40)
+    pipeline, spider = open_pipeline(tmp_path, resuming=False)
+    for n in range(12):
+        pipeline.process_item(page_item(site, site.page_url(n)), spider)
+    pipeline.spider_closed(spider, 'shutdown')
+
+    fresh, spider = open_pipeline(tmp_path, resuming=False)
+    fresh.process_item(page_item(site, site.page_url(12)), spider)
+    assert fresh.stats.get_value('dedup/boilerplate_blocks') == 0
+
+
+def test_load_without_saved_state(tmp_path):
+    assert not PageDeduplicator().load(str(tmp_path / STATE_FILE))
@@ -0,0 +1,72 @@
+"""
+The Bloom filters behind the request dupefilter and visited-URL sets (web_scraper.frontier)
+"""
+
+import pytest
+import scrapy
+from scrapy.utils.test import get_crawler
+
+from web_scraper.frontier import BloomDupeFilter, BloomFilter
+
+
+@pytest.mark.parametrize('error_rate', [0.01, 0.001])
+def test_false_positive_rate(error_rate):
+    capacity = 20000
+    bloom = BloomFilter(capacity=capacity, error_rate=error_rate)
+    # A key that collides with those added before it is reported as seen
+    added = sum(bloom.add(f'https://www.example.com/added/{n}') for n in range(capacity))
+    assert added >= (1 - error_rate) * capacity
+
+    # No false negatives, and false positives within twice the rate asked for
+    assert all(f'https://www.example.com/added/{n}' in bloom for n in range(capacity))
+    false_positives = sum(f'https://www.example.com/other/{n}' in bloom for n in range(capacity))
+    assert false_positives <= 2 * error_rate * capacity
+
+
+def test_add_reports_new_keys():
+    bloom = BloomFilter(capacity=100)
+    assert bloom.add('a')
+    assert not bloom.add('a')
+    assert b'a' in bloom
+    assert 'b' not in bloom
+
+
+def test_file_backed_filter(tmp_path):
+    path = str(tmp_path / 'crawl_state' / 'visited.bloom')
+    bloom = BloomFilter(path, capacity=1000)
+    bloom.add('https://www.example.com/a')
+    bloom.close()
+
+    reopened = BloomFilter(path, capacity=1000)
+    assert 'https://www.example.com/a' in reopened
+    reopened.close()
+
+    # Starting over, or with other parameters, empties the filter
+    reset = BloomFilter(path, capacity=1000, reset=True)
+    assert 'https://www.example.com/a' not in reset
+    reset.add('https://www.example.com/a')
+    reset.close()
+    resized = BloomFilter(path, capacity=2000)
+    assert 'https://www.example.com/a' not in resized
+
+    resized.discard()
+    assert not (tmp_path / 'crawl_state' / 'visited.bloom').exists()
+
+
+def test_dupefilter(tmp_path):
+    crawler = get_crawler(scrapy.Spider, {'JOBDIR': str(tmp_path)})
+    crawler.spider = scrapy.Spider(name='frontier_test')
+    crawler.spider.resuming = False
+    dupefilter = BloomDupeFilter.from_crawler(crawler)
+
+    assert not dupefilter.request_seen(scrapy.Request('https://www.example.com/a?x=1&y=2'))
+    assert dupefilter.request_seen(scrapy.Request('https://www.example.com/a?y=2&x=1'))
+    assert not dupefilter.request_seen(scrapy.Request('https://www.example.com/b'))
+
+    # Kept for a resumed crawl, removed once the crawl finishes
+    dupefilter.close('shutdown')
+    crawler.spider.resuming = True
+    resumed = BloomDupeFilter.from_crawler(crawler)
+    assert resumed.request_seen(scrapy.Request('https://www.example.com/b'))
+    resumed.close('finished')
+    assert not (tmp_path / 'requests.bloom').exists()
@@ -0,0 +1,121 @@
+"""
+PackedCacheStorage and CacheArchive (web_scraper.httpcache) on a cache under tmp_path
+"""
+
+import os
+import random
+
+import pytest
+import scrapy
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from web_scraper.httpcache import CacheArchive, PackedCacheStorage, serve_from_cache_settings
+
+
+class CacheSpider(scrapy.Spider):
+    name = 'cache_test'
+
+    def parse_page(self, response, section=None):
+        pass
+
+
+def open_storage(tmp_path, **settings):
+    """A PackedCacheStorage opened for a new crawl, serving from the cache unless told otherwise"""
+    crawler = get_crawler(CacheSpider, dict(
+        serve_from_cache_settings(), HTTPCACHE_DIR=str(tmp_path / 'httpcache'), **settings
+    ))
+    spider = CacheSpider.from_crawler(crawler)
+    storage = PackedCacheStorage(crawler.settings)
+    storage.open_spider(spider)
+    return storage, spider
+
+
+def store(storage, spider, url, body, **kwargs):
+    request = scrapy.Request(url, **kwargs)
+    response = HtmlResponse(url, status=200, headers={'ETag': '"v1"'}, body=body, request=request)
+    storage.store_response(spider, request, response)
+    return request
+
+
+def bodies(storage):
+    return storage.conn.execute('SELECT COUNT(*) FROM bodies').fetchone()[0]
+
+
+def test_store_and_retrieve(tmp_path):
+    storage, spider = open_storage(tmp_path)
+    body = '<html><body><h1>Pricing</h1></body></html>'.encode() * 50
+    stored = store(storage, spider, 'https://www.example.com/pricing', body)
+
+    cached = storage.retrieve_response(spider, scrapy.Request('https://www.example.com/pricing'))
+
+    assert cached.status == 200
+    assert cached.url == 'https://www.example.com/pricing'
+    assert cached.body == body
+    assert cached.headers.get('ETag') == b'"v1"'
+    assert isinstance(cached, HtmlResponse)
+    assert stored.meta['cache_timestamp'] > 0
+    assert storage.retrieve_response(spider, scrapy.Request('https://www.example.com/other')) is None
+    storage.close_spider(spider)
+
+
+def test_identical_bodies_are_stored_once(tmp_path):
+    storage, spider = open_storage(tmp_path)
+    store(storage, spider, 'https://www.example.com/a', b'same body')
+    store(storage, spider, 'https://www.example.com/b', b'same body')
+    store(storage, spider, 'https://www.example.com/a', b'new body')
+
+    assert bodies(storage) == 2
+    # The newest response for a request is the one served
+    assert storage.retrieve_response(spider, scrapy.Request('https://www.example.com/a')).body == b'new body'
+    storage.close_spider(spider)
+
+
+def test_recording_serves_nothing(tmp_path):
+    storage, spider = open_storage(tmp_path, HTTPCACHE_POLICY='web_scraper.httpcache.RecordingPolicy')
+    store(storage, spider, 'https://www.example.com/', b'home')
+
+    assert storage.retrieve_response(spider, scrapy.Request('https://www.example.com/')) is None
+    storage.close_spider(spider)
+
+
+def test_archive_replays_callbacks(tmp_path):
+    storage, spider = open_storage(tmp_path)
+    store(storage, spider, 'https://www.example.com/docs', b'docs', callback=spider.parse_page,
+          meta={'depth': 1}, cb_kwargs={'section': 'docs'})
+    storage.close_spider(spider)
+
+    archive = CacheArchive(storage.directory)
+    [crawl] = archive.crawls()
+    [response] = archive.responses(crawl['id'], spider)
+    archive.close()
+
+    assert crawl['responses'] == 1
+    assert response.body == b'docs'
+    assert response.request.callback == spider.parse_page
+    assert response.request.cb_kwargs == {'section': 'docs'}
+    assert response.request.meta['depth'] == 1
+
+
+@pytest.mark.parametrize('segment_size', [64 * 1024 * 1024, 20000])
+def test_crawls_storing_at_the_same_time(tmp_path, segment_size):
+    # Two crawls storing into one cache take turns appending to its segments
+    first, spider = open_storage(tmp_path, HTTPCACHE_SEGMENT_SIZE=segment_size)
+    second, _ = open_storage(tmp_path, HTTPCACHE_SEGMENT_SIZE=segment_size)
+    expected = {}
+    for i in range(200):
+        # Every third body is served to both crawls
+        shared = i % 3 == 0
+        for storage, crawl in ((first, 'a'), (second, 'b')):
+            body = random.Random(i if shared else f'{crawl}{i}').randbytes(1000)
+            url = f'https://www.example.com/{crawl}/{i}'
+            store(storage, spider, url, body)
+            expected[url] = body
+
+    for url, body in expected.items():
+        assert first.retrieve_response(spider, scrapy.Request(url)).body == body
+    assert bodies(first) == len(set(expected.values()))
+    if segment_size < 64 * 1024 * 1024:
+        assert len([name for name in os.listdir(first.directory) if name.endswith('.pack')]) > 1
+    first.close_spider(spider)
+    second.close_spider(spider)
@@ -0,0 +1,133 @@
+"""
+The CSR link graph and PageRank (web_scraper.link_graph)
+"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from web_scraper.link_graph import (  # noqa: E402
+    EDGES_FILE, LINK_GRAPH_FILE, URLS_FILE, LinkGraphRecorder, build_csr, load_link_graph, pagerank
+)
+
+
+def dense_pagerank(links, nodes, damping=0.85):
+    """PageRank from the transition matrix, pages without links linking to every page"""
+    matrix = np.zeros((nodes, nodes))
+    for source in range(nodes):
+        targets = links.get(source, [])
+        for target in targets:
+            matrix[target, source] = 1 / len(targets)
+        if not targets:
+            matrix[:, source] = 1 / nodes
+    rank = np.full(nodes, 1 / nodes)
+    for _ in range(500):
+        rank = damping * matrix @ rank + (1 - damping) / nodes
+    return rank
+
+
+def test_build_csr():
+    sources = np.array([2, 0, 0, 1, 0, 3, 1], dtype=np.uint32)
+    targets = np.array([0, 2, 1, 1, 2, 9, 2], dtype=np.uint32)
+
+    # Duplicate links, self-links and ids past the last node are dropped
+    indptr, indices = build_csr(sources, targets, 4)
+    assert indptr.tolist() == [0, 2, 3, 4, 4]
+    assert indices.tolist() == [1, 2, 2, 0]
+    assert indices.dtype == np.int32
+
+
+def test_pagerank_matches_dense_computation():
+    rng = np.random.default_rng(23)
+    nodes = 60
+    links = {}
+    for source in range(nodes):
+        # Some pages link nowhere
+        if source % 7:
+            links[source] = sorted(set(rng.integers(0, nodes, size=rng.integers(1, 8)).tolist()) - {source})
+    sources = np.array([s for s, targets in links.items() for _ in targets], dtype=np.uint32)
+    targets = np.array([t for targets in links.values() for t in targets], dtype=np.uint32)
+
+    rank = pagerank(*build_csr(sources, targets, nodes))
+    assert rank.sum() == pytest.approx(1.0)
+    assert rank == pytest.approx(dense_pagerank(links, nodes), abs=1e-8)
+    assert len(pagerank(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32))) == 0
+
+
+def record_site(directory, previous=None, resume=False):
+    recorder = LinkGraphRecorder(str(directory), previous=previous, resume=resume)
+    recorder.add('https://www.example.com/', ['https://www.example.com/a', 'https://www.example.com/b',
+                                               'https://www.example.com/a', 'https://www.example.com/'])
+    recorder.add('https://www.example.com/a', ['https://www.example.com/b', 'https://www.example.com/pdf\n'])
+    recorder.add('https://www.example.com/b', ['https://www.example.com/', 'https://www.example.com/c'])
+    return recorder
+
+
+def test_recorded_graph(tmp_path):
+    recorder = record_site(tmp_path)
+    recorder.add('https://www.example.com/orphan', ['https://www.example.com/'])
+    summary = recorder.close(start_urls=['https://www.example.com/'])
+
+    assert summary == {'pages': 5, 'links': 6, 'fetched': 4, 'orphans': 1}
+    assert sorted(os.listdir(tmp_path)) == [LINK_GRAPH_FILE]
+
+    graph = load_link_graph(str(tmp_path / LINK_GRAPH_FILE))
+    assert len(graph) == 5
+    assert graph.links == 6
+    assert graph.url(graph.id('https://www.example.com/c')) == 'https://www.example.com/c'
+    assert graph.id('https://www.example.com/missing') is None
+    assert graph.out_links('https://www.example.com/') == ['https://www.example.com/a', 'https://www.example.com/b']
+    assert graph.out_links('https://www.example.com/c') is None
+    assert graph.orphans() == ['https://www.example.com/orphan']
+    assert graph.in_degree[graph.id('https://www.example.com/b')] == 2
+
+    # b, linked from the home page and a, ranks first among fetched pages
+    top = graph.top(2)
+    assert [url for url, _, _ in top] == ['https://www.example.com/b', 'https://www.example.com/']
+    assert graph.rank_priority('https://www.example.com/b', 100) == 100
+    assert graph.rank_priority('https://www.example.com/orphan', 100) == 0
+    assert graph.rank_priority('https://www.example.com/missing', 100) == 0
+
+
+def test_resumed_recording(tmp_path):
+    recorder = record_site(tmp_path)
+    recorder._edges.write(b'\x01\x00\x00')
+    recorder.close(keep_state=True)
+    assert os.path.exists(tmp_path / URLS_FILE)
+
+    # The torn pair is cut off and the ids carry on
+    resumed = LinkGraphRecorder(str(tmp_path), resume=True)
+    assert os.path.getsize(tmp_path / EDGES_FILE) % 8 == 0
+    resumed.add('https://www.example.com/c', ['https://www.example.com/d'])
+    assert resumed.close() == {'pages': 5, 'links': 6, 'fetched': 4, 'orphans': 0}
+
+
+def test_unchanged_pages_keep_their_links(tmp_path):
+    record_site(tmp_path).close()
+    previous = load_link_graph(str(tmp_path / LINK_GRAPH_FILE))
+
+    recorder = LinkGraphRecorder(str(tmp_path), previous=previous)
+    recorder.add('https://www.example.com/', ['https://www.example.com/a'])
+    recorder.carry('https://www.example.com/a')
+    recorder.carry('https://www.example.com/c')
+    assert recorder.rank_priority('https://www.example.com/b') == 100
+    recorder.close()
+
+    graph = load_link_graph(str(tmp_path / LINK_GRAPH_FILE))
+    assert graph.out_links('https://www.example.com/a') == ['https://www.example.com/b']
+    assert graph.out_links('https://www.example.com/c') is None
+
+
+def test_recorder_without_a_directory():
+    recorder = LinkGraphRecorder()
+    recorder.add('https://www.example.com/', ['https://www.example.com/a'])
+    assert recorder.rank_priority('https://www.example.com/') == 0
+    assert recorder.close() is None
+
+
+def test_unreadable_graph(tmp_path):
+    assert load_link_graph(str(tmp_path / LINK_GRAPH_FILE)) is None
+    (tmp_path / LINK_GRAPH_FILE).write_bytes(b'not a graph')
+    assert load_link_graph(str(tmp_path / LINK_GRAPH_FILE)) is None
@@ -0,0 +1,124 @@
+"""
+PageStore (web_scraper.page_store): interning, repair after a crash and the one-pass summary
+"""
+
+import json
+
+import pytest
+
+from web_scraper.page_store import PageStore, dump_json_stream
+from web_scraper.text_store import text_id
+
+
+def page(url, paragraphs, categories=(), kind='page'):
+    return {'kind': kind, 'url': url, 'categories': list(categories),
+            'data': {'url': url, 'title': url, 'paragraphs': list(paragraphs), 'content': {'lists': ['Shared footer']}}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PageStore(str(tmp_path / 'raw_data' / 'pages.jsonl'))
+    store.open()
+    yield store
+    store.close()
+
+
+def test_records_are_interned_and_resolved(store):
+    store.append(page('https://www.example.com/a', ['Track applicants.', 'Shared footer']))
+    store.append(page('https://www.example.com/b', ['Post jobs.', 'Shared footer']))
+
+    with open(store.path, encoding='utf-8') as f:
+        first = json.loads(f.readline())
+    # Text lists are written as references; other values as they are
+    assert first['data']['paragraphs'] == [text_id('Track applicants.'), text_id('Shared footer')]
+    assert first['data']['content']['lists'] == [text_id('Shared footer')]
+    assert first['data']['title'] == 'https://www.example.com/a'
+
+    assert store.texts.count() == 3
+    assert [data['paragraphs'] for data in store.pages()] == [
+        ['Track applicants.', 'Shared footer'], ['Post jobs.', 'Shared footer']
+    ]
+    assert next(store.pages(resolve=False))['paragraphs'] == first['data']['paragraphs']
+    assert [item['text'] for item in store.text_items()] == ['Track applicants.', 'Shared footer', 'Post jobs.']
+
+
+def test_records_filtered_by_kind(store):
+    store.append(page('https://www.example.com/', [], kind='company_info'))
+    store.append(page('https://www.example.com/a', ['A.']))
+    store.append(page('https://support.example.com/1', ['B.'], kind='article'))
+
+    assert store.count() == 2
+    assert store.count(('company_info',)) == 1
+    assert [record['url'] for record in store.records(('article',))] == ['https://support.example.com/1']
+
+
+def test_repair_drops_a_torn_last_line(store):
+    store.append(page('https://www.example.com/a', ['A.']))
+    store.append(page('https://www.example.com/b', ['B.']))
+    store.sync()
+    with open(store.path, 'a', encoding='utf-8') as f:
+        f.write('{"kind": "page", "url": "https://www.exa')
+
+    assert [record['url'] for record in store.records()] == ['https://www.example.com/a', 'https://www.example.com/b']
+    assert store.repair() == (2, 1)
+    with open(store.path, 'rb') as f:
+        assert f.read().endswith(b'}\n')
+
+
+def test_repair_drops_records_whose_texts_were_not_committed(store):
+    store.append(page('https://www.example.com/a', ['A.']))
+    records, offset = store.sync()
+    # Crash before the text store's next commit
+    store.append(page('https://www.example.com/b', ['B.']))
+    store.append(page('https://www.example.com/c', ['A.']))
+
+    recovered = PageStore(store.path)
+    try:
+        # c only refers to committed texts, but nothing after a bad record is kept
+        assert recovered.repair(records, offset) == (1, 2)
+        assert recovered.written == 1
+        assert [record['url'] for record in recovered.records()] == ['https://www.example.com/a']
+    finally:
+        recovered.close()
+    store.texts.conn.rollback()
+
+
+def test_repair_of_a_missing_store(tmp_path):
+    assert PageStore(str(tmp_path / 'pages.jsonl')).repair() == (0, 0)
+
+
+def test_summary(store):
+    fields = {'features': ['paragraphs'], 'pricing': ['paragraphs', 'headlines']}
+    store.append(page('https://www.example.com/', ['About us.'], kind='company_info'))
+    store.append(page('https://www.example.com/a', ['Feature one.', 'Feature two.'], ['features']))
+    store.append(page('https://www.example.com/b', ['Feature two.', 'Feature three.'], ['features', 'other']))
+    store.append(page('https://support.example.com/1', ['Feature one.'], ['features'], kind='article'))
+
+    summary = store.summarize(fields)
+
+    assert summary.count() == 3
+    assert summary.count(('company_info',)) == 1
+    assert summary.latest('company_info')['paragraphs'] == ['About us.']
+    assert summary.latest('missing') == {}
+    assert list(summary.category_texts('features')) == ['Feature one.', 'Feature two.', 'Feature three.']
+    assert summary.category_count('features') == 3
+    assert summary.category_count('features', unique=False) == 5
+    assert summary.has_texts('features')
+    assert not summary.has_texts('pricing')
+    assert not summary.has_texts('other')
+
+    # A second summary starts over
+    assert store.summarize(fields).category_count('features') == 3
+
+
+@pytest.mark.parametrize('sections', [
+    [],
+    [('website', 'www.example.com'), ('pages', [{'url': 'a', 'paragraphs': ['x', 'ü']}]), ('empty', [])],
+    [('summary', {'pages': 2, 'nested': {'a': [1, 2]}}), ('count', 3), ('none', None)],
+])
+def test_dump_json_stream_matches_json_dump(tmp_path, sections):
+    path = tmp_path / 'complete_scrape.json'
+    with open(path, 'w', encoding='utf-8') as f:
+        dump_json_stream(f, [(key, iter(value) if isinstance(value, list) else value) for key, value in sections])
+
+    assert path.read_text(encoding='utf-8') == json.dumps(dict(sections), indent=2, ensure_ascii=False)
@@ -0,0 +1,137 @@
+"""
+The shared frontier (web_scraper.redis_frontier) against memory:// servers
+
+Each test names its own memory:// server, so tests share nothing; two
+schedulers on the same server stand for two workers on one crawl.
+"""
+
+import json
+
+import pytest
+import scrapy
+from scrapy.http import FormRequest
+from scrapy.utils.test import get_crawler
+
+from web_scraper.redis_frontier import (
+    RedisScheduler, decode_request, encode_request, shared_frontier_settings
+)
+
+
+class FrontierSpider(scrapy.Spider):
+    name = 'frontier_test'
+
+    def parse_page(self, response, section=None):
+        pass
+
+    def page_failed(self, failure):
+        pass
+
+
+@pytest.fixture
+def frontier_url(request):
+    return f'memory://{request.node.name}'
+
+
+def open_worker(url):
+    """A RedisScheduler opened on the frontier at url, as one worker would"""
+    crawler = get_crawler(FrontierSpider, shared_frontier_settings(url))
+    crawler.spider = FrontierSpider.from_crawler(crawler)
+    scheduler = RedisScheduler.from_crawler(crawler)
+    scheduler.open(crawler.spider)
+    return scheduler
+
+
+def drain(scheduler):
+    requests = []
+    while (request := scheduler.next_request()) is not None:
+        requests.append(request)
+    return requests
+
+
+def test_request_round_trip(frontier_url):
+    spider = open_worker(frontier_url).spider
+    request = FormRequest(
+        'https://www.example.com/pricing?plan=team',
+        formdata={'q': 'ats'},
+        headers={'Accept-Language': 'en', 'X-Token': b'\xff\x00'},
+        callback=spider.parse_page,
+        errback=spider.page_failed,
+        cb_kwargs={'section': 'pricing'},
+        meta={'depth': 2, 'source_url': 'https://www.example.com/', 'sitemap_lastmod': None},
+        priority=7,
+        dont_filter=True
+    )
+
+    decoded = decode_request(encode_request(request, spider), spider)
+
+    assert type(decoded) is FormRequest
+    assert decoded.url == request.url
+    assert decoded.method == 'POST'
+    assert decoded.body == request.body
+    assert decoded.headers.getlist('X-Token') == [b'\xff\x00']
+    assert decoded.headers.getlist('Accept-Language') == [b'en']
+    assert decoded.callback == spider.parse_page
+    assert decoded.errback == spider.page_failed
+    assert decoded.cb_kwargs == {'section': 'pricing'}
+    assert decoded.meta == request.meta
+    assert decoded.priority == 7
+    assert decoded.dont_filter
+
+
+def test_meta_json_cannot_carry_stays_local(frontier_url):
+    scheduler = open_worker(frontier_url)
+    request = scrapy.Request('https://www.example.com/a', meta={'bounds': (1, 2)})
+
+    assert encode_request(request, scheduler.spider) is None
+    assert scheduler.enqueue_request(request)
+    assert scheduler.stats.get_value('scheduler/enqueued/memory') == 1
+    assert scheduler.server.zcard(scheduler.queue_key) == 0
+    assert drain(scheduler)[0].meta['bounds'] == (1, 2)
+
+
+def test_decode_refuses_classes_other_than_requests(frontier_url):
+    spider = open_worker(frontier_url).spider
+    data = json.loads(encode_request(scrapy.Request('https://www.example.com/'), spider))
+    data['_class'] = 'os.system'
+
+    with pytest.raises(ValueError):
+        decode_request(json.dumps(data), spider)
+
+
+def test_malformed_entries_are_dropped(frontier_url):
+    scheduler = open_worker(frontier_url)
+    scheduler.server.zadd(scheduler.queue_key, {(1).to_bytes(8, 'big') + b'not json': 0})
+
+    assert scheduler.next_request() is None
+    assert scheduler.stats.get_value('scheduler/dequeued/redis/malformed') == 1
+
+
+def test_seen_requests_are_shared_between_workers(frontier_url):
+    first, second = open_worker(frontier_url), open_worker(frontier_url)
+
+    assert first.enqueue_request(scrapy.Request('https://www.example.com/a'))
+    assert not second.enqueue_request(scrapy.Request('https://www.example.com/a'))
+    assert second.enqueue_request(scrapy.Request('https://www.example.com/b'))
+
+    # Every worker yields the start page; only the first one is kept
+    start = {'is_start_request': True}
+    assert first.enqueue_request(scrapy.Request('https://www.example.com/', dont_filter=True, meta=start))
+    assert not second.enqueue_request(scrapy.Request('https://www.example.com/', dont_filter=True, meta=start))
+
+    # Other dont_filter requests are not filtered
+    assert second.enqueue_request(scrapy.Request('https://www.example.com/a', dont_filter=True))
+
+    assert first.server.scard(first.df.key) == 3
+    assert len(first) == 4
+
+
+def test_queue_order(frontier_url):
+    first, second = open_worker(frontier_url), open_worker(frontier_url)
+    for name, priority in [('low', -5), ('a', 0), ('high', 10), ('b', 0), ('c', 0)]:
+        first.enqueue_request(scrapy.Request(f'https://www.example.com/{name}', priority=priority))
+
+    # Highest priority first, equal priorities first in, first out, whichever worker pops
+    popped = [first.next_request(), second.next_request(), first.next_request()]
+    popped += drain(second)
+    assert [request.url.rsplit('/', 1)[1] for request in popped] == ['high', 'a', 'b', 'c', 'low']
+    assert not first.server.zcard(first.queue_key)
@@ -0,0 +1,114 @@
+"""
+Change-rate estimates and refresh plans (web_scraper.revisit)
+"""
+
+import math
+import random
+
+import pytest
+
+from web_scraper.revisit import (
+    DAY, RevisitHistory, budget_pages, change_rate, content_digest, freshness_gain
+)
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = RevisitHistory(str(tmp_path / 'revisits.sqlite'))
+    yield history
+    history.close()
+
+
+def visit(history, url, digest, day):
+    """Visit a page in the crawl that started on day"""
+    history.started = day * DAY
+    return history.observe(url, digest, now=day * DAY)
+
+
+@pytest.mark.parametrize('rate', [0.1, 0.3, 1.0])
+def test_estimator_recovers_poisson_rates(rate):
+    # A page changing at rate per day, visited daily for a few years
+    rng = random.Random(24)
+    visits = 2000
+    changes = sum(rng.random() < -math.expm1(-rate) for _ in range(visits))
+
+    estimate = change_rate(visits, changes, visits * DAY)
+    assert estimate == pytest.approx(rate, rel=0.2)
+    # Counting changes seen, not changes made, would underestimate fast pages
+    if rate >= 1:
+        assert changes / visits < 0.7 * rate
+
+
+def test_change_rate_bounds():
+    assert change_rate(0, 0, 0) == 1 / 7
+    assert change_rate(0, 0, 0, default_rate=0.5) == 0.5
+    assert change_rate(30, 0, 30 * DAY) == 1 / 90
+    assert change_rate(30, 0, 30 * DAY, min_rate=0.001) == 0.001
+    # A page that changed at every visit has a finite estimate
+    assert 1 < change_rate(10, 10, 10 * DAY) < 4
+
+
+def test_freshness_gain():
+    # Never visited again: certainly stale, worth fetching
+    assert freshness_gain(0.1, math.inf, 1.0) == pytest.approx(-math.expm1(-0.1) / 0.1)
+    # Just visited: nothing to gain
+    assert freshness_gain(0.1, 0, 1.0) == 0
+    # Longer unchecked, more to gain
+    assert freshness_gain(0.1, 10, 1.0) > freshness_gain(0.1, 1, 1.0)
+    # A page changing many times a day goes stale again before it is used
+    assert freshness_gain(50, 30, 1.0) < freshness_gain(1, 30, 1.0)
+
+
+def test_budget_pages():
+    assert budget_pages(25, 1000) == 25
+    assert budget_pages('25', 1000) == 25
+    assert budget_pages('10%', 1001) == 101
+    assert budget_pages(' 0.5% ', 100) == 1
+
+
+def test_content_digest_leaves_out_scrape_time():
+    page = {'url': 'https://www.example.com/', 'paragraphs': ['a'], 'scraped_at': '2026-10-01'}
+    assert content_digest(page) == content_digest(dict(page, scraped_at='2026-10-17'))
+    assert content_digest(page) != content_digest(dict(page, paragraphs=['b']))
+
+
+def test_observe(history):
+    url = 'https://www.example.com/pricing'
+    assert not visit(history, url, 'v1', 0)
+    assert not visit(history, url, 'v1', 1)
+    assert visit(history, url, 'v2', 2)
+    # A 304 is a visit that found no change
+    assert not visit(history, url, None, 3)
+    # Seen twice in one crawl counts once
+    assert not history.observe(url, 'v3', now=3 * DAY + 60)
+    assert visit(history, url, 'v3', 4)
+
+    rate, last_visit = history.rates()[url]
+    assert last_visit == 4 * DAY
+    assert rate == pytest.approx(change_rate(4, 2, 4 * DAY))
+
+
+def test_plan(history):
+    for day in range(30):
+        visit(history, 'https://www.example.com/pricing', f'v{day}', day)
+        visit(history, 'https://www.example.com/about', 'v0', day)
+        visit(history, 'https://www.example.com/blog', f'v{day // 10}', day)
+
+    urls = ['https://www.example.com/' + name for name in ('about', 'blog', 'pricing', 'new', 'home')]
+    now = 31 * DAY
+    assert history.plan(urls, 2, always=['https://www.example.com/home'], now=now) == [
+        'https://www.example.com/home', 'https://www.example.com/new'
+    ]
+    # Pages never checked first, then by rate: the others were all last visited on day 29
+    assert history.plan(urls[:4], 4, now=now) == [
+        'https://www.example.com/new', 'https://www.example.com/pricing',
+        'https://www.example.com/blog', 'https://www.example.com/about'
+    ]
+    assert history.plan(urls, 0, now=now) == []
+
+
+def test_history_without_a_path_records_nothing():
+    history = RevisitHistory()
+    assert not history.observe('https://www.example.com/', 'v1')
+    assert history.rates() == {}
+    history.close()
@@ -0,0 +1,129 @@
+"""
+The knowledge-base search index (web_scraper.search) and SearchIndexPipeline
+"""
+
+import os
+
+import pytest
+import scrapy
+from scrapy.utils.test import get_crawler
+
+from web_scraper.items import WebScraperItem
+from web_scraper.pipelines import SearchIndexPipeline
+from web_scraper.search import SEARCH_INDEX_FILE, SearchIndex, match_expression, search
+
+
+SITE = 'brightmove/support'
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = SearchIndex(str(tmp_path / SEARCH_INDEX_FILE))
+    yield index
+    index.close()
+
+
+def document(url, title, body, section='page', site=SITE):
+    return (site, f'https://support.brightmove.com{url}', section, title, body)
+
+
+def urls(hits):
+    return [hit['url'].split('.com', 1)[1] for hit in hits]
+
+
+def test_match_expression():
+    assert match_expression('candidate import') == '"candidate" "import"'
+    # FTS5 syntax in a plain-text query is taken literally
+    assert match_expression('"resume" OR parse*') == '"resume" "OR" "parse"'
+    assert match_expression(' -- ') == ''
+
+
+def test_update_rewrites_only_changed_documents(index):
+    documents = [
+        document('/a', 'Importing candidates', 'Upload a CSV of candidates.'),
+        document('/b', 'Job boards', 'Post jobs to every board.'),
+    ]
+    assert index.update(documents, crawl='1') == 2
+    assert index.update(documents, crawl='2') == 0
+    assert index.update([document('/b', 'Job boards', 'Advertise on every job site.')], crawl='2') == 1
+
+    assert urls(index.search('job site')) == ['/b']
+    assert urls(index.search('post')) == []
+    assert urls(index.search('csv')) == ['/a']
+
+
+def test_title_matches_rank_first(index):
+    index.update([
+        document('/body', 'Getting started', 'How to import candidates from a spreadsheet.'),
+        document('/title', 'Import candidates', 'Start from the people page.'),
+    ])
+
+    hits = index.search('import candidates')
+    assert urls(hits) == ['/title', '/body']
+    assert hits[0]['score'] < hits[1]['score']
+    assert '[' in hits[1]['snippet']
+
+
+def test_search_filters(index):
+    index.update([
+        document('/a', 'Webhooks', 'Send webhooks on new applicants.'),
+        document('/a', 'Webhooks', 'Send webhooks on new applicants.', section='api_docs'),
+        document('/a', 'Webhooks', 'Send webhooks on new applicants.', site='brightmove'),
+    ])
+
+    assert len(index.search('webhooks')) == 3
+    assert [hit['section'] for hit in index.search('webhooks', section='api_docs')] == ['api_docs']
+    assert {hit['site'] for hit in index.search('webhooks', site='brightmove')} == {'brightmove'}
+    assert len(index.search('webhook* OR missing', raw=True)) == 3
+    assert index.search('') == []
+    assert index.sites() == {'brightmove': {'pages': 1, 'snippets': 0}, SITE: {'pages': 1, 'snippets': 1}}
+
+
+def test_prune_removes_what_a_crawl_did_not_see(index):
+    index.update([document('/a', 'A', 'kept page'), document('/b', 'B', 'removed page')], crawl='1')
+    index.update([document('/a', 'A', 'other site page', site='brightmove')], crawl='1')
+    index.update([document('/a', 'A', 'kept page')], crawl='2')
+
+    assert index.prune(SITE, '2') == 1
+    assert urls(index.search('page')) == ['/a', '/a']
+    assert index.search('removed') == []
+
+
+def test_search_merges_indexes(tmp_path):
+    paths = []
+    for name, body in (('one', 'candidate pipeline stages'), ('two', 'candidate candidate pipeline')):
+        index = SearchIndex(str(tmp_path / name / SEARCH_INDEX_FILE))
+        index.update([document(f'/{name}', 'Pipeline', body)])
+        index.close()
+        paths.append(str(tmp_path / name / SEARCH_INDEX_FILE))
+
+    hits = search('candidate pipeline', paths=paths)
+    assert sorted(urls(hits)) == ['/one', '/two']
+    assert hits[0]['score'] <= hits[1]['score']
+    assert len(search('candidate', paths=paths, limit=1)) == 1
+
+
+def test_pipeline(tmp_path):
+    crawler = get_crawler(scrapy.Spider, {'SEARCH_INDEX_ENABLED': True, 'SEARCH_INDEX_BATCH': 2})
+    spider = scrapy.Spider.from_crawler(crawler, name='search_test')
+    spider.knowledge_base_dir = str(tmp_path)
+    spider.website_content_dir = str(tmp_path / 'website_content')
+    spider.page_store_path = os.path.join(spider.website_content_dir, 'brightmove', 'support', 'raw_data', 'pages.jsonl')
+    spider.category_fields = {'api_docs': ('paragraphs', 'code_blocks')}
+    spider.started_at = '2026-10-17T00:00:00'
+    pipeline = SearchIndexPipeline.from_crawler(crawler)
+    pipeline.open_spider(spider)
+
+    pipeline.process_item(WebScraperItem(kind='company_info', url='https://support.brightmove.com/', categories=[],
+                                         data={'title': 'Home', 'paragraphs': ['Welcome']}), spider)
+    pipeline.process_item(WebScraperItem(
+        kind='article', url='https://support.brightmove.com/api', categories=['api_docs', 'faqs'],
+        data={'title': 'API', 'paragraphs': ['Call the REST API.'], 'code_blocks': ['GET /jobs'], 'links': ['/x']}
+    ), spider)
+    assert crawler.stats.get_value('search/documents_seen') == 2
+    pipeline.close_spider(spider)
+
+    assert pipeline.index.sites() == {SITE: {'pages': 1, 'snippets': 1}}
+    assert sorted(hit['section'] for hit in pipeline.index.search('GET jobs')) == ['api_docs', 'page']
+    assert pipeline.index.search('welcome') == []
+    pipeline.index.close()
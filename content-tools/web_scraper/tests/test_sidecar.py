@@ -0,0 +1,92 @@
+"""
+The complete_scrape sidecar (web_scraper.sidecar) written next to a JSON file under tmp_path
+"""
+
+import hashlib
+import json
+import os
+
+import pytest
+
+from web_scraper.page_store import dump_json_stream
+from web_scraper.sidecar import SidecarWriter, open_sidecar, sidecar_paths
+
+
+def ref(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+TEXTS = [f'Paragraph {n} about applicant tracking.' for n in range(40)]
+
+
+def sections():
+    return [
+        ('website', 'www.example.com'),
+        ('summary', {'pages': 8, 'texts': len(TEXTS)}),
+        ('pages', iter([
+            {'url': f'https://www.example.com/{n}', 'paragraphs': [ref(text) for text in TEXTS[n * 5:n * 5 + 5]]}
+            for n in range(8)
+        ])),
+        ('features', iter(ref(text) for text in TEXTS[::7])),
+        ('empty', iter([])),
+        ('texts', iter({'id': ref(text), 'text': text} for text in TEXTS))
+    ]
+
+
+def write(json_path, **kwargs):
+    with open(json_path, 'w', encoding='utf-8') as f, SidecarWriter(json_path, **kwargs) as sidecar:
+        dump_json_stream(f, sections(), sidecar)
+
+
+@pytest.mark.parametrize('text_chunk', [65536, 7, 1])
+def test_round_trip(tmp_path, text_chunk):
+    json_path = str(tmp_path / 'complete_scrape.json')
+    write(json_path, text_chunk=text_chunk)
+
+    with open(json_path, encoding='utf-8') as f:
+        document = json.load(f)
+    sidecar = open_sidecar(json_path)
+    assert sidecar is not None
+    assert sidecar.counts == {'website': 1, 'summary': 2, 'pages': 8, 'features': 6, 'empty': 0, 'texts': 40}
+    assert sidecar.header['texts'] == 40
+    assert sidecar.value('website') == document['website']
+    assert sidecar.value('summary') == document['summary']
+    assert sidecar.value('pages') == document['pages']
+    assert sidecar.value('empty') == []
+    assert sidecar.get('pages', 3, resolve=True)['paragraphs'] == TEXTS[15:20]
+    assert sidecar.get('features', 2, resolve=True) == TEXTS[14]
+    assert all(sidecar.text(ref(text)) == text for text in TEXTS)
+    assert sidecar.text('00' * 8) == '00' * 8
+    with pytest.raises(IndexError):
+        sidecar.get('pages', 8)
+    sidecar.close()
+
+    # Nothing is left behind but the sidecar itself
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        ['complete_scrape.json'] + [os.path.basename(path) for path in sidecar_paths(json_path)]
+    )
+
+
+def test_chunked_index_matches_in_memory_index(tmp_path):
+    # Merging the sorted chunks gives the index sorting all entries at once gives
+    indexes = []
+    for text_chunk in (65536, 3):
+        json_path = str(tmp_path / str(text_chunk) / 'complete_scrape.json')
+        os.makedirs(os.path.dirname(json_path))
+        write(json_path, text_chunk=text_chunk)
+        with open(sidecar_paths(json_path)[1], 'rb') as f:
+            indexes.append(f.read())
+    assert indexes[0] == indexes[1]
+
+
+def test_failed_write_leaves_no_sidecar(tmp_path):
+    json_path = str(tmp_path / 'complete_scrape.json')
+    with pytest.raises(RuntimeError):
+        with SidecarWriter(json_path, text_chunk=2) as sidecar:
+            sidecar.start_list('texts')
+            for text in TEXTS[:5]:
+                sidecar.element({'id': ref(text), 'text': text})
+            raise RuntimeError('crawl interrupted')
+
+    assert os.listdir(tmp_path) == []
+    assert open_sidecar(json_path) is None
@@ -0,0 +1,113 @@
+"""
+support_api_spider against tools/mock_help_center_api.py
+
+Each test crawls a copy of the project, so the knowledge base it writes
+stays out of the repository; every crawl is its own `scrapy crawl`, since
+a reactor cannot be restarted in one process.
+"""
+
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_mock_api():
+    path = os.path.join(PROJECT_DIR, 'tools', 'mock_help_center_api.py')
+    spec = importlib.util.spec_from_file_location('mock_help_center_api', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+mock_api = load_mock_api()
+
+
+@pytest.fixture
+def help_center():
+    """A running mock API; set_articles() changes what it serves"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), mock_api.HelpCenterHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def set_articles(**kwargs):
+        handler = mock_api.HelpCenterHandler
+        handler.collections, handler.articles = mock_api.build_help_center(2, 20, 0, **kwargs)
+    set_articles()
+    set_articles.url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield set_articles
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def project(tmp_path):
+    """A copy of the project whose spiders write their knowledge base under tmp_path"""
+    copy = tmp_path / 'web_scraper'
+    copy.mkdir()
+    shutil.copy(os.path.join(PROJECT_DIR, 'scrapy.cfg'), copy)
+    shutil.copytree(os.path.join(PROJECT_DIR, 'web_scraper'), copy / 'web_scraper',
+                    ignore=shutil.ignore_patterns('__pycache__'))
+    return copy
+
+
+def crawl(project, api_url, *args):
+    command = [sys.executable, '-m', 'scrapy', 'crawl', 'support_api_spider', '-a', f'api_url={api_url}',
+               '-s', 'HTTPCACHE_ENABLED=False', '-s', 'ROBOTSTXT_OBEY=False', '-s', 'RETRY_ENABLED=False']
+    for arg in args:
+        command += ['-a', arg]
+    result = subprocess.run(command, cwd=project, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    return result.stderr
+
+
+def article_urls(project):
+    path = project / 'knowledge-base' / 'website_content' / 'brightmove' / 'support' / 'raw_data' / 'pages.jsonl'
+    with open(path, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    return {record['url'] for record in records if record['kind'] == 'article'}
+
+
+def article_url(article_id):
+    articles = mock_api.build_help_center(2, 20, 0)[1]
+    return next(article['url'] for article in articles if article['id'] == str(article_id))
+
+
+def test_unpublished_and_deleted_articles_are_dropped(project, help_center):
+    crawl(project, help_center.url)
+    assert len(article_urls(project)) == 20
+
+    # An incremental crawl lists the draft, which was updated, but not the
+    # deleted article, whose stored record it keeps
+    help_center(drafts=(1,), deleted=(2,))
+    log = crawl(project, help_center.url)
+    urls = article_urls(project)
+    assert article_url(1) not in urls
+    assert article_url(2) in urls
+    assert 'reused: 19, removed: 1' in log
+
+    # A full listing shows the deleted article is gone
+    log = crawl(project, help_center.url, 'full=1')
+    urls = article_urls(project)
+    assert article_url(1) not in urls
+    assert article_url(2) not in urls
+    assert len(urls) == 18
+    assert 'removed: 1' in log
+
+
+def test_failed_full_listing_keeps_stored_articles(project, help_center):
+    crawl(project, help_center.url)
+
+    # Nothing answers, so a full crawl cannot tell which articles were deleted
+    log = crawl(project, 'http://127.0.0.1:9', 'full=1')
+    assert len(article_urls(project)) == 20
+    assert 'removed: 0' in log
@@ -0,0 +1,70 @@
+"""
+TextStore (web_scraper.text_store): one row per distinct text, in first-seen order
+"""
+
+import pytest
+
+from web_scraper.text_store import MAX_VARIABLES, TextStore, text_id
+
+
+@pytest.fixture
+def texts(tmp_path):
+    store = TextStore(str(tmp_path / 'raw_data' / 'texts.sqlite'))
+    yield store
+    store.close()
+
+
+def test_text_id():
+    assert text_id('Post jobs.') == text_id('Post jobs.')
+    assert text_id('Post jobs.') != text_id('Post jobs')
+    assert len(text_id('Ünïcode')) == 16
+
+
+def test_intern_keeps_each_text_once(texts):
+    refs = [texts.intern(text) for text in ['Footer', 'Pricing', 'Footer', 'Features', 'Pricing']]
+
+    assert refs == [text_id(text) for text in ['Footer', 'Pricing', 'Footer', 'Features', 'Pricing']]
+    assert texts.count() == 3
+    assert list(texts.items()) == [(text_id(text), text) for text in ['Footer', 'Pricing', 'Features']]
+
+
+def test_lookup_more_references_than_sqlite_variables(texts):
+    refs = [texts.intern(f'Paragraph {n}') for n in range(MAX_VARIABLES * 2 + 10)]
+
+    found = texts.lookup(refs + refs[:5] + ['0' * 16])
+    assert len(found) == len(refs)
+    assert found[refs[-1]] == f'Paragraph {len(refs) - 1}'
+
+
+def test_commits_in_batches(texts):
+    for n in range(TextStore.COMMIT_EVERY + 1):
+        texts.intern(f'Paragraph {n}')
+
+    # Another connection sees the committed batch but not the text after it
+    reader = TextStore(texts.path)
+    try:
+        assert reader.count() == TextStore.COMMIT_EVERY
+        texts.commit()
+        assert reader.count() == TextStore.COMMIT_EVERY + 1
+    finally:
+        reader.close()
+
+
+def test_category_refs(texts):
+    a, b, c = (texts.intern(text) for text in 'abc')
+
+    assert texts.file_refs('features', [b, a]) == 2
+    assert texts.file_refs('features', [a, c]) == 1
+    assert texts.file_refs('pricing', [a]) == 1
+    assert list(texts.category_refs('features')) == [b, a, c]
+    assert list(texts.category_refs('missing')) == []
+
+    texts.clear_categories()
+    assert list(texts.category_refs('features')) == []
+
+
+def test_clear(texts):
+    texts.intern('Footer')
+    texts.clear()
+    assert texts.count() == 0
+    assert texts.lookup([text_id('Footer')]) == {}
@@ -0,0 +1,62 @@
+"""
+URL canonicalization and site policies (web_scraper.url_policy)
+"""
+
+import pytest
+
+from web_scraper.url_policy import UrlPolicy, load_url_policy
+
+
+@pytest.mark.parametrize('url, canonical', [
+    ('https://www.example.com', 'https://www.example.com/'),
+    ('HTTPS://WWW.Example.COM/Pricing#plans', 'https://www.example.com/Pricing'),
+    ('https://www.example.com:443/a', 'https://www.example.com/a'),
+    ('http://www.example.com:80/a', 'http://www.example.com/a'),
+    ('https://www.example.com:8443/a', 'https://www.example.com:8443/a'),
+    ('http://www.example.com:443/a', 'http://www.example.com:443/a'),
+    ('https://www.example.com/a?utm_source=mail&utm_campaign=spring', 'https://www.example.com/a'),
+    ('https://www.example.com/a?b=2&gclid=x&a=1&UTM_Medium=y&ref=home', 'https://www.example.com/a?a=1&b=2'),
+    ('https://www.example.com/a?page=', 'https://www.example.com/a?page='),
+    ('https://www.example.com/caf%c3%a9 menu', 'https://www.example.com/caf%C3%A9%20menu'),
+])
+def test_canonicalize(url, canonical):
+    assert UrlPolicy().canonicalize(url) == canonical
+
+
+def test_canonicalize_without_query():
+    assert UrlPolicy(keep_query=False).canonicalize('https://www.example.com/a?page=2#top') == 'https://www.example.com/a'
+
+
+def test_support_policy():
+    policy = load_url_policy('support.brightmove.com')
+
+    assert policy.canonicalize('https://support.brightmove.com/en/articles/1?q=jobs') == \
+        'https://support.brightmove.com/en/articles/1'
+    assert policy.allows('https://support.brightmove.com/en')
+    assert policy.allows('https://support.brightmove.com/en/articles/1')
+    # Other locales, search results, print views and files are not crawled
+    assert not policy.allows('https://support.brightmove.com/fr/articles/1')
+    assert not policy.allows('https://support.brightmove.com/english')
+    assert not policy.allows('https://support.brightmove.com/en/search')
+    assert not policy.allows('https://support.brightmove.com/en/print/articles/1')
+    assert not policy.allows('https://support.brightmove.com/en/guide.pdf')
+    assert not policy.allows('https://www.brightmove.com/en/articles/1')
+
+
+def test_sites_without_a_policy_allow_everything():
+    policy = load_url_policy('www.example.com')
+    assert policy.allows('https://anything.example.org/x.pdf')
+    assert policy.canonicalize('https://www.example.com/a?x=1&utm_source=y') == 'https://www.example.com/a?x=1'
+
+
+def test_links():
+    policy = load_url_policy('support.brightmove.com')
+    links = [
+        '/en/articles/1', 'articles/1#steps', '/en/articles/1?utm_source=nav', ' /en/articles/2 ',
+        '#top', 'javascript:void(0)', 'mailto:help@brightmove.com', 'tel:123', '', None,
+        'https://support.brightmove.com:99999/en/x', '/fr/articles/1', '/en/search?q=ats',
+    ]
+
+    assert list(policy.links('https://support.brightmove.com/en/', links)) == [
+        'https://support.brightmove.com/en/articles/1', 'https://support.brightmove.com/en/articles/2'
+    ]
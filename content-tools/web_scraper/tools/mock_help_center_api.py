@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Local mock of the help center JSON API used by support_api_spider
+
+Serves a generated help center (collections and articles) with the same
+paginated list format as Intercom's /help_center/collections and /articles
+endpoints, and honours the updated_after filter the spider sends on
+incremental crawls. Every request is counted and printed.
+
+Usage:
+    python tools/mock_help_center_api.py --port 8770 --collections 8 --articles 400
+    scrapy crawl support_api_spider -a api_url=http://127.0.0.1:8770
+
+Restart with --touch N to mark the N newest articles as updated, then crawl
+again to exercise the incremental cursor. --draft ID and --delete ID
+unpublish or remove an article.
+"""
+
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+SITE_URL = 'https://support.brightmove.com/en'
+
+WORDS = (
+    'candidate job posting applicant pipeline recruiter resume interview offer '
+    'workflow report dashboard integration email calendar onboarding client '
+    'placement timesheet invoice permission user role field search filter export'
+).split()
+
+
+def build_help_center(collections, articles, touch, seed=1, drafts=(), deleted=()):
+    """Generate collections and articles with stable ids and timestamps
+
+    Articles whose ids are in drafts were unpublished since the server last
+    ran; those in deleted are left out.
+    """
+    rng = random.Random(seed)
+    base_time = 1700000000
+    collection_list = []
+    for i in range(1, collections + 1):
+        name = f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}"
+        collection_list.append({
+            'type': 'collection',
+            'id': str(1000 + i),
+            'name': name,
+            'description': f"Everything about {name.lower()}.",
+            'url': f"{SITE_URL}/collections/{1000 + i}-{name.lower().replace(' ', '-')}",
+            'updated_at': base_time
+        })
+
+    article_list = []
+    for i in range(1, articles + 1):
+        title = ' '.join(rng.choice(WORDS) for _ in range(4)).capitalize()
+        paragraphs = ''.join(
+            f"<p>{' '.join(rng.choice(WORDS) for _ in range(30))}.</p>" for _ in range(rng.randint(2, 6))
+        )
+        steps = ''.join(f"<li>{' '.join(rng.choice(WORDS) for _ in range(6))}</li>" for _ in range(rng.randint(0, 5)))
+        body = f"<h2>{title}</h2>{paragraphs}<ul>{steps}</ul>"
+        if i % 7 == 0:
+            body += "<pre>GET /api/v1/candidates?page=1</pre>"
+        article_list.append({
+            'type': 'article',
+            'id': str(i),
+            'title': title,
+            'description': '',
+            'body': body,
+            'state': 'published' if i % 25 else 'draft',
+            'created_at': base_time + i,
+            'updated_at': base_time + i * 60,
+            'url': f"{SITE_URL}/articles/{i}-{title.lower().replace(' ', '-')}",
+            'parent_id': collection_list[i % collections]['id'] if collections else None,
+            'parent_type': 'collection'
+        })
+
+    # Articles edited since the server last ran
+    now = int(time.time())
+    for article in article_list[-touch:] if touch else []:
+        article['updated_at'] = now
+        article['body'] += f"<p>Updated {now}.</p>"
+    for article in article_list:
+        if int(article['id']) in drafts and article['state'] == 'published':
+            article['state'] = 'draft'
+            article['updated_at'] = now
+    article_list = [article for article in article_list if int(article['id']) not in deleted]
+    return collection_list, article_list
+
+
+class HelpCenterHandler(BaseHTTPRequestHandler):
+    collections = []
+    articles = []
+    request_count = 0
+
+    def do_GET(self):
+        HelpCenterHandler.request_count += 1
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == '/help_center/collections':
+            records = self.collections
+        elif url.path == '/articles':
+            records = self.articles
+            if 'updated_after' in query:
+                updated_after = int(query['updated_after'][0])
+                records = [article for article in records if article['updated_at'] > updated_after]
+        else:
+            self.send_error(404)
+            return
+
+        page = max(1, int(query.get('page', ['1'])[0]))
+        per_page = max(1, min(150, int(query.get('per_page', ['50'])[0])))
+        total_pages = max(1, (len(records) + per_page - 1) // per_page)
+        body = json.dumps({
+            'type': 'list',
+            'data': records[(page - 1) * per_page:page * per_page],
+            'total_count': len(records),
+            'pages': {'type': 'pages', 'page': page, 'per_page': per_page, 'total_pages': total_pages}
+        }).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"[{HelpCenterHandler.request_count}] {self.command} {self.path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock help center JSON API')
+    parser.add_argument('--port', type=int, default=8770)
+    parser.add_argument('--collections', type=int, default=8)
+    parser.add_argument('--articles', type=int, default=400)
+    parser.add_argument('--touch', type=int, default=0, help='Mark the N newest articles as just updated')
+    parser.add_argument('--draft', type=int, action='append', default=[], help='Unpublish the article with this id')
+    parser.add_argument('--delete', type=int, action='append', default=[], help='Leave out the article with this id')
+    args = parser.parse_args()
+
+    HelpCenterHandler.collections, HelpCenterHandler.articles = build_help_center(
+        args.collections, args.articles, args.touch, drafts=args.draft, deleted=args.delete
+    )
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), HelpCenterHandler)
+    print(f"🚀 Mock help center API on http://127.0.0.1:{args.port} "
+          f"({args.collections} collections, {args.articles} articles)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 Served {HelpCenterHandler.request_count} requests")
+
+
+if __name__ == '__main__':
+    main()
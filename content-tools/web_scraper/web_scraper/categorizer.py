@@ -0,0 +1,88 @@
+"""
+Keyword rules that file scraped pages under content categories
+
+The rules for every spider live in category_rules.json as named profiles.
+Each profile is an ordered list of categories, each with the URL keywords
+that select it and the page fields whose text is filed under it. A profile
+is compiled into one Aho-Corasick automaton, so a URL is categorized in a
+single pass over its characters however many categories and keywords there
+are, instead of one substring scan per keyword.
+"""
+
+import json
+import os
+from collections import deque
+
+
+RULES_FILE = os.path.join(os.path.dirname(__file__), 'category_rules.json')
+
+
+class Categorizer:
+    """Compiled category rules for one profile"""
+
+    def __init__(self, rules):
+        # rules: [{'category': ..., 'keywords': [...], 'fields': [...]}, ...]
+        self.categories = [rule['category'] for rule in rules]
+        self.fields = {rule['category']: tuple(rule['fields']) for rule in rules}
+
+        # Trie of keywords; each node's output is a bitmask of category indexes
+        self._goto = [{}]
+        self._output = [0]
+        for index, rule in enumerate(rules):
+            for keyword in rule['keywords']:
+                node = 0
+                for char in keyword.lower():
+                    next_node = self._goto[node].get(char)
+                    if next_node is None:
+                        next_node = len(self._goto)
+                        self._goto.append({})
+                        self._output.append(0)
+                        self._goto[node][char] = next_node
+                    node = next_node
+                self._output[node] |= 1 << index
+
+        # Failure links, breadth first (children of the root fail to the root),
+        # merging in the outputs of keywords that end at the same position
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] |= self._output[self._fail[child]]
+
+    def match(self, text):
+        """Bitmask of the categories whose keywords occur anywhere in text"""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        matched = 0
+        for char in text.lower():
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            matched |= output[node]
+        return matched
+
+    def categorize(self, url):
+        """Category names for a URL, in rule order"""
+        matched = self.match(url)
+        return [category for index, category in enumerate(self.categories) if matched >> index & 1]
+
+
+_categorizers = {}
+
+
+def load_categorizer(profile, path=RULES_FILE):
+    """Return the compiled Categorizer for a profile of the rules file"""
+    key = (path, profile)
+    if key not in _categorizers:
+        with open(path, 'r', encoding='utf-8') as f:
+            profiles = json.load(f)
+        if profile not in profiles:
+            raise KeyError(f"No category profile '{profile}' in {path}")
+        _categorizers[key] = Categorizer(profiles[profile])
+    return _categorizers[key]
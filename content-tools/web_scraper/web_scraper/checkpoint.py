@@ -0,0 +1,108 @@
+"""
+Crash-safe output: atomic file writes and crawl checkpoints
+
+Every knowledge-base file is written with atomic_write(): to a temporary
+file in the same directory, flushed to disk and renamed over the old one,
+so a kill during save_organized_content() leaves each file either as it was
+or complete, never truncated.
+
+During a crawl WebScraperPipeline checkpoints the page store every
+CHECKPOINT_INTERVAL seconds or CHECKPOINT_ITEMS records: the text store is
+committed, pages.jsonl is synced, and raw_data/checkpoint.json records how
+many records (and bytes) are durable, together with the spider, its
+arguments and the dedup counters. From that file an interrupted crawl can
+resume without losing records, and recover_scraper.py can rebuild a
+spider's outputs from the stored records without downloading anything.
+"""
+
+import glob
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
+
+
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# Where the spiders keep their knowledge-base directories: next to the
+# project, and one level up (inovium_spider)
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KNOWLEDGE_BASE_DIRS = (
+    os.path.join(PROJECT_DIR, 'knowledge-base'),
+    os.path.join(os.path.dirname(PROJECT_DIR), 'knowledge-base')
+)
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding='utf-8'):
+    """Open a file for writing that replaces path only once it is complete
+
+    The data goes to a hidden temporary file next to path, which is synced
+    and renamed over path when the block ends without an exception. If the
+    block fails, path is left untouched.
+    """
+    directory = os.path.dirname(path) or '.'
+    temporary = os.path.join(directory, f".{os.path.basename(path)}.tmp")
+    try:
+        with open(temporary, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    # Make the rename itself durable
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def checkpoint_path(page_store_path):
+    """The checkpoint file kept next to a page store"""
+    return os.path.join(os.path.dirname(page_store_path), CHECKPOINT_FILE)
+
+
+def read_checkpoint(path):
+    """The checkpoint at path, or None if there is none (or it is unreadable)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_checkpoint(path, spider, state, records, offset, stats):
+    """Record how much of the page store is durable and what wrote it
+
+    state is 'crawling' while the crawl runs, 'crawled' once every record is
+    stored and 'saved' once the spider has written its outputs.
+    """
+    checkpoint = {
+        'spider': spider.name,
+        'crawl_args': getattr(spider, 'crawl_args', {}),
+        'state': state,
+        'records': records,
+        'offset': offset,
+        'stats': {key: value for key, value in stats.get_stats().items() if key.startswith('dedup/')},
+        'saved_at': datetime.now().isoformat()
+    }
+    with atomic_write(path) as f:
+        json.dump(checkpoint, f, indent=2)
+    return checkpoint
+
+
+def find_checkpoints(directories=KNOWLEDGE_BASE_DIRS):
+    """Every checkpoint under the knowledge-base directories, with its path"""
+    checkpoints = []
+    for directory in directories:
+        pattern = os.path.join(directory, '**', 'raw_data', CHECKPOINT_FILE)
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            checkpoint = read_checkpoint(path)
+            if checkpoint is not None:
+                checkpoints.append(dict(checkpoint, path=path))
+    return checkpoints
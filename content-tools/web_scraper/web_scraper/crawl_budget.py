@@ -0,0 +1,217 @@
+"""
+Request priorities and per-site crawl budgets
+
+Every link a spider finds used to be requested at the same priority, so
+navigation and listing pages competed with the articles the knowledge-base
+is built from. CrawlPriorityMiddleware gives each request a priority from
+its spider's profile in crawl_priorities.json: the first page type whose
+URL patterns match (an article, a collection...) sets the base priority,
+and every level of depth below the start page takes depth_penalty off it.
+Pages of no type are generic, at priority 0. The scheduler then fetches
+articles first, collections next and generic pages last; among pages of a
+type, those the last crawl's link graph ranks highest come first (see
+web_scraper.link_graph).
+
+CrawlBudgetMiddleware limits how many pages, bytes and seconds the crawl of
+a site may use. Once a soft budget is spent only requests for the page
+types in CRAWL_BUDGET_SOFT_KEEP (articles) are still downloaded; once a
+hard budget is spent none are. Requests over budget are dropped as they
+leave the scheduler, so the queue drains in moments and the spider closes
+as usual, writing its full set of outputs from the pages it did fetch.
+Budgets are set in the settings, for every site or per site in
+CRAWL_BUDGETS, keyed by the site's content directory:
+
+    CRAWL_BUDGETS = {"brightmove/support": {"pages": 5000, "soft_pages": 4000, "seconds": 3600}}
+"""
+
+import json
+import os
+import re
+import time
+from urllib.parse import urlsplit
+
+from scrapy import Request, signals
+from scrapy.exceptions import IgnoreRequest
+
+from web_scraper.page_store import site_name
+
+
+PRIORITIES_FILE = os.path.join(os.path.dirname(__file__), 'crawl_priorities.json')
+
+BUDGET_LIMITS = ('pages', 'bytes', 'seconds')
+
+
+class CrawlPriority:
+    """Priority of a request from its page type and depth, for one profile"""
+
+    def __init__(self, types, depth_penalty=5):
+        # types: [{'type': ..., 'priority': ..., 'patterns': [...]}, ...], matched in order
+        self.types = [
+            (rule['type'], rule['priority'], re.compile('|'.join(f'(?:{pattern})' for pattern in rule['patterns'])))
+            for rule in types
+        ]
+        self.depth_penalty = depth_penalty
+
+    def page_type(self, url):
+        """Type of the first rule matching the URL's path and query, or None for a generic page"""
+        parts = urlsplit(url)
+        target = f"{parts.path}?{parts.query}" if parts.query else parts.path
+        for page_type, priority, pattern in self.types:
+            if pattern.search(target):
+                return page_type
+        return None
+
+    def priority(self, url, depth=0):
+        """(priority, page type) of a request for url at a depth"""
+        page_type = self.page_type(url)
+        base = next((priority for name, priority, _ in self.types if name == page_type), 0)
+        return base - self.depth_penalty * depth, page_type
+
+
+_priorities = {}
+
+
+def load_crawl_priority(profile, path=PRIORITIES_FILE):
+    """Return the CrawlPriority for a profile of the priorities file"""
+    key = (path, profile)
+    if key not in _priorities:
+        with open(path, 'r', encoding='utf-8') as f:
+            profiles = json.load(f)
+        if profile not in profiles:
+            raise KeyError(f"No priority profile '{profile}' in {path}")
+        rules = profiles[profile]
+        _priorities[key] = CrawlPriority(rules['types'], rules.get('depth_penalty', 5))
+    return _priorities[key]
+
+
+class CrawlPriorityMiddleware:
+    """Spider middleware setting the priority of requests from the spider's priority_profile
+
+    Requests that already have a priority of their own are left alone. The
+    spider's link graph adds the URL's rank bonus. The page type is kept in
+    request.meta['page_type'] for CrawlBudgetMiddleware. Runs after
+    DepthMiddleware, which sets request.meta['depth'].
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def _prioritize(self, request, spider):
+        profile = getattr(spider, 'priority_profile', None)
+        if profile is None or request.priority:
+            return request
+        priority, page_type = load_crawl_priority(profile).priority(request.url, request.meta.get('depth', 0))
+        link_graph = getattr(spider, 'link_graph', None)
+        if link_graph is not None:
+            priority += link_graph.rank_priority(request.url)
+        request.meta['page_type'] = page_type
+        self.stats.inc_value(f"priority/requests/{page_type or 'page'}")
+        return request.replace(priority=priority) if priority else request
+
+    def process_spider_output(self, response, result, spider):
+        for i in result:
+            yield self._prioritize(i, spider) if isinstance(i, Request) else i
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for i in result:
+            yield self._prioritize(i, spider) if isinstance(i, Request) else i
+
+
+class CrawlBudget:
+    """Hard and soft limits on the pages, bytes and seconds of a site's crawl; 0 means no limit"""
+
+    def __init__(self, hard=None, soft=None):
+        self.hard = {limit: value for limit, value in (hard or {}).items() if value}
+        self.soft = {limit: value for limit, value in (soft or {}).items() if value}
+
+    @classmethod
+    def from_settings(cls, settings, site):
+        """The CRAWL_BUDGET_* settings, overridden by the site's CRAWL_BUDGETS entry"""
+        overrides = settings.getdict('CRAWL_BUDGETS').get(site, {})
+        return cls(
+            hard={limit: overrides.get(limit, settings.getfloat(f'CRAWL_BUDGET_{limit.upper()}'))
+                  for limit in BUDGET_LIMITS},
+            soft={limit: overrides.get(f'soft_{limit}', settings.getfloat(f'CRAWL_BUDGET_SOFT_{limit.upper()}'))
+                  for limit in BUDGET_LIMITS}
+        )
+
+    def __bool__(self):
+        return bool(self.hard or self.soft)
+
+    def exceeded(self, used, soft=False):
+        """The first limit used has reached, or None"""
+        limits = self.soft if soft else self.hard
+        return next((limit for limit, value in limits.items() if used[limit] >= value), None)
+
+
+def crawl_truncated(stats):
+    """Whether a crawl left pages unfetched because its budget ran out"""
+    return bool(stats.get_value('budget/dropped'))
+
+
+class CrawlBudgetMiddleware:
+    """Downloader middleware enforcing the site's CrawlBudget (see the module docstring)
+
+    Pages are counted as requests are let through, so a hard page budget is
+    never overshot by the requests in flight; bytes as responses arrive.
+    Replays are never limited: they reproduce what the live crawl fetched.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.soft_keep = set(crawler.settings.getlist('CRAWL_BUDGET_SOFT_KEEP', ['article']))
+        self.budget = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        return middleware
+
+    def spider_opened(self, spider):
+        budget = CrawlBudget.from_settings(self.crawler.settings, site_name(spider))
+        if not budget or getattr(spider, 'replaying', False):
+            return
+        self.budget = budget
+        self.used = dict.fromkeys(BUDGET_LIMITS, 0)
+        self.state = None
+        self.started = time.monotonic()
+        spider.logger.info(f"Crawl budget: hard {budget.hard or 'none'}, soft {budget.soft or 'none'}")
+
+    def _spend(self, spider):
+        """Move to the soft or hard state once a limit is reached"""
+        self.used['seconds'] = time.monotonic() - self.started
+        if self.state != 'hard':
+            limit = self.budget.exceeded(self.used)
+            if limit is not None:
+                self.state = 'hard'
+                self.stats.set_value('budget/exhausted', limit)
+                spider.logger.warning(f"Hard {limit} budget spent; draining the queue without fetching")
+                return
+        if self.state is None:
+            limit = self.budget.exceeded(self.used, soft=True)
+            if limit is not None:
+                self.state = 'soft'
+                self.stats.set_value('budget/soft_exhausted', limit)
+                spider.logger.warning(f"Soft {limit} budget spent; only fetching {', '.join(sorted(self.soft_keep))} pages")
+
+    def process_request(self, request, spider):
+        if self.budget is None:
+            return None
+        self._spend(spider)
+        if self.state == 'hard' or (self.state == 'soft' and request.meta.get('page_type') not in self.soft_keep):
+            self.stats.inc_value('budget/dropped')
+            raise IgnoreRequest(f"Crawl budget spent: {request.url}")
+        self.used['pages'] += 1
+        return None
+
+    def process_response(self, request, response, spider):
+        if self.budget is not None:
+            self.used['bytes'] += len(response.body)
+            self._spend(spider)
+        return response
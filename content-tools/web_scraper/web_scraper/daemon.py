@@ -0,0 +1,225 @@
+"""
+Local HTTP API of the scraping daemon
+
+`python scrape_daemon.py serve` keeps Scrapy, the project and the reactor
+loaded and runs the crawls it is sent as jobs (see web_scraper.jobs). It
+listens on a Unix socket only its user can open, by default
+.scrapy/scrape_daemon.sock in the project, or on a localhost port; on a
+port every request must carry the SCRAPE_DAEMON_TOKEN shared token as
+`Authorization: Bearer <token>`, since any local user (or a web page,
+through the browser) can reach it:
+
+    POST   /jobs        {"spider": ..., "args": {...}, "settings": {...}}
+                        or {"site": <multi_site_scraper website>, "refresh": true}
+    GET    /jobs        every job the daemon remembers
+    GET    /jobs/<id>   a job's state, close reason and stats
+    DELETE /jobs/<id>   cancel a queued job or stop a running one
+
+Requests and responses are JSON, and a POST whose Content-Type is not
+application/json is refused. A job may only override the settings
+SCRAPE_DAEMON_JOB_SETTINGS allows (crawl budgets and close conditions),
+since settings such as FEEDS or ITEM_PIPELINES would let whoever submits it
+write files or run code as the daemon's user. For the same reason a
+website_name argument must be a plain directory name (see web_scraper.jobs),
+and a site must be one of the websites the daemon was configured with.
+
+DaemonClient speaks the same API with the standard library only, for
+scrape_daemon.py and for schedulers such as Airflow that submit a job and
+wait for it.
+"""
+
+import hmac
+import http.client
+import json
+import os
+import socket
+import time
+from fnmatch import fnmatchcase
+
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from web_scraper.checkpoint import PROJECT_DIR
+from web_scraper.jobs import Job
+
+
+DEFAULT_ADDRESS = os.path.join(PROJECT_DIR, '.scrapy', 'scrape_daemon.sock')
+
+# Environment variable holding the shared token of a daemon on a TCP port
+TOKEN_ENV = 'SCRAPE_DAEMON_TOKEN'
+
+# States a job does not leave
+DONE_STATES = ('finished', 'failed', 'cancelled')
+
+
+def is_socket_path(address):
+    return '/' in address
+
+
+class JobsResource(Resource):
+    """The /jobs API over a JobRunner
+
+    site_job(name, refresh) builds the Job of a configured website, raising
+    KeyError for an unknown one. With a token, requests without it are
+    refused.
+    """
+
+    isLeaf = True
+
+    def __init__(self, runner, site_job=None, token=None):
+        super(JobsResource, self).__init__()
+        self.runner = runner
+        self.site_job = site_job
+        self.token = token
+        self.allowed_settings = runner.runner.settings.getlist('SCRAPE_DAEMON_JOB_SETTINGS')
+
+    def render(self, request):
+        if self.token is not None:
+            expected = f'Bearer {self.token}'.encode('utf-8')
+            if not hmac.compare_digest(request.getHeader(b'authorization') or b'', expected):
+                return self._respond(request, 401, {'error': 'Missing or wrong token'})
+        return super(JobsResource, self).render(request)
+
+    def _respond(self, request, code, body):
+        request.setResponseCode(code)
+        request.setHeader(b'Content-Type', b'application/json')
+        return json.dumps(body, indent=2, ensure_ascii=False).encode('utf-8') + b'\n'
+
+    def _job(self, request):
+        """The job a /jobs/<id> path names, or None"""
+        path = [part.decode('utf-8') for part in request.postpath if part]
+        if len(path) != 2 or path[0] != 'jobs':
+            return None
+        return self.runner.jobs.get(path[1])
+
+    def _is_jobs(self, request):
+        return [part for part in request.postpath if part] == [b'jobs']
+
+    def _job_spec(self, spec):
+        """A job built from a spider spec, if its arguments and settings are acceptable"""
+        args = spec.get('args') or {}
+        settings = spec.get('settings') or {}
+        if not all(isinstance(value, str) for value in args.values()):
+            raise TypeError('spider arguments must be strings')
+        refused = sorted(name for name in settings
+                         if not any(fnmatchcase(name, pattern) for pattern in self.allowed_settings))
+        if refused:
+            raise ValueError(f"settings a job may not override: {', '.join(refused)}")
+        return Job(spec['spider'], args, settings)
+
+    def render_GET(self, request):
+        if self._is_jobs(request):
+            return self._respond(request, 200, {
+                'running': self.runner.running,
+                'jobs': [job.to_dict() for job in self.runner.jobs.values()]
+            })
+        job = self._job(request)
+        if job is None:
+            return self._respond(request, 404, {'error': 'No such job'})
+        return self._respond(request, 200, job.to_dict())
+
+    def render_POST(self, request):
+        if not self._is_jobs(request):
+            return self._respond(request, 404, {'error': 'Jobs are submitted to /jobs'})
+        # Browsers send other content types across origins without asking first
+        content_type = (request.getHeader(b'content-type') or b'').split(b';')[0].strip().lower()
+        if content_type != b'application/json':
+            return self._respond(request, 415, {'error': 'Jobs are submitted as application/json'})
+        try:
+            spec = json.loads(request.content.read() or b'{}')
+            if 'site' in spec:
+                if self.site_job is None:
+                    raise KeyError('This daemon has no configured websites')
+                job = self.site_job(spec['site'], spec.get('refresh', False))
+            else:
+                job = self._job_spec(spec)
+            self.runner.submit(job)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return self._respond(request, 400, {'error': f"Invalid job: {e}"})
+        return self._respond(request, 202, job.to_dict())
+
+    def render_DELETE(self, request):
+        job = self._job(request)
+        if job is None:
+            return self._respond(request, 404, {'error': 'No such job'})
+        self.runner.stop(job)
+        return self._respond(request, 202, job.to_dict())
+
+
+def listen(reactor, runner, address=DEFAULT_ADDRESS, site_job=None, token=None):
+    """Serve the API of runner on a Unix socket path, or on a host:port with a token"""
+    if is_socket_path(address):
+        os.makedirs(os.path.dirname(address), exist_ok=True)
+        # wantPID removes the socket a crashed daemon left behind
+        return reactor.listenUNIX(address, Site(JobsResource(runner, site_job)), mode=0o600, wantPID=True)
+    if not token:
+        raise ValueError(f"A daemon on a TCP port needs a shared token in {TOKEN_ENV}")
+    site = Site(JobsResource(runner, site_job, token))
+    host, _, port = address.rpartition(':')
+    return reactor.listenTCP(int(port), site, interface=host or '127.0.0.1')
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection to a server listening on a Unix socket"""
+
+    def __init__(self, path, timeout=30):
+        super(UnixHTTPConnection, self).__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class DaemonClient:
+    """Client of a scraping daemon's API; errors it reports raise RuntimeError
+
+    token defaults to the SCRAPE_DAEMON_TOKEN environment variable.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=30, token=None):
+        self.address = address
+        self.timeout = timeout
+        self.token = token or os.environ.get(TOKEN_ENV)
+
+    def _request(self, method, path, body=None):
+        if is_socket_path(self.address):
+            connection = UnixHTTPConnection(self.address, self.timeout)
+        else:
+            host, _, port = self.address.rpartition(':')
+            connection = http.client.HTTPConnection(host or '127.0.0.1', int(port), timeout=self.timeout)
+        try:
+            payload = json.dumps(body).encode('utf-8') if body is not None else None
+            headers = {'Content-Type': 'application/json'}
+            if self.token:
+                headers['Authorization'] = f'Bearer {self.token}'
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            data = json.loads(response.read() or b'{}')
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise RuntimeError(data.get('error', f"HTTP {response.status}"))
+        return data
+
+    def submit(self, spec):
+        """Submit a job spec (see the module docstring); returns the queued job"""
+        return self._request('POST', '/jobs', spec)
+
+    def job(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def jobs(self):
+        return self._request('GET', '/jobs')
+
+    def stop(self, job_id):
+        return self._request('DELETE', f'/jobs/{job_id}')
+
+    def wait(self, job_id, poll=5.0):
+        """Poll a job until it finishes, fails or is cancelled; returns it"""
+        while True:
+            job = self.job(job_id)
+            if job['state'] in DONE_STATES:
+                return job
+            time.sleep(poll)
@@ -0,0 +1,230 @@
+"""
+Boilerplate and near-duplicate detection for scraped pages
+
+Every text block of a page (a headline, paragraph, list item, navigation
+link, ...) is counted by the number of pages of the site it appears on. Once
+a block has been seen on DEDUP_BOILERPLATE_MIN_PAGES pages it is treated as
+site boilerplate (navigation, footer, CTA text) and dropped from every later
+page.
+
+Each page also gets a 64-bit SimHash of the word shingles of its content
+blocks. A page whose SimHash is within DEDUP_SIMHASH_DISTANCE bits of a page
+already stored, such as a locale or query-string variant of it, is a near
+duplicate and is not stored at all. The first pages of a crawl are
+fingerprinted before the site's boilerplate is known, so once it is they
+are fingerprinted again without it.
+
+A crawl that stops before it finishes saves what was learned to
+dedup_state.json in its crawl state directory, so the crawl resuming it
+keeps dropping the same boilerplate and duplicates.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from web_scraper.checkpoint import atomic_write
+
+
+# Page fields that hold the content of a page rather than its chrome
+CONTENT_FIELDS = ('headlines', 'paragraphs', 'lists', 'code_blocks')
+
+WORD_RE = re.compile(r'\w+')
+
+# Files in raw_data that record how a crawl went rather than what it stored
+STATE_FILES = (
+    'crawl_summary.json', 'api_cursor.json', 'checkpoint.json',
+    'link_graph.npz', 'link_graph.urls', 'link_graph.edges'
+)
+
+# What PageDeduplicator learned, kept in the crawl state directory of an unfinished crawl
+STATE_FILE = 'dedup_state.json'
+
+
+def block_key(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+
+def simhash(texts, shingle_size=3):
+    """64-bit SimHash of the word shingles of some texts, and the number of shingles"""
+    weights = [0] * 64
+    shingles = 0
+    for text in texts:
+        words = WORD_RE.findall(text.lower())
+        for i in range(max(1, len(words) - shingle_size + 1)):
+            shingle = ' '.join(words[i:i + shingle_size])
+            if not shingle:
+                continue
+            value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+            for bit in range(64):
+                weights[bit] += 1 if value >> bit & 1 else -1
+            shingles += 1
+    fingerprint = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            fingerprint |= 1 << bit
+    return fingerprint, shingles
+
+
+class NearDuplicateIndex:
+    """SimHash fingerprints of stored pages, searchable by Hamming distance
+
+    Fingerprints are split into max_distance + 1 bands; two fingerprints
+    within max_distance bits of each other share at least one band exactly,
+    so only pages in the same band buckets are compared.
+    """
+
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = 64 // self.bands
+        self.buckets = [{} for _ in range(self.bands)]
+
+    def _band_values(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        for band in range(self.bands):
+            yield band, fingerprint >> (band * self.band_bits) & mask
+
+    def find(self, fingerprint):
+        """Return the URL of a stored page near this fingerprint, or None"""
+        for band, value in self._band_values(fingerprint):
+            for other, url in self.buckets[band].get(value, ()):
+                if bin(fingerprint ^ other).count('1') <= self.max_distance:
+                    return url
+        return None
+
+    def add(self, fingerprint, url):
+        for band, value in self._band_values(fingerprint):
+            self.buckets[band].setdefault(value, []).append((fingerprint, url))
+
+    def entries(self):
+        """Every (fingerprint, url) added, once each"""
+        for entries in self.buckets[0].values():
+            yield from entries
+
+
+class PageDeduplicator:
+    """Learns a site's boilerplate blocks and spots near-duplicate pages"""
+
+    def __init__(self, boilerplate_min_pages=3, max_distance=3, min_shingles=8):
+        self.boilerplate_min_pages = boilerplate_min_pages
+        self.min_shingles = min_shingles
+        self.block_pages = {}
+        self.index = NearDuplicateIndex(max_distance)
+        # (url, data) of the pages fingerprinted before boilerplate_min_pages were learned
+        self.early_pages = []
+        self.pages_learned = 0
+
+    def learn(self, data):
+        """Count the blocks of a page that is being stored"""
+        for key in {block_key(text) for text in self._texts(data)}:
+            self.block_pages[key] = self.block_pages.get(key, 0) + 1
+        self.pages_learned += 1
+        if self.early_pages is not None and self.pages_learned >= self.boilerplate_min_pages:
+            # Blocks repeated on all of them count as boilerplate now; fingerprint them again without
+            for url, early in self.early_pages:
+                fingerprint, shingles = self._fingerprint(self.strip_boilerplate(early)[0])
+                if shingles >= self.min_shingles:
+                    self.index.add(fingerprint, url)
+            self.early_pages = None
+
+    def _texts(self, data):
+        for value in data.values():
+            if isinstance(value, dict):
+                yield from self._texts(value)
+            elif isinstance(value, list):
+                yield from (text for text in value if isinstance(text, str))
+
+    def strip_boilerplate(self, data):
+        """Copy of a page's data without the blocks learned as boilerplate
+
+        Returns (data, number of blocks dropped).
+        """
+        stripped = {}
+        dropped = 0
+        for key, value in data.items():
+            if isinstance(value, dict):
+                value, count = self.strip_boilerplate(value)
+                dropped += count
+            elif isinstance(value, list) and all(isinstance(text, str) for text in value):
+                kept = [
+                    text for text in value
+                    if self.block_pages.get(block_key(text), 0) < self.boilerplate_min_pages
+                ]
+                dropped += len(value) - len(kept)
+                value = kept
+            stripped[key] = value
+        return stripped, dropped
+
+    def duplicate_of(self, url, data):
+        """URL of an earlier page this page nearly duplicates, or None
+
+        Pages that are not duplicates are remembered for later comparisons.
+        Pages with too little content to fingerprint reliably never match.
+        """
+        fingerprint, shingles = self._fingerprint(data)
+        if shingles < self.min_shingles:
+            return None
+        original = self.index.find(fingerprint)
+        if original is None:
+            self.index.add(fingerprint, url)
+            if self.early_pages is not None:
+                self.early_pages.append((url, data))
+        return original
+
+    def _fingerprint(self, data):
+        content = data.get('content', data)
+        return simhash(text for field in CONTENT_FIELDS for text in content.get(field, []))
+
+    def save(self, path):
+        """Save the block counts and page fingerprints for a resumed crawl"""
+        state = {
+            'blocks': {key.hex(): count for key, count in self.block_pages.items()},
+            'pages': list(self.index.entries())
+        }
+        with atomic_write(path) as f:
+            json.dump(state, f)
+
+    def load(self, path):
+        """Pick up what an interrupted crawl learned; returns False if nothing was saved"""
+        try:
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.block_pages = {bytes.fromhex(key): count for key, count in state['blocks'].items()}
+        for fingerprint, url in state['pages']:
+            self.index.add(fingerprint, url)
+        self.early_pages = None
+        return True
+
+
+def stored_bytes(directory):
+    """Total size of the content files in a site's raw_data directory
+
+    Crawl state, crawl bookkeeping, files still being written and SQLite
+    databases (whose size depends on their history as much as on what they
+    hold) are left out.
+    """
+    total = 0
+    for root, dirs, files in os.walk(directory):
+        if 'crawl_state' in dirs:
+            dirs.remove('crawl_state')
+        total += sum(
+            os.path.getsize(os.path.join(root, name)) for name in files
+            if name not in STATE_FILES and '.sqlite' not in name and not name.endswith('.tmp')
+        )
+    return total
+
+
+def dedup_summary(stats, directory):
+    """Lines for a site's index.txt on the bytes stored in directory and duplicates dropped"""
+    seen = stats.get_value('dedup/pages_seen', 0)
+    duplicates = stats.get_value('dedup/near_duplicates', 0)
+    ratio = duplicates / seen if seen else 0.0
+    return [
+        f"Stored bytes: {stored_bytes(directory)}",
+        f"Near-duplicate pages dropped: {duplicates} of {seen} ({ratio:.1%})",
+        f"Boilerplate blocks dropped: {stats.get_value('dedup/boilerplate_blocks', 0)}"
+    ]
@@ -0,0 +1,141 @@
+"""
+Single-pass page extraction shared by all spiders
+
+The spiders used to run five to eight response.css() queries per page
+(title, headlines, paragraphs, lists, code, image alt text, navigation,
+CTAs, links), each walking the whole document again and wrapping every
+match in a Selector. extract_page() walks the lxml tree that Scrapy has
+already parsed exactly once and collects every field at the same time.
+
+Text fields follow the old "selector::text" semantics: the stripped,
+non-empty text nodes directly inside each matching element, in document
+order. The old 'h1, h2, h3::text' selector returned the raw markup of
+h1 and h2 elements; headlines are now text for all three levels.
+"""
+
+from lxml import etree
+
+
+HEADLINE_TAGS = frozenset(('h1', 'h2', 'h3'))
+CODE_TAGS = frozenset(('code', 'pre'))
+LIST_TAGS = frozenset(('ul', 'ol'))
+
+# Attributes that carry extra links besides <a href>
+LINK_ATTRIBUTES = ('data-href', 'data-url', 'data-article-url')
+
+TEXT_FIELDS = (
+    'headlines',
+    'paragraphs',
+    'lists',
+    'code_blocks',
+    'images',
+    'navigation',
+    'hero_content',
+    'cta_text',
+    'features',
+    'search_terms',
+    'links',
+    'extra_links'
+)
+
+
+def direct_texts(element):
+    """Stripped, non-empty text nodes that are direct children of an element"""
+    texts = []
+    text = element.text
+    if text:
+        text = text.strip()
+        if text:
+            texts.append(text)
+    for child in element:
+        text = child.tail
+        if text:
+            text = text.strip()
+            if text:
+                texts.append(text)
+    return texts
+
+
+def extract_page(response):
+    """Extract every field the spiders use from a response in one tree walk
+
+    Returns a dict with 'title', 'description' and 'keywords' (str or None)
+    and a list for each name in TEXT_FIELDS. 'links' holds <a href> values
+    in document order; 'extra_links' holds href values of other elements
+    and data-href / data-url / data-article-url attributes.
+    """
+    fields = {name: [] for name in TEXT_FIELDS}
+    fields['title'] = fields['description'] = fields['keywords'] = None
+
+    headlines = fields['headlines']
+    paragraphs = fields['paragraphs']
+    lists = fields['lists']
+    code_blocks = fields['code_blocks']
+    navigation = fields['navigation']
+    links = fields['links']
+    extra_links = fields['extra_links']
+
+    for element in response.selector.root.iter(etree.Element):
+        tag = element.tag
+        if tag == 'a':
+            href = element.get('href')
+            if href:
+                links.append(href)
+        elif tag == 'p':
+            paragraphs.extend(direct_texts(element))
+        elif tag == 'li':
+            if element.getparent().tag in LIST_TAGS:
+                lists.extend(direct_texts(element))
+        elif tag in HEADLINE_TAGS:
+            headlines.extend(direct_texts(element))
+        elif tag in CODE_TAGS:
+            code_blocks.extend(direct_texts(element))
+        elif tag == 'img':
+            alt = element.get('alt')
+            if alt and alt.strip():
+                fields['images'].append(alt.strip())
+        elif tag == 'nav':
+            for anchor in element.iter('a'):
+                navigation.extend(direct_texts(anchor))
+        elif tag == 'title':
+            if fields['title'] is None:
+                fields['title'] = element.text
+        elif tag == 'meta':
+            name = element.get('name')
+            if name == 'description' and fields['description'] is None:
+                fields['description'] = element.get('content')
+            elif name == 'keywords' and fields['keywords'] is None:
+                fields['keywords'] = element.get('content')
+
+        # Attribute-driven fields; most elements have no attributes at all
+        attrib = element.attrib
+        if not attrib or (tag == 'a' and len(attrib) == 1 and 'href' in attrib):
+            continue
+        css_class = attrib.get('class')
+        if css_class:
+            if 'button' in css_class or 'cta' in css_class:
+                fields['cta_text'].extend(direct_texts(element))
+            if 'feature' in css_class or 'benefit' in css_class:
+                fields['features'].extend(direct_texts(element))
+            if 'search' in css_class:
+                fields['search_terms'].extend(direct_texts(element))
+            class_names = css_class.split()
+            if 'nav' in class_names and tag != 'nav':
+                for anchor in element.iter('a'):
+                    navigation.extend(direct_texts(anchor))
+            if 'hero' in class_names or 'banner' in class_names:
+                for child in element.iter('h1', 'p'):
+                    fields['hero_content'].extend(direct_texts(child))
+        if tag != 'a':
+            href = attrib.get('href')
+            if href:
+                extra_links.append(href)
+        for name in LINK_ATTRIBUTES:
+            value = attrib.get(name)
+            if value:
+                extra_links.append(value)
+        placeholder = attrib.get('placeholder')
+        if placeholder and 'search' in placeholder and placeholder.strip():
+            fields['search_terms'].append(placeholder.strip())
+
+    return fields
@@ -0,0 +1,188 @@
+"""
+Disk-backed URL frontier and seen-URL filters shared by all spiders
+
+Each spider crawls with a JOBDIR under its raw_data/crawl_state directory,
+so Scrapy keeps the pending request queue on disk, and duplicate requests
+are filtered through a memory-mapped Bloom filter stored in the same
+directory. A crawl that is killed resumes from that state the next time the
+spider runs; a crawl that finishes clears it so the next run starts fresh.
+Start requests skip the duplicate filter, so a resumed crawl leaves out the
+start pages it already stored (see stored_start_pages()).
+
+A Bloom filter needs roughly two bytes per URL at the default error rate,
+instead of a full Python string per URL. The trade-off is a small
+false-positive rate: about one URL in BLOOM_FILTER_ERROR_RATE is wrongly
+treated as already seen.
+"""
+
+import hashlib
+import math
+import mmap
+import os
+
+from scrapy import signals
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+
+from web_scraper.page_store import PageStore
+
+
+class BloomFilter:
+    """Bloom filter over a bit array that is memory-mapped from a file
+
+    Without a path the bit array lives in memory. Supports ``key in filter``
+    and ``filter.add(key)`` like a set, for str or bytes keys.
+    """
+
+    MAGIC = b'WSBLOOM1'
+    HEADER_SIZE = 24
+
+    def __init__(self, path=None, capacity=1000000, error_rate=0.001, reset=False):
+        self.path = path
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        size = self.HEADER_SIZE + (self.num_bits + 7) // 8
+        header = self.MAGIC + self.num_bits.to_bytes(8, 'big') + self.num_hashes.to_bytes(8, 'big')
+
+        if path is None:
+            self._file = None
+            self._bits = bytearray(size)
+            self._bits[:self.HEADER_SIZE] = header
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Start over if asked to, or if the file was built with other parameters
+        if reset or not os.path.exists(path) or os.path.getsize(path) != size:
+            with open(path, 'wb') as f:
+                f.write(header)
+                f.truncate(size)
+        self._file = open(path, 'r+b')
+        self._bits = mmap.mmap(self._file.fileno(), size)
+        if self._bits[:self.HEADER_SIZE] != header:
+            self._bits[:] = bytes(size)
+            self._bits[:self.HEADER_SIZE] = header
+
+    def _positions(self, key):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, key):
+        bits = self._bits
+        offset = self.HEADER_SIZE
+        return all(bits[offset + (pos >> 3)] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def add(self, key):
+        """Add a key; returns True if it was not already present"""
+        bits = self._bits
+        offset = self.HEADER_SIZE
+        added = False
+        for pos in self._positions(key):
+            index = offset + (pos >> 3)
+            mask = 1 << (pos & 7)
+            if not bits[index] & mask:
+                bits[index] |= mask
+                added = True
+        return added
+
+    def flush(self):
+        if self._file is not None:
+            self._bits.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._bits.flush()
+            self._bits.close()
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Close the filter and delete its file"""
+        self.close()
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def open_bloom_filter(crawler, filename, reset=False):
+    """Open a Bloom filter in the crawl's JOBDIR, or in memory without one"""
+    directory = job_dir(crawler.settings)
+    return BloomFilter(
+        os.path.join(directory, filename) if directory else None,
+        capacity=crawler.settings.getint('BLOOM_FILTER_CAPACITY', 1000000),
+        error_rate=crawler.settings.getfloat('BLOOM_FILTER_ERROR_RATE', 0.001),
+        reset=reset
+    )
+
+
+class BloomDupeFilter(RFPDupeFilter):
+    """Request dupefilter (DUPEFILTER_CLASS) backed by a BloomFilter in JOBDIR"""
+
+    def __init__(self, bloom, debug=False, *, fingerprinter=None):
+        super().__init__(None, debug, fingerprinter=fingerprinter)
+        self.bloom = bloom
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        resuming = getattr(crawler.spider, 'resuming', False)
+        return cls(
+            open_bloom_filter(crawler, 'requests.bloom', reset=not resuming),
+            crawler.settings.getbool('DUPEFILTER_DEBUG'),
+            fingerprinter=crawler.request_fingerprinter
+        )
+
+    def request_seen(self, request):
+        return not self.bloom.add(self._fingerprint(request))
+
+    def close(self, reason):
+        # A finished crawl leaves nothing to resume
+        if reason == 'finished':
+            self.bloom.discard()
+        else:
+            self.bloom.close()
+
+
+def enable_resumable_crawl(crawler, spider, state_dir):
+    """Keep the spider's crawl state in state_dir so a killed crawl can resume
+
+    Must be called from the spider's from_crawler(), before the crawler's
+    settings are frozen. Sets JOBDIR (unless one was given explicitly) and
+    spider.resuming, which is True when the previous crawl in that directory
+    did not finish.
+    """
+    if not crawler.settings.getbool('RESUMABLE_CRAWLS', True):
+        spider.resuming = False
+        return
+    if not crawler.settings.get('JOBDIR'):
+        crawler.settings.set('JOBDIR', state_dir, priority='spider')
+    directory = crawler.settings.get('JOBDIR')
+    os.makedirs(directory, exist_ok=True)
+
+    marker = os.path.join(directory, 'crawl.in_progress')
+    spider.resuming = os.path.exists(marker)
+    if spider.resuming:
+        spider.logger.info(f"Resuming interrupted crawl from {directory}")
+    with open(marker, 'w', encoding='utf-8') as f:
+        f.write(spider.name + '\n')
+
+    def spider_closed(spider, reason):
+        if reason == 'finished' and os.path.exists(marker):
+            os.remove(marker)
+
+    crawler.signals.connect(spider_closed, signal=signals.spider_closed, weak=False)
+
+
+def stored_start_pages(spider):
+    """URLs of the start pages the interrupted crawl being resumed already stored
+
+    Empty unless the spider is resuming. Start pages are the pages a spider
+    stores company_info records for. Call it once the crawl has started
+    (e.g. from start()), after the page store was repaired.
+    """
+    if not getattr(spider, 'resuming', False):
+        return set()
+    store = PageStore(spider.page_store_path)
+    return {record['url'] for record in store.records(('company_info',), resolve=False)}
@@ -0,0 +1,430 @@
+"""
+Compressed, content-addressed HTTP cache storage (HTTPCACHE_STORAGE)
+
+Scrapy's FilesystemCacheStorage writes a directory of seven files per
+request. PackedCacheStorage appends compressed response bodies to a few
+large segment files and indexes them in SQLite instead:
+
+    <HTTPCACHE_DIR>/<spider>[/<website>]/
+        index.sqlite        responses by request fingerprint, bodies by hash
+        segment-00001.pack  compressed bodies, back to back
+
+Bodies are compressed with zstd when a zstd module is available
+(compression.zstd on Python 3.14+, backports.zstd or zstandard) and with
+zlib otherwise; the codec is recorded per body, so a cache written with one
+can be read with the other installed. Byte-identical bodies are stored once
+however many URLs or crawls served them, and every response ever cached is
+kept, so the cache holds the full history of our crawls. The newest
+response for a request is the one served.
+
+Live crawls record through it with RecordingPolicy, which always fetches
+from the network but stores every response together with the callback and
+meta of its request and the arguments of the crawl; since nothing cached
+is ever served then, the storage does not look anything up. CacheArchive
+reads those recordings back for replays (see web_scraper.replay). To serve
+repeated development crawls from the cache instead, run run_scraper.py or
+multi_site_scraper.py crawl with --from-cache (see serve_from_cache_settings()):
+cached pages are then never fetched again.
+
+Several crawls can store into one cache at a time (two daemon jobs for the
+same site, say): each response is appended to its segment, indexed and
+committed under an exclusive lock on index.lock, so no two crawls append
+at the same offset or index a body twice.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from time import time
+
+from scrapy.extensions.httpcache import DummyPolicy
+from scrapy.http import Headers, Request
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+try:
+    from compression import zstd
+except ImportError:
+    try:
+        from backports import zstd
+    except ImportError:
+        zstd = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+def _zstd_codec(level):
+    if zstd is not None:
+        return (
+            lambda data: zstd.compress(data, level=level),
+            zstd.decompress
+        )
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=level)
+        decompressor = zstandard.ZstdDecompressor()
+        # Frames written by compress() carry their size, so decompress() needs no limit
+        return compressor.compress, decompressor.decompress
+    return None
+
+
+def available_codecs(level=3):
+    """Codec name -> (compress, decompress) for every codec this Python can use"""
+    codecs = {'zlib': (lambda data: zlib.compress(data, 6), zlib.decompress)}
+    zstd_codec = _zstd_codec(level)
+    if zstd_codec is not None:
+        codecs['zstd'] = zstd_codec
+    return codecs
+
+
+def fetched_at(response):
+    """When a response was fetched, as recorded by the HTTP cache (ISO 8601)
+
+    Falls back to the current time when the cache is disabled. Replays see
+    the time of the original fetch, so they reproduce the same records.
+    """
+    timestamp = response.meta.get('cache_timestamp')
+    return (datetime.fromtimestamp(timestamp) if timestamp is not None else datetime.now()).isoformat()
+
+
+def request_record(request, spider):
+    """JSON-serializable callback, meta and cb_kwargs of a request, for replays
+
+    Requests whose callback is not a spider method (robots.txt, for one) are
+    not replayable and get no callback.
+    """
+    callback = request.callback or spider.parse
+    name = getattr(callback, '__name__', None)
+    if getattr(callback, '__self__', None) is not spider:
+        name = None
+    meta = {}
+    for key, value in request.meta.items():
+        try:
+            json.dumps(value)
+        except (TypeError, ValueError):
+            continue
+        meta[key] = value
+    return json.dumps({'callback': name, 'meta': meta, 'cb_kwargs': request.cb_kwargs}, ensure_ascii=False)
+
+
+class RecordingPolicy(DummyPolicy):
+    """HTTPCACHE_POLICY for live crawls: always fetch, and record every response"""
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        return False
+
+    def is_cached_response_valid(self, cachedresponse, response, request):
+        return False
+
+
+def serve_from_cache_settings():
+    """Settings that serve a crawl's pages from the HTTP cache, fetching only those never cached"""
+    return {
+        'HTTPCACHE_ENABLED': True,
+        'HTTPCACHE_POLICY': 'scrapy.extensions.httpcache.DummyPolicy'
+    }
+
+
+class PackedCacheStorage:
+    """HTTP cache storage keeping compressed, deduplicated bodies in packed segments"""
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'])
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.segment_size = settings.getint('HTTPCACHE_SEGMENT_SIZE', 64 * 1024 * 1024)
+        self.codecs = available_codecs(settings.getint('HTTPCACHE_ZSTD_LEVEL', 3))
+        self.codec = 'zstd' if 'zstd' in self.codecs else 'zlib'
+        # HttpCacheMiddleware retrieves before asking the policy, which under
+        # RecordingPolicy would read and decompress every page's last body for nothing
+        self.recording = issubclass(load_object(settings['HTTPCACHE_POLICY']), RecordingPolicy)
+        self.conn = None
+
+    def open_spider(self, spider):
+        # Every website crawled by universal_spider gets its own cache
+        parts = [self.cachedir, spider.name]
+        if getattr(spider, 'website_name', None):
+            parts.append(spider.website_name)
+        self.directory = os.path.join(*parts)
+        os.makedirs(self.directory, exist_ok=True)
+        self._fingerprinter = spider.crawler.request_fingerprinter
+
+        self.conn = sqlite3.connect(os.path.join(self.directory, 'index.sqlite'))
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # Every response is committed on its own (see store_response()); with
+        # WAL that survives a crashed process without a sync per commit
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS bodies ('
+            ' hash BLOB PRIMARY KEY,'
+            ' segment INTEGER NOT NULL,'
+            ' offset INTEGER NOT NULL,'
+            ' length INTEGER NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' codec TEXT NOT NULL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' id INTEGER PRIMARY KEY,'
+            ' crawl INTEGER NOT NULL,'
+            ' fingerprint BLOB NOT NULL,'
+            ' url TEXT NOT NULL,'
+            ' method TEXT NOT NULL,'
+            ' status INTEGER NOT NULL,'
+            ' response_url TEXT NOT NULL,'
+            ' headers BLOB NOT NULL,'
+            ' body_hash BLOB NOT NULL,'
+            ' timestamp REAL NOT NULL,'
+            ' request TEXT NOT NULL)'
+        )
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_fingerprint ON responses (fingerprint, id)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_crawl ON responses (crawl, id)')
+        # One row per crawl, with the spider arguments that reproduce it and
+        # the page store it wrote to
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS crawls ('
+            ' id INTEGER PRIMARY KEY,'
+            ' spider_args TEXT NOT NULL,'
+            ' page_store TEXT NOT NULL,'
+            ' opened_at REAL NOT NULL)'
+        )
+        self.crawl = self.conn.execute(
+            'INSERT INTO crawls (spider_args, page_store, opened_at) VALUES (?, ?, ?)',
+            (
+                json.dumps(getattr(spider, 'crawl_args', {}), ensure_ascii=False),
+                getattr(spider, 'page_store_path', ''),
+                time()
+            )
+        ).lastrowid
+        self.conn.commit()
+
+        row = self.conn.execute('SELECT MAX(segment) FROM bodies').fetchone()
+        self.segment = row[0] or 1
+        self._writer = None
+        self._readers = {}
+        self._lock = open(os.path.join(self.directory, 'index.lock'), 'a')
+        spider.logger.debug(f"Using packed cache storage in {self.directory} ({self.codec})")
+
+    def close_spider(self, spider):
+        # Arguments the spider settled while crawling (the pages a refresh reused)
+        self.conn.execute(
+            'UPDATE crawls SET spider_args = ? WHERE id = ?',
+            (json.dumps(getattr(spider, 'crawl_args', {}), ensure_ascii=False), self.crawl)
+        )
+        if self._writer is not None:
+            self._writer.close()
+        for reader in self._readers.values():
+            reader.close()
+        self.conn.commit()
+        self.conn.close()
+        self._lock.close()
+
+    def segment_path(self, segment):
+        return os.path.join(self.directory, f'segment-{segment:05d}.pack')
+
+    def retrieve_response(self, spider, request):
+        """Return the newest cached response for a request, or None"""
+        if self.recording:
+            return None
+        row = self.conn.execute(
+            'SELECT r.status, r.response_url, r.headers, r.timestamp, b.segment, b.offset, b.length, b.codec'
+            ' FROM responses r JOIN bodies b ON b.hash = r.body_hash'
+            ' WHERE r.fingerprint = ? ORDER BY r.id DESC LIMIT 1',
+            (self._fingerprinter.fingerprint(request),)
+        ).fetchone()
+        if row is None:
+            return None
+        status, url, raw_headers, timestamp, segment, offset, length, codec = row
+        if 0 < self.expiration_secs < time() - timestamp:
+            return None
+        if codec not in self.codecs:
+            spider.logger.warning(f"Cached body for {request.url} needs the {codec} codec; fetching again")
+            return None
+
+        body = self.codecs[codec][1](self._read(segment, offset, length))
+        headers = Headers(headers_raw_to_dict(raw_headers))
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        request.meta['cache_timestamp'] = timestamp
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        """Store a response, writing its body only if no identical body is cached"""
+        body = response.body
+        body_hash = hashlib.blake2b(body, digest_size=16).digest()
+        data = None
+        if not self._has_body(body_hash):
+            data = self.codecs[self.codec][0](body)
+        timestamp = time()
+        with self._locked():
+            # Another crawl may have stored the same body since
+            if data is not None and not self._has_body(body_hash):
+                segment, offset = self._append(data)
+                self.conn.execute(
+                    'INSERT INTO bodies (hash, segment, offset, length, size, codec) VALUES (?, ?, ?, ?, ?, ?)',
+                    (body_hash, segment, offset, len(data), len(body), self.codec)
+                )
+            self.conn.execute(
+                'INSERT INTO responses'
+                ' (crawl, fingerprint, url, method, status, response_url, headers, body_hash, timestamp, request)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (
+                    self.crawl,
+                    self._fingerprinter.fingerprint(request),
+                    request.url,
+                    request.method,
+                    response.status,
+                    response.url,
+                    headers_dict_to_raw(response.headers),
+                    body_hash,
+                    timestamp,
+                    request_record(request, spider)
+                )
+            )
+            # Bodies reach the segment file before the index rows that point at them
+            self.conn.commit()
+        # Callbacks date their records by the fetch time stored here
+        request.meta['cache_timestamp'] = timestamp
+
+    def _has_body(self, body_hash):
+        return self.conn.execute('SELECT 1 FROM bodies WHERE hash = ?', (body_hash,)).fetchone() is not None
+
+    @contextmanager
+    def _locked(self):
+        """Hold the cache's lock, which every crawl storing into it takes to append and index"""
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self._lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock, fcntl.LOCK_UN)
+
+    def _append(self, data):
+        """Append compressed bytes to the newest segment; returns (segment, offset)
+
+        Called with the lock held. Other crawls append to the same segments,
+        so the offset is the segment's size on disk, not this writer's position.
+        """
+        # Another crawl may have started a new segment
+        while os.path.exists(self.segment_path(self.segment + 1)):
+            self.segment += 1
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        if self._writer is None:
+            self._writer = open(self.segment_path(self.segment), 'ab')
+        offset = os.fstat(self._writer.fileno()).st_size
+        if offset and offset + len(data) > self.segment_size:
+            self._writer.close()
+            self.segment += 1
+            self._writer = open(self.segment_path(self.segment), 'ab')
+            offset = os.fstat(self._writer.fileno()).st_size
+        self._writer.write(data)
+        self._writer.flush()
+        return self.segment, offset
+
+    def _read(self, segment, offset, length):
+        reader = self._readers.get(segment)
+        if reader is None:
+            reader = self._readers[segment] = open(self.segment_path(segment), 'rb')
+        reader.seek(offset)
+        return reader.read(length)
+
+
+class CacheArchive:
+    """Read-only view of a PackedCacheStorage directory, for replaying recorded crawls"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.conn = sqlite3.connect(f"file:{os.path.join(directory, 'index.sqlite')}?mode=ro", uri=True)
+        self.codecs = available_codecs()
+        self._readers = {}
+
+    def close(self):
+        for reader in self._readers.values():
+            reader.close()
+        self.conn.close()
+
+    def crawls(self):
+        """Every recorded crawl, oldest first, with the number of responses it recorded"""
+        rows = self.conn.execute(
+            'SELECT c.id, c.spider_args, c.page_store, c.opened_at, COUNT(r.id)'
+            ' FROM crawls c LEFT JOIN responses r ON r.crawl = c.id GROUP BY c.id ORDER BY c.id'
+        )
+        return [
+            {
+                'id': crawl,
+                'spider_args': json.loads(spider_args),
+                'page_store': page_store,
+                'opened_at': opened_at,
+                'responses': count
+            }
+            for crawl, spider_args, page_store, opened_at, count in rows
+        ]
+
+    def responses(self, crawl, spider):
+        """Yield the responses of a crawl in the order they were received
+
+        Each response carries a request rebuilt with its original callback
+        (bound to spider), meta and cb_kwargs. Responses to requests that
+        had no spider callback are skipped. A 304 Not Modified is replaced
+        by the newest full response recorded for the same request before
+        it, when there is one, so unchanged pages are extracted again.
+        """
+        columns = 'r.id, r.fingerprint, r.url, r.method, r.status, r.response_url, r.headers, r.timestamp, r.request'
+        rows = self.conn.execute(
+            f'SELECT {columns}, b.segment, b.offset, b.length, b.codec'
+            ' FROM responses r JOIN bodies b ON b.hash = r.body_hash WHERE r.crawl = ? ORDER BY r.id',
+            (crawl,)
+        )
+        for row in rows:
+            record = json.loads(row[8])
+            if record['callback'] is None:
+                continue
+            if row[4] == 304:
+                full = self.conn.execute(
+                    f'SELECT {columns}, b.segment, b.offset, b.length, b.codec'
+                    ' FROM responses r JOIN bodies b ON b.hash = r.body_hash'
+                    ' WHERE r.fingerprint = ? AND r.id < ? AND r.status BETWEEN 200 AND 299'
+                    ' ORDER BY r.id DESC LIMIT 1',
+                    (row[1], row[0])
+                ).fetchone()
+                if full is not None:
+                    row = full[:8] + (row[8],) + full[9:]
+            yield self._response(row, record, spider)
+
+    def _response(self, row, record, spider):
+        _, _, url, method, status, response_url, raw_headers, timestamp, _, segment, offset, length, codec = row
+        request = Request(
+            url,
+            method=method,
+            callback=getattr(spider, record['callback']),
+            meta=dict(record['meta'], cache_timestamp=timestamp),
+            cb_kwargs=record['cb_kwargs'],
+            dont_filter=True
+        )
+        body = self.codecs[codec][1](self._read(segment, offset, length))
+        headers = Headers(headers_raw_to_dict(raw_headers))
+        respcls = responsetypes.from_args(headers=headers, url=response_url, body=body)
+        return respcls(url=response_url, headers=headers, status=status, body=body, request=request)
+
+    def _read(self, segment, offset, length):
+        reader = self._readers.get(segment)
+        if reader is None:
+            path = os.path.join(self.directory, f'segment-{segment:05d}.pack')
+            reader = self._readers[segment] = open(path, 'rb')
+        reader.seek(offset)
+        return reader.read(length)
@@ -7,6 +7,11 @@ import scrapy
 
 
 class WebScraperItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+    # Record type: 'company_info', 'page', 'article' or 'collection'
+    kind = scrapy.Field()
+    # URL the record was extracted from
+    url = scrapy.Field()
+    # Extracted fields (title, headlines, paragraphs, ...) as built by the spider
+    data = scrapy.Field()
+    # Names of the content categories the page was filed under
+    categories = scrapy.Field()
@@ -0,0 +1,190 @@
+"""
+Crawls run as jobs inside one long-lived process
+
+Every `scrapy crawl` pays for starting Python, importing Scrapy and the
+project and starting a reactor, and a daily refresh of a small site spends
+more time on that than on crawling. JobRunner runs crawls as jobs on a
+CrawlerRunner whose reactor keeps running between them, so the scraping
+daemon (see web_scraper.daemon) starts Scrapy once. A job goes from queued
+to running to finished, or to failed when the crawl raised or closed for
+another reason than 'finished', or to cancelled. Jobs for the same spider
+and website run one after the other, since they share a page store and
+crawl state; at most SCRAPE_DAEMON_MAX_JOBS run at once. Two spiders that
+write the same knowledge-base directory (support_spider and
+support_api_spider) should not be submitted together.
+
+A job's website_name argument names the directory its spider writes under
+website_content, so it must be a plain name (WEBSITE_NAME_RE): one with a
+path separator or '..' could write anywhere the daemon's user can.
+
+project_settings() is what both the daemon and the batch scripts crawl
+with: the project settings, with the directories Scrapy would resolve
+against the working directory resolved against the project instead, so
+the scripts behave the same wherever a scheduler starts them.
+"""
+
+import itertools
+import os
+import re
+from datetime import datetime
+
+from scrapy import signals
+from scrapy.crawler import CrawlerRunner
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.defer import deferred_from_coro
+from twisted.internet.defer import DeferredLock, DeferredSemaphore, succeed
+
+from web_scraper.checkpoint import PROJECT_DIR
+
+
+# Finished jobs the runner remembers, with their stats
+KEEP_FINISHED = 200
+
+# Website names a job may crawl: one directory name, e.g. support_brightmove
+WEBSITE_NAME_RE = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.-]*')
+
+
+def project_settings():
+    """The project settings, independent of the working directory"""
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', 'web_scraper.settings')
+    settings = get_project_settings()
+    # The HTTP cache lives in the project's .scrapy data directory, which
+    # Scrapy only finds from a working directory under scrapy.cfg
+    directories = {
+        'HTTPCACHE_DIR': os.path.join(PROJECT_DIR, '.scrapy'),
+        'CALLBACK_PROFILE_DIR': PROJECT_DIR
+    }
+    for name, base in directories.items():
+        value = settings.get(name)
+        if value and not os.path.isabs(value):
+            settings.set(name, os.path.join(base, value), priority=settings.getpriority(name))
+    return settings
+
+
+def create_crawler(runner, spider, overrides=None):
+    """A crawler of runner for a spider name, with settings of its own (a website's CRAWL_BUDGETS, say)"""
+    crawler = runner.create_crawler(spider)
+    # The crawler's own copy of the settings, frozen once it starts crawling
+    crawler.settings.setdict(overrides or {}, priority='cmdline')
+    return crawler
+
+
+def json_stats(stats):
+    """Crawl stats with their datetimes as ISO strings"""
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in stats.items()}
+
+
+class Job:
+    """A crawl submitted to a JobRunner: a spider, its arguments and settings overrides"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, spider, args=None, settings=None):
+        self.id = f"{datetime.now():%Y%m%d%H%M%S}-{next(self._ids)}"
+        self.spider = spider
+        self.args = args or {}
+        self.settings = settings or {}
+        website = self.args.get('website_name')
+        if website is not None and not (isinstance(website, str) and WEBSITE_NAME_RE.fullmatch(website)):
+            raise ValueError(f"website_name must be a plain directory name, not {website!r}")
+        self.name = f"{spider}/{website}" if website else spider
+        self.state = 'queued'
+        self.reason = None
+        self.error = None
+        self.stats = {}
+        self.submitted_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.crawler = None
+
+    def spider_closed(self, spider, reason):
+        self.reason = reason
+
+    def to_dict(self):
+        # A running job reports its stats so far
+        stats = self.crawler.stats.get_stats() if self.crawler is not None else self.stats
+        return {
+            'id': self.id,
+            'name': self.name,
+            'spider': self.spider,
+            'args': self.args,
+            'settings': self.settings,
+            'state': self.state,
+            'reason': self.reason,
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'stats': json_stats(stats)
+        }
+
+
+class JobRunner:
+    """Runs Jobs on one CrawlerRunner, in the reactor of the calling process
+
+    The reactor must already be installed (scrapy.utils.reactor.install_reactor)
+    and is left running between jobs.
+    """
+
+    def __init__(self, settings=None, max_jobs=None):
+        self.runner = CrawlerRunner(settings if settings is not None else project_settings())
+        self.slots = DeferredSemaphore(max_jobs or self.runner.settings.getint('SCRAPE_DAEMON_MAX_JOBS', 4))
+        # One lock per job name, so a website's jobs never overlap
+        self.locks = {}
+        self.jobs = {}
+
+    def submit(self, job):
+        """Queue a job; raises KeyError for a spider the project does not have"""
+        self.runner.spider_loader.load(job.spider)
+        self.jobs[job.id] = job
+        self._forget_finished()
+        lock = self.locks.setdefault(job.name, DeferredLock())
+        lock.run(self.slots.run, self._run, job)
+        return job
+
+    def stop(self, job):
+        """Cancel a queued job or stop a running one"""
+        if job.state == 'queued':
+            job.state = 'cancelled'
+            job.finished_at = datetime.now().isoformat()
+        elif job.state == 'running':
+            deferred_from_coro(job.crawler.stop_async())
+
+    def shutdown(self):
+        """Cancel the queued jobs and stop the running ones; returns a Deferred fired once they stopped"""
+        for job in self.jobs.values():
+            if job.state == 'queued':
+                self.stop(job)
+        return self.runner.stop()
+
+    def _run(self, job):
+        if job.state != 'queued':
+            return succeed(None)
+        job.state = 'running'
+        job.started_at = datetime.now().isoformat()
+        try:
+            job.crawler = create_crawler(self.runner, job.spider, job.settings)
+        except Exception as e:
+            self._done(job, error=str(e))
+            return succeed(None)
+        job.crawler.signals.connect(job.spider_closed, signal=signals.spider_closed)
+        d = self.runner.crawl(job.crawler, **job.args)
+        d.addCallbacks(lambda _: self._done(job), lambda failure: self._done(job, failure.getErrorMessage()))
+        return d
+
+    def _done(self, job, error=None):
+        if job.crawler is not None:
+            job.stats = job.crawler.stats.get_stats()
+            job.crawler = None
+        job.error = error
+        job.state = 'finished' if error is None and job.reason == 'finished' else 'failed'
+        job.finished_at = datetime.now().isoformat()
+
+    def _forget_finished(self):
+        done = [job_id for job_id, job in self.jobs.items() if job.finished_at is not None]
+        for job_id in done[:max(len(done) - KEEP_FINISHED, 0)]:
+            del self.jobs[job_id]
+
+    @property
+    def running(self):
+        return sum(1 for job in self.jobs.values() if job.state == 'running')
@@ -0,0 +1,294 @@
+"""
+Link graph of a crawl in compressed sparse row form, ranked with PageRank
+
+The spiders record the links of every page they parse. LinkGraphRecorder
+gives each URL an integer id the first time it sees it and streams the
+links to raw_data/link_graph.edges as pairs of 32-bit ids (and the URLs to
+link_graph.urls), so a crawl with millions of links holds no Python object
+per link, only the URL to id map; a resumed crawl carries on with both
+files. When the spider closes, the pairs are loaded into NumPy,
+deduplicated and sorted into CSR form, PageRank and in-degree are computed
+from it, and everything is saved to raw_data/link_graph.npz:
+
+    urls       the URLs as newline-terminated UTF-8; a URL's id is its line number
+    keys       64-bit hash of every URL, to look ids up without the strings
+    indptr     int64; page i links to indices[indptr[i]:indptr[i + 1]]
+    indices    int32 link targets
+    fetched    bool, the pages that were parsed rather than only linked to
+    rank       float64 PageRank, summing to 1
+    in_degree  int32 links from other pages
+    start      ids of the start pages
+
+The next crawl of the site loads the graph as a LinkGraph. Requests for
+pages with a high rank get up to LINK_GRAPH_RANK_PRIORITY added to their
+priority (see web_scraper.crawl_budget), so they are fetched first, and a
+page that has not changed keeps the links it had. link_report.py lists a
+site's top pages and its orphans: pages that were fetched but that no
+other page links to.
+"""
+
+import glob
+import hashlib
+import os
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from web_scraper.checkpoint import KNOWLEDGE_BASE_DIRS, atomic_write
+
+
+LINK_GRAPH_FILE = 'link_graph.npz'
+URLS_FILE = 'link_graph.urls'
+EDGES_FILE = 'link_graph.edges'
+
+# Bytes of one (source, target) pair in the edges file
+EDGE_SIZE = 8
+
+
+def url_key(url):
+    """64-bit hash of a URL, as stored in a graph's keys"""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def build_csr(sources, targets, nodes):
+    """indptr and indices of the distinct links between nodes, leaving out self-links"""
+    keep = (sources != targets) & (sources < nodes) & (targets < nodes)
+    pairs = np.unique(sources[keep].astype(np.int64) * nodes + targets[keep])
+    sources, indices = np.divmod(pairs, nodes)
+    indptr = np.zeros(nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=nodes), out=indptr[1:])
+    return indptr, indices.astype(np.int32)
+
+
+def pagerank(indptr, indices, damping=0.85, tolerance=1e-9, max_iterations=100):
+    """PageRank of every node of a CSR graph by power iteration
+
+    Pages without links spread their rank over every page, so the ranks
+    always sum to 1.
+    """
+    nodes = len(indptr) - 1
+    if nodes == 0:
+        return np.zeros(0)
+    out_degree = np.diff(indptr)
+    dangling = out_degree == 0
+    sources = np.repeat(np.arange(nodes, dtype=np.int32), out_degree)
+    share = np.zeros(nodes)
+    rank = np.full(nodes, 1.0 / nodes)
+    for _ in range(max_iterations):
+        np.divide(rank, out_degree, out=share, where=~dangling)
+        new = np.bincount(indices, weights=share[sources], minlength=nodes)
+        new = damping * (new + rank[dangling].sum() / nodes) + (1 - damping) / nodes
+        change = np.abs(new - rank).sum()
+        rank = new
+        if change < tolerance:
+            break
+    return rank
+
+
+class LinkGraph:
+    """A saved link graph; URLs are decoded only when asked for"""
+
+    def __init__(self, path):
+        self.path = path
+        with np.load(path) as data:
+            blob = data['urls']
+            self.keys = data['keys']
+            self.indptr = data['indptr']
+            self.indices = data['indices']
+            self.fetched = data['fetched']
+            self.rank = data['rank']
+            self.in_degree = data['in_degree']
+            self.start = data['start']
+        self._blob = blob.tobytes()
+        self._ends = np.flatnonzero(blob == ord('\n'))
+        self._order = np.argsort(self.keys)
+        self._sorted_keys = self.keys[self._order]
+        # Rank as a fraction of the pages ranked below, for rank_priority()
+        self.percentile = np.empty(len(self.rank))
+        self.percentile[np.argsort(self.rank, kind='stable')] = np.arange(len(self.rank)) / max(len(self.rank) - 1, 1)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def links(self):
+        return len(self.indices)
+
+    def url(self, i):
+        start = self._ends[i - 1] + 1 if i else 0
+        return self._blob[start:self._ends[i]].decode('utf-8')
+
+    def id(self, url):
+        """The id of a URL, or None if the graph does not have it"""
+        key = url_key(url)
+        position = np.searchsorted(self._sorted_keys, key)
+        if position < len(self._sorted_keys) and self._sorted_keys[position] == key:
+            return int(self._order[position])
+        return None
+
+    def out_links(self, url):
+        """The URLs a fetched page linked to, or None if it was not fetched"""
+        i = self.id(url)
+        if i is None or not self.fetched[i]:
+            return None
+        return [self.url(j) for j in self.indices[self.indptr[i]:self.indptr[i + 1]]]
+
+    def rank_priority(self, url, weight):
+        """Priority bonus of a URL: weight times the share of the pages it outranks"""
+        i = self.id(url)
+        return 0 if i is None else int(weight * self.percentile[i])
+
+    def top(self, count=20):
+        """(url, rank, in-degree) of the fetched pages of highest rank"""
+        ids = np.flatnonzero(self.fetched)
+        ids = ids[np.argsort(-self.rank[ids], kind='stable')[:count]]
+        return [(self.url(i), float(self.rank[i]), int(self.in_degree[i])) for i in ids]
+
+    def orphans(self):
+        """URLs of the fetched pages, other than the start pages, that no other page links to"""
+        orphaned = self.fetched & (self.in_degree == 0)
+        orphaned[self.start] = False
+        return [self.url(i) for i in np.flatnonzero(orphaned)]
+
+
+def load_link_graph(path):
+    """The LinkGraph saved at path, or None if there is none (or it is unreadable)"""
+    if np is None or not os.path.exists(path):
+        return None
+    try:
+        return LinkGraph(path)
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+class LinkGraphRecorder:
+    """Records the links of a crawl as they are found and saves the graph when it ends
+
+    Without a directory nothing is recorded: spiders hold one of those
+    until from_crawler() opens the real one (see open_link_graph()).
+    previous is the LinkGraph of the last crawl, if there is one.
+    """
+
+    def __init__(self, directory=None, previous=None, resume=False, rank_weight=100, damping=0.85):
+        self.directory = directory
+        self.previous = previous
+        self.rank_weight = rank_weight
+        self.damping = damping
+        self.ids = {}
+        if directory is None:
+            return
+        self.urls_path = os.path.join(directory, URLS_FILE)
+        self.edges_path = os.path.join(directory, EDGES_FILE)
+        os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(self.urls_path):
+            with open(self.urls_path, encoding='utf-8') as f:
+                for line in f:
+                    self.ids[line.rstrip('\n')] = len(self.ids)
+            # A kill may have cut the last pair short
+            size = os.path.getsize(self.edges_path) if os.path.exists(self.edges_path) else 0
+            with open(self.edges_path, 'ab') as f:
+                f.truncate(size - size % EDGE_SIZE)
+        else:
+            resume = False
+        self._urls = open(self.urls_path, 'a' if resume else 'w', encoding='utf-8')
+        self._edges = open(self.edges_path, 'ab' if resume else 'wb')
+
+    def _id(self, url):
+        i = self.ids.get(url)
+        if i is None:
+            i = self.ids[url] = len(self.ids)
+            self._urls.write(url + '\n')
+        return i
+
+    def add(self, source, targets):
+        """Record that a page was parsed and the URLs it links to"""
+        if self.directory is None:
+            return
+        source_id = self._id(source)
+        # A self-link marks the page as fetched; it is left out of the graph
+        pairs = array('I', (source_id, source_id))
+        for target in targets:
+            if '\n' not in target:
+                pairs.append(source_id)
+                pairs.append(self._id(target))
+        self._edges.write(pairs.tobytes())
+
+    def carry(self, url):
+        """Record again the links of a page the previous graph has, when it was not parsed this time"""
+        links = self.previous.out_links(url) if self.previous is not None else None
+        if links is not None:
+            self.add(url, links)
+
+    def rank_priority(self, url):
+        """Priority bonus of a URL from its rank in the previous graph"""
+        if self.previous is None:
+            return 0
+        return self.previous.rank_priority(url, self.rank_weight)
+
+    def close(self, start_urls=(), keep_state=False):
+        """Save the graph to link_graph.npz; returns its summary, or None when not recording
+
+        With keep_state the edge and URL files are kept for a resumed crawl.
+        """
+        if self.directory is None:
+            return None
+        self._urls.close()
+        self._edges.close()
+
+        nodes = len(self.ids)
+        pairs = np.fromfile(self.edges_path, dtype=np.uint32).reshape(-1, 2)
+        sources, targets = pairs[:, 0], pairs[:, 1]
+        fetched = np.zeros(nodes, dtype=bool)
+        fetched[sources[sources < nodes]] = True
+        indptr, indices = build_csr(sources, targets, nodes)
+        rank = pagerank(indptr, indices, self.damping)
+        in_degree = np.bincount(indices, minlength=nodes).astype(np.int32)
+        with open(self.urls_path, 'rb') as f:
+            urls = np.frombuffer(f.read(), dtype=np.uint8)
+        keys = np.fromiter((url_key(url) for url in self.ids), dtype=np.int64, count=nodes)
+        start = np.array([self.ids[url] for url in start_urls if url in self.ids], dtype=np.int64)
+
+        path = os.path.join(self.directory, LINK_GRAPH_FILE)
+        with atomic_write(path, 'wb') as f:
+            np.savez_compressed(f, urls=urls, keys=keys, indptr=indptr, indices=indices, fetched=fetched,
+                                rank=rank, in_degree=in_degree, start=start)
+        if not keep_state:
+            os.remove(self.urls_path)
+            os.remove(self.edges_path)
+
+        orphaned = fetched & (in_degree == 0)
+        orphaned[start] = False
+        return {'pages': nodes, 'links': len(indices), 'fetched': int(fetched.sum()), 'orphans': int(orphaned.sum())}
+
+
+def open_link_graph(crawler, spider, directory):
+    """The LinkGraphRecorder of a crawl saving its graph in directory
+
+    Returns one that records nothing when LINK_GRAPH_ENABLED is off,
+    numpy is missing or the spider is replaying a recorded crawl (whose
+    live run saved the graph).
+    """
+    settings = crawler.settings
+    if not settings.getbool('LINK_GRAPH_ENABLED', True) or getattr(spider, 'replaying', False):
+        return LinkGraphRecorder()
+    if np is None:
+        spider.logger.warning("The link graph needs numpy (pip install numpy); not recording it")
+        return LinkGraphRecorder()
+    return LinkGraphRecorder(
+        directory,
+        previous=load_link_graph(os.path.join(directory, LINK_GRAPH_FILE)),
+        resume=getattr(spider, 'resuming', False),
+        rank_weight=settings.getint('LINK_GRAPH_RANK_PRIORITY', 100),
+        damping=settings.getfloat('LINK_GRAPH_DAMPING', 0.85)
+    )
+
+
+def graph_paths(directories=KNOWLEDGE_BASE_DIRS):
+    """Every saved link graph under the knowledge-base directories"""
+    paths = []
+    for directory in directories:
+        paths.extend(sorted(glob.glob(os.path.join(directory, '**', 'raw_data', LINK_GRAPH_FILE), recursive=True)))
+    return paths
@@ -3,22 +3,43 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+from datetime import datetime
+
 from scrapy import signals
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from web_scraper.profiler import StackSampler
+from web_scraper.throttle import DomainThrottle, retry_after_seconds
+
 
 class WebScraperSpiderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the spider middleware does not modify the
-    # passed objects.
+    """Opt-in sampling profiler of spider callbacks (CALLBACK_PROFILE_ENABLED)
+
+    While enabled, every step of a callback's output and every call of the
+    spider methods in CALLBACK_PROFILE_METHODS (save_organized_content, run
+    when the spider closes) is sampled by web_scraper.profiler.StackSampler.
+    The collapsed stacks, rooted at the spider and callback names, are
+    written to CALLBACK_PROFILE_DIR when the spider closes. Disabled, the
+    middleware passes everything through.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.enabled = settings.getbool('CALLBACK_PROFILE_ENABLED')
+        self.interval = settings.getfloat('CALLBACK_PROFILE_INTERVAL', 0.005)
+        self.directory = settings.get('CALLBACK_PROFILE_DIR', 'profiles')
+        self.methods = settings.getlist('CALLBACK_PROFILE_METHODS', ['save_organized_content'])
+        self.sampler = None
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        s = cls(crawler)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
     def process_spider_input(self, response, spider):
@@ -28,12 +49,31 @@ class WebScraperSpiderMiddleware:
         # Should return None or raise an exception.
         return None
 
+    def _section(self, response, spider):
+        """Name and outermost code object of the callback that handled a response"""
+        request = getattr(response, 'request', None)
+        callback = getattr(request, 'callback', None) or spider.parse
+        function = getattr(callback, '__func__', callback)
+        return getattr(function, '__name__', 'parse'), getattr(function, '__code__', None)
+
     def process_spider_output(self, response, result, spider):
         # Called with the results returned from the Spider, after
         # it has processed the response.
 
         # Must return an iterable of Request, or item objects.
-        for i in result:
+        if self.sampler is None:
+            yield from result
+            return
+        name, code = self._section(response, spider)
+        yield from self.sampler.iterate(name, code, result)
+
+    async def process_spider_output_async(self, response, result, spider):
+        if self.sampler is None:
+            async for i in result:
+                yield i
+            return
+        name, code = self._section(response, spider)
+        async for i in self.sampler.iterate_async(name, code, result):
             yield i
 
     def process_spider_exception(self, response, exception, spider):
@@ -51,50 +91,130 @@ class WebScraperSpiderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+        if not self.enabled:
+            return
+        # Signals are sent from the crawl thread, which is the one sampled
+        self.sampler = StackSampler(spider.name, self.interval)
+        for name in self.methods:
+            method = getattr(spider, name, None)
+            if callable(method) and hasattr(method, '__func__'):
+                setattr(spider, name, self.sampler.profile(name, method))
+        self.sampler.start()
+
+    def spider_closed(self, spider):
+        # Runs after the spider's own closed(), so save_organized_content is included
+        if self.sampler is None:
+            return
+        self.sampler.stop()
+        site = getattr(spider, 'website_name', None)
+        name = f"{spider.name}_{site}" if site else spider.name
+        path = os.path.join(self.directory, f"{name}-{datetime.now():%Y%m%d-%H%M%S}.collapsed")
+        self.sampler.write(path)
+        spider.logger.info(f"Callback profile: {self.sampler.samples} samples written to {path}")
+        self.sampler = None
 
 
 class WebScraperDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    """Adapt each domain's concurrency and delay to its latency, errors and Retry-After
+
+    The per-domain state lives in web_scraper.throttle.DomainThrottle and is
+    applied to the domain's downloader slot after every response. Floors and
+    ceilings come from the ADAPTIVE_THROTTLE_* settings, overridden per
+    domain by ADAPTIVE_THROTTLE_DOMAINS. Changes are logged, and each
+    domain's final settings are logged and put in the crawl stats when the
+    spider closes.
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        settings = crawler.settings
+        self.enabled = settings.getbool('ADAPTIVE_THROTTLE_ENABLED', True)
+        self.limits = {
+            'min_concurrency': settings.getint('ADAPTIVE_THROTTLE_MIN_CONCURRENCY', 1),
+            'max_concurrency': settings.getint('ADAPTIVE_THROTTLE_MAX_CONCURRENCY', 8),
+            'min_delay': settings.getfloat('ADAPTIVE_THROTTLE_MIN_DELAY', 0.25),
+            'max_delay': settings.getfloat('ADAPTIVE_THROTTLE_MAX_DELAY', 60.0),
+            'target_latency': settings.getfloat('ADAPTIVE_THROTTLE_TARGET_LATENCY', 2.0)
+        }
+        self.domain_limits = settings.getdict('ADAPTIVE_THROTTLE_DOMAINS')
+        self.throttles = {}
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        s = cls(crawler)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
-    def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
-        return None
-
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        # Responses served from the HTTP cache say nothing about the server
+        if not self.enabled or 'cached' in response.flags:
+            return response
+        slot_key, slot = self._slot(request)
+        if slot is None:
+            return response
+        throttle = self._throttle(slot_key, slot)
+        retry_after = None
+        if response.status in (429, 503):
+            retry_after = retry_after_seconds(response.headers.get('Retry-After'))
+        reason = throttle.response(response.status, request.meta.get('download_latency'), retry_after)
+        self._apply(slot_key, slot, throttle, reason)
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+        if not self.enabled:
+            return None
+        slot_key, slot = self._slot(request)
+        if slot is not None:
+            throttle = self._throttle(slot_key, slot)
+            self._apply(slot_key, slot, throttle, throttle.failure(type(exception).__name__))
+        return None
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def _slot(self, request):
+        slot_key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(slot_key) if slot_key is not None else None
+        return slot_key, slot
+
+    def _throttle(self, slot_key, slot):
+        throttle = self.throttles.get(slot_key)
+        if throttle is None:
+            limits = dict(self.limits, **self.domain_limits.get(slot_key, {}))
+            throttle = self.throttles[slot_key] = DomainThrottle(slot_key, slot.concurrency, slot.delay, **limits)
+            self.crawler.spider.logger.info(
+                f"Throttle {slot_key}: starting at concurrency {throttle.concurrency}, delay {throttle.delay:.2f}s "
+                f"(concurrency {limits['min_concurrency']}-{limits['max_concurrency']}, "
+                f"delay {limits['min_delay']}-{limits['max_delay']}s, target latency {limits['target_latency']}s)"
+            )
+            self._apply(slot_key, slot, throttle, 'limits')
+        return throttle
+
+    def _apply(self, slot_key, slot, throttle, reason):
+        # Idle slots are garbage-collected and recreated with the project
+        # defaults, so the throttle's values are re-applied every time
+        before = (slot.concurrency, slot.delay)
+        slot.concurrency = throttle.concurrency
+        slot.delay = throttle.delay
+        if reason is None or before == (slot.concurrency, slot.delay):
+            return
+        message = (
+            f"Throttle {slot_key}: concurrency {before[0]} -> {slot.concurrency}, "
+            f"delay {before[1]:.2f}s -> {slot.delay:.2f}s ({reason})"
+        )
+        # Logging every small delay step of a healthy domain would flood the log
+        if reason == 'healthy' and before[0] == slot.concurrency:
+            self.crawler.spider.logger.debug(message)
+        else:
+            self.crawler.spider.logger.info(message)
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+    def spider_closed(self, spider):
+        for slot_key, throttle in sorted(self.throttles.items()):
+            settings = throttle.settings()
+            spider.logger.info(f"Throttle {slot_key} at close: {settings}")
+            for name in ('concurrency', 'delay', 'latency', 'error_rate', 'responses'):
+                self.crawler.stats.set_value(f'throttle/{slot_key}/{name}', settings[name])
+            for reason, count in settings['decreases'].items():
+                self.crawler.stats.set_value(f'throttle/{slot_key}/decreases/{reason}', count)
@@ -0,0 +1,287 @@
+"""
+Append-only JSON Lines store for scraped records
+
+Spiders yield WebScraperItem records, WebScraperPipeline appends them to
+raw_data/pages.jsonl as they arrive, and each spider's
+save_organized_content() streams them back from disk to build the category
+files, all_pages.txt, complete_scrape.json and index.txt. The counts and
+category texts those files need are gathered in one pass (summarize()).
+Nothing is held in memory for the whole crawl, so memory stays flat however
+large the site is.
+
+Text lists in a record's data (headlines, paragraphs, lists, ...) are
+interned in a TextStore next to pages.jsonl and written as lists of text
+references; records() resolves them back to text unless asked not to.
+
+The text store commits in batches, so after a crash the last records may
+refer to texts that were never committed; sync() makes everything written
+so far durable and repair() cuts a store back to its last consistent record.
+"""
+
+import json
+import os
+
+from web_scraper.text_store import TextStore
+
+
+# Record kinds that count as pages (support articles are pages too)
+PAGE_KINDS = ('page', 'article')
+
+
+def site_name(spider):
+    """The content directory of a spider's site under website_content, e.g. brightmove/support"""
+    return os.path.relpath(os.path.dirname(os.path.dirname(spider.page_store_path)), spider.website_content_dir)
+
+
+class PageStore:
+    """Append-only JSON Lines file holding one scraped record per line"""
+
+    def __init__(self, path):
+        self.path = path
+        self.texts_path = os.path.join(os.path.dirname(path), 'texts.sqlite')
+        self._file = None
+        self._texts = None
+        # Records in the file, counted while appending
+        self.written = 0
+
+    @property
+    def texts(self):
+        """The TextStore holding the text referenced by this store's records"""
+        if self._texts is None:
+            self._texts = TextStore(self.texts_path)
+        return self._texts
+
+    def open(self, mode='w'):
+        """Open the store for appending; mode 'w' starts a fresh crawl"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, mode, encoding='utf-8')
+        if mode == 'w':
+            self.texts.clear()
+            self.written = 0
+
+    def append(self, record):
+        """Write one record and flush it so a crash loses at most this line"""
+        record = dict(record, data=self._intern(record.get('data') or {}))
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.written += 1
+    
+    def sync(self):
+        """Commit the texts and sync the file; returns (records, bytes) now durable"""
+        self.texts.commit()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self.written, self._file.tell()
+    
+    def repair(self, records=0, offset=0):
+        """Cut the file back to its last complete record whose texts are all stored
+
+        records and offset come from the last checkpoint: everything before
+        offset is known to be durable and is not checked again. Returns the
+        number of records kept and the number dropped.
+        """
+        if not os.path.exists(self.path):
+            self.written = 0
+            return 0, 0
+        if offset > os.path.getsize(self.path):
+            records = offset = 0
+        kept, position, dropped = records, offset, 0
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if dropped or not line.endswith(b'\n'):
+                    dropped += 1
+                    continue
+                try:
+                    refs = set(self._refs(json.loads(line)['data']))
+                except (ValueError, KeyError, TypeError):
+                    refs = None
+                if refs is None or len(self.texts.lookup(refs)) != len(refs):
+                    dropped += 1
+                    continue
+                kept += 1
+                position += len(line)
+        if dropped:
+            os.truncate(self.path, position)
+        self.written = kept
+        return kept, dropped
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+        if self._texts is not None:
+            self._texts.close()
+            self._texts = None
+
+    def _intern(self, data):
+        """Copy of a record's data with every list of strings replaced by references"""
+        interned = {}
+        for key, value in data.items():
+            if isinstance(value, dict):
+                value = self._intern(value)
+            elif isinstance(value, list) and all(isinstance(text, str) for text in value):
+                value = [self.texts.intern(text) for text in value]
+            interned[key] = value
+        return interned
+
+    def _resolve(self, data, texts):
+        for key, value in data.items():
+            if isinstance(value, dict):
+                self._resolve(value, texts)
+            elif isinstance(value, list) and all(isinstance(ref, str) for ref in value):
+                data[key] = [texts[ref] for ref in value]
+
+    def _refs(self, data):
+        for value in data.values():
+            if isinstance(value, dict):
+                yield from self._refs(value)
+            elif isinstance(value, list) and all(isinstance(ref, str) for ref in value):
+                yield from value
+
+    def records(self, kinds=None, resolve=True):
+        """Stream records back from disk, optionally filtered by kind
+
+        With resolve=False, text lists are left as lists of text references.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                # A line without its newline was torn by a crash mid-write
+                if not line.endswith('\n'):
+                    break
+                record = json.loads(line)
+                if kinds is None or record['kind'] in kinds:
+                    if resolve:
+                        self._resolve(record['data'], self.texts.lookup(self._refs(record['data'])))
+                    yield record
+
+    def pages(self, kinds=PAGE_KINDS, resolve=True):
+        """Stream the extracted content of every page record"""
+        for record in self.records(kinds, resolve=resolve):
+            yield record['data']
+
+    def count(self, kinds=PAGE_KINDS):
+        return sum(1 for _ in self.records(kinds, resolve=False))
+
+    def category_pages(self, category, resolve=True):
+        """Stream the page records filed under a category"""
+        for record in self.records(PAGE_KINDS, resolve=resolve):
+            if category in record.get('categories', []):
+                yield record
+
+    def text_items(self):
+        """Stream every interned text as {'id': reference, 'text': text}, in first-seen order"""
+        for ref, text in self.texts.items():
+            yield {'id': ref, 'text': text}
+
+    def _lookup_in_order(self, refs):
+        texts = self.texts.lookup(refs)
+        return [texts[ref] for ref in refs]
+
+    def summarize(self, category_fields):
+        """Gather the counts, latest records and category texts of the store in one pass"""
+        return StoreSummary(self, category_fields)
+
+
+class StoreSummary:
+    """Counts, latest records and category texts of a PageStore, from one pass over it
+
+    Saving a crawl writes complete_scrape.json, a file per category and
+    index.txt, which between them ask for every category's texts and
+    counts; answering each from pages.jsonl would read the whole file once
+    per question. The category references are filed in the text store
+    rather than kept in memory, so memory stays flat however large the
+    crawl. Use it before the store is closed.
+    """
+
+    def __init__(self, store, category_fields):
+        self.store = store
+        self.kinds = {}
+        self._latest = {}
+        self._resolved = set()
+        self.refs = dict.fromkeys(category_fields, 0)
+        self.unique_refs = dict.fromkeys(category_fields, 0)
+
+        texts = store.texts
+        texts.clear_categories()
+        for record in store.records(resolve=False):
+            kind = record['kind']
+            self.kinds[kind] = self.kinds.get(kind, 0) + 1
+            self._latest[kind] = record['data']
+            if kind not in PAGE_KINDS:
+                continue
+            for category in record.get('categories', []):
+                if category not in category_fields:
+                    continue
+                refs = [ref for field in category_fields[category] for ref in record['data'].get(field, [])]
+                self.refs[category] += len(refs)
+                self.unique_refs[category] += texts.file_refs(category, refs)
+        texts.commit()
+
+    def count(self, kinds=PAGE_KINDS):
+        return sum(self.kinds.get(kind, 0) for kind in kinds)
+
+    def latest(self, kind):
+        """The data of the last record of a kind (e.g. company_info)"""
+        data = self._latest.get(kind, {})
+        if kind in self._latest and kind not in self._resolved:
+            self.store._resolve(data, self.store.texts.lookup(self.store._refs(data)))
+            self._resolved.add(kind)
+        return data
+
+    def category_refs(self, category):
+        """Stream the distinct text references of a category, in first-seen order"""
+        return self.store.texts.category_refs(category)
+
+    def category_texts(self, category):
+        """Stream the distinct texts of a category, in first-seen order"""
+        refs = []
+        for ref in self.category_refs(category):
+            refs.append(ref)
+            if len(refs) >= 500:
+                yield from self.store._lookup_in_order(refs)
+                refs = []
+        yield from self.store._lookup_in_order(refs)
+
+    def has_texts(self, category):
+        return self.unique_refs.get(category, 0) > 0
+
+    def category_count(self, category, unique=True):
+        return (self.unique_refs if unique else self.refs).get(category, 0)
+
+
+def dump_json_stream(f, sections, sidecar=None):
+    """Write a JSON object whose list values may be generators
+
+    Produces the same bytes as json.dump(dict(sections), f, indent=2,
+    ensure_ascii=False), but list sections given as iterators are written
+    element by element instead of being materialised first. A SidecarWriter
+    (see web_scraper.sidecar) given as sidecar is fed the same values.
+    """
+    f.write('{')
+    for i, (key, value) in enumerate(sections):
+        if i:
+            f.write(',')
+        f.write('\n  ' + json.dumps(key, ensure_ascii=False) + ': ')
+        if isinstance(value, (dict, list, str, int, float, bool)) or value is None:
+            f.write(json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n  '))
+            if sidecar is not None:
+                sidecar.value(key, value)
+            continue
+        if sidecar is not None:
+            sidecar.start_list(key)
+        empty = True
+        for element in value:
+            f.write(',' if not empty else '[')
+            f.write('\n    ' + json.dumps(element, indent=2, ensure_ascii=False).replace('\n', '\n    '))
+            if sidecar is not None:
+                sidecar.element(element)
+            empty = False
+        f.write('[]' if empty else '\n  ]')
+    f.write('\n}' if sections else '}')
+    if sidecar is not None:
+        sidecar.source_bytes = f.tell()
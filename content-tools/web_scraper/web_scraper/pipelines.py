@@ -4,10 +4,202 @@
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
 
+import os
+import time
+
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.job import job_dir
+
+from web_scraper.checkpoint import checkpoint_path, read_checkpoint, write_checkpoint
+from web_scraper.crawl_budget import crawl_truncated
+from web_scraper.dedup import STATE_FILE, PageDeduplicator
+from web_scraper.page_store import PAGE_KINDS, PageStore, site_name
+from web_scraper.search import BODY_FIELDS, SEARCH_INDEX_FILE, SearchIndex, field_texts
+
+
+class DeduplicationPipeline:
+    """Drop site boilerplate from pages and near-duplicate pages before they are stored
+
+    With a JOBDIR, what was learned is saved there when a crawl stops before
+    it finishes and picked up again when the crawl resumes.
+    """
+
+    def __init__(self, stats, boilerplate_min_pages=3, max_distance=3, state_dir=None):
+        self.stats = stats
+        self.boilerplate_min_pages = boilerplate_min_pages
+        self.max_distance = max_distance
+        self.state_dir = state_dir
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(
+            crawler.stats,
+            boilerplate_min_pages=crawler.settings.getint('DEDUP_BOILERPLATE_MIN_PAGES', 3),
+            max_distance=crawler.settings.getint('DEDUP_SIMHASH_DISTANCE', 3),
+            state_dir=job_dir(crawler.settings)
+        )
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.dedup = PageDeduplicator(self.boilerplate_min_pages, self.max_distance)
+        self.state_path = os.path.join(self.state_dir, STATE_FILE) if self.state_dir else None
+        if self.state_path and getattr(spider, 'resuming', False) and self.dedup.load(self.state_path):
+            spider.logger.info(f"Resuming deduplication from {self.state_path}")
+
+    def spider_closed(self, spider, reason):
+        if self.state_path is None:
+            return
+        if reason != 'finished':
+            self.dedup.save(self.state_path)
+        elif os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        if adapter.get('kind') not in PAGE_KINDS:
+            return item
+        
+        self.stats.inc_value('dedup/pages_seen')
+        data, dropped = self.dedup.strip_boilerplate(adapter.get('data') or {})
+        original = self.dedup.duplicate_of(adapter.get('url'), data)
+        if original is not None:
+            self.stats.inc_value('dedup/near_duplicates')
+            raise DropItem(f"Near-duplicate of {original}")
+        
+        self.dedup.learn(adapter.get('data') or {})
+        self.stats.inc_value('dedup/boilerplate_blocks', dropped)
+        adapter['data'] = data
+        return item
 
 
 class WebScraperPipeline:
+    """Append every scraped record to the spider's JSON Lines page store
+
+    The store is checkpointed every CHECKPOINT_INTERVAL seconds or
+    CHECKPOINT_ITEMS records, and once more when the spider closes (see
+    web_scraper.checkpoint). A resuming crawl first cuts the store back to
+    its last consistent record.
+    """
+
+    def __init__(self, stats, interval=30.0, every=1000):
+        self.stats = stats
+        self.interval = interval
+        self.every = every
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(
+            crawler.stats,
+            interval=crawler.settings.getfloat('CHECKPOINT_INTERVAL', 30.0),
+            every=crawler.settings.getint('CHECKPOINT_ITEMS', 1000)
+        )
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.store = PageStore(spider.page_store_path)
+        self.checkpoint_path = checkpoint_path(spider.page_store_path)
+        # An interrupted crawl that is resuming keeps the records it already has
+        if getattr(spider, 'resuming', False):
+            checkpoint = read_checkpoint(self.checkpoint_path) or {}
+            kept, dropped = self.store.repair(checkpoint.get('records', 0), checkpoint.get('offset', 0))
+            self.stats.set_value('checkpoint/records_kept', kept)
+            self.stats.set_value('checkpoint/records_dropped', dropped)
+            spider.logger.info(f"Page store has {kept} records from the interrupted crawl ({dropped} incomplete dropped)")
+            self.store.open('a')
+        else:
+            self.store.open('w')
+        self.checkpoint(spider, 'crawling')
+
+    def checkpoint(self, spider, state):
+        records, offset = self.store.sync()
+        self.last_checkpoint = write_checkpoint(self.checkpoint_path, spider, state, records, offset, self.stats)
+        self.checkpointed_at = time.monotonic()
+        self.stats.inc_value('checkpoint/count')
+
+    def close_spider(self, spider):
+        self.checkpoint(spider, 'crawled')
+        self.store.close()
+
+    def spider_closed(self, spider):
+        # Sent after the spider's own closed(), which writes its outputs
+        checkpoint = self.last_checkpoint
+        write_checkpoint(self.checkpoint_path, spider, 'saved', checkpoint['records'], checkpoint['offset'], self.stats)
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        self.store.append({
+            'kind': adapter.get('kind'),
+            'url': adapter.get('url'),
+            'data': adapter.get('data') or {},
+            'categories': adapter.get('categories') or []
+        })
+        if (self.store.written - self.last_checkpoint['records'] >= self.every
+                or time.monotonic() - self.checkpointed_at >= self.interval):
+            self.checkpoint(spider, 'crawling')
+        return item
+
+
+class SearchIndexPipeline:
+    """Keep the knowledge-base's full-text search index up to date (see web_scraper.search)
+
+    Documents are buffered and written SEARCH_INDEX_BATCH at a time, each
+    batch in a single short transaction.
+    """
+
+    def __init__(self, batch=100):
+        self.batch = batch
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('SEARCH_INDEX_ENABLED'):
+            raise NotConfigured
+        pipeline = cls(batch=crawler.settings.getint('SEARCH_INDEX_BATCH', 100))
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.index = SearchIndex(os.path.join(spider.knowledge_base_dir, SEARCH_INDEX_FILE))
+        self.site = site_name(spider)
+        self.crawl = getattr(spider, 'started_at', None)
+        self.fields = getattr(spider, 'category_fields', {})
+        self.pending = []
+
     def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        if adapter.get('kind') not in PAGE_KINDS:
+            return item
+        
+        data = adapter.get('data') or {}
+        url = adapter.get('url')
+        title = data.get('title') or ''
+        self.pending.append((self.site, url, 'page', title, '\n'.join(field_texts(data, BODY_FIELDS))))
+        for category in adapter.get('categories') or []:
+            texts = field_texts(data, self.fields.get(category, ()))
+            if texts:
+                self.pending.append((self.site, url, category, title, '\n'.join(texts)))
+        if len(self.pending) >= self.batch:
+            self.flush(spider)
         return item
+
+    def flush(self, spider):
+        if self.pending:
+            changed = self.index.update(self.pending, crawl=self.crawl)
+            spider.crawler.stats.inc_value('search/documents_changed', changed)
+            spider.crawler.stats.inc_value('search/documents_seen', len(self.pending))
+            self.pending = []
+
+    def close_spider(self, spider):
+        self.flush(spider)
+
+    def spider_closed(self, spider, reason):
+        # Only a complete crawl knows which of the site's pages are gone; one
+        # its budget cut short did not look at all of them
+        if reason == 'finished' and not getattr(spider, 'resuming', False) and not crawl_truncated(spider.crawler.stats):
+            removed = self.index.prune(self.site, self.crawl)
+            spider.crawler.stats.set_value('search/documents_removed', removed)
+        self.index.close()
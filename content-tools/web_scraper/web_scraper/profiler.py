@@ -0,0 +1,122 @@
+"""
+Sampling profiler for spider callbacks, writing collapsed stacks
+
+A background thread samples the crawl thread's stack every few
+milliseconds, but only while a profiled section is running: one step of a
+callback's generator, or a spider method such as save_organized_content.
+Each sample is cut at the section's own frame and prefixed with the spider
+and section names, then counted; at the end the counts are written in the
+collapsed-stack format ("frame;frame;frame count" per line) that
+flamegraph.pl, speedscope and inferno read.
+
+Sampling is by wall clock, so time a callback or save_organized_content
+spends waiting on file writes shows up as well as CPU time.
+"""
+
+import os
+import sys
+import threading
+from collections import Counter
+from functools import wraps
+
+
+def frame_name(code):
+    """Frame label: qualified function name and where it is defined"""
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples one thread's stack while a profiled section is active"""
+
+    def __init__(self, root, interval=0.005):
+        self.root = root
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        # (section name, code object of the section's outermost frame) or None
+        self.section = None
+        self.thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='callback-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def enter(self, name, code):
+        """Mark a section as running on the sampled thread; returns the one it interrupts"""
+        previous = self.section
+        self.section = (name, code)
+        return previous
+
+    def leave(self, previous):
+        self.section = previous
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            section = self.section
+            if section is None:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame.f_code))
+                if frame.f_code is section[1]:
+                    break
+                frame = frame.f_back
+            else:
+                # The section has been left (or is suspended) since it was read
+                continue
+            stack.append(section[0])
+            stack.append(self.root)
+            self.counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def profile(self, name, method):
+        """Wrap a bound method so its calls are sampled as a section of their own"""
+        code = method.__func__.__code__
+
+        @wraps(method)
+        def profiled(*args, **kwargs):
+            previous = self.enter(name, code)
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.leave(previous)
+        return profiled
+
+    def iterate(self, name, code, result):
+        """Sample each step of a callback's output iterable"""
+        iterator = iter(result)
+        while True:
+            previous = self.enter(name, code)
+            try:
+                output = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.leave(previous)
+            yield output
+
+    async def iterate_async(self, name, code, result):
+        """Sample each step of an asynchronous output iterable"""
+        iterator = result.__aiter__()
+        while True:
+            previous = self.enter(name, code)
+            try:
+                output = await iterator.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                self.leave(previous)
+            yield output
+
+    def write(self, path):
+        """Write the collapsed stacks, heaviest first"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
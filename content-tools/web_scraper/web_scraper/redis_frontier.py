@@ -0,0 +1,436 @@
+"""
+Shared URL frontier in Redis, for several crawler workers on one crawl
+
+By default each spider keeps its frontier on local disk (see
+web_scraper.frontier), so two processes crawling the same site fetch every
+page twice. With RedisScheduler and RedisDupeFilter the pending requests,
+the seen-request fingerprints and per-domain politeness tokens of a crawl
+live in Redis instead, and any number of workers, on any number of
+machines, can run the same spider against the same Redis and split the
+work between them:
+
+- the frontier is a sorted set of requests serialized as JSON, scored by
+  priority and popped atomically (ZPOPMIN), so each request goes to one
+  worker; JSON rather than pickle, since whoever can write to a shared
+  Redis could otherwise run code on every worker;
+- the seen set is a Redis set of request fingerprints (SADD tells a worker
+  whether it was the first to see one), and start requests are filtered
+  too, so the start page is fetched once however many workers start;
+- RedisPolitenessMiddleware takes a per-domain token (SET NX PX) before
+  each download, so the domain gets at most one request per DOWNLOAD_DELAY
+  (or its current adaptive delay) across all workers.
+
+Workers record a heartbeat in the crawl's hash of workers. A worker whose
+frontier is empty keeps waiting while another worker was active within
+REDIS_FRONTIER_IDLE_TIMEOUT, since that one may still discover links. The
+last worker to finish a crawl deletes its keys, so the next crawl starts
+fresh. A crawl that is interrupted leaves them, to be resumed.
+
+Enable it with:
+
+    SCHEDULER = "web_scraper.redis_frontier.RedisScheduler"
+    DUPEFILTER_CLASS = "web_scraper.redis_frontier.RedisDupeFilter"
+    REDIS_FRONTIER_URL = "redis://localhost:6379/0"
+
+Each worker still writes the knowledge-base files of the pages it fetched
+itself, into its own knowledge-base directory; the page store and HTTP
+cache are single-writer, so workers on one machine need a project
+directory each.
+
+REDIS_FRONTIER_URL = "memory://<name>" uses MemoryRedis, an in-process
+stand-in for the few commands used here, shared by every crawler of the
+process that names it: several crawlers in one CrawlerProcess then behave
+like workers on separate machines, without a Redis server.
+"""
+
+import heapq
+import json
+import os
+import socket
+import time
+from base64 import b64decode, b64encode
+from itertools import count
+
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Request
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.misc import build_from_crawler, load_object
+from scrapy.utils.request import request_from_dict
+from twisted.internet.task import deferLater
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+def _bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode('utf-8')
+
+
+def encode_request(request, spider):
+    """A request as JSON, with its body and headers base64-encoded
+
+    Returns None for a request whose meta or cb_kwargs JSON cannot carry
+    unchanged (tuples, non-string keys); raises TypeError or ValueError for
+    one that cannot be serialized at all.
+    """
+    data = request.to_dict(spider=spider)
+    data['body'] = b64encode(data['body']).decode('ascii')
+    data['headers'] = [
+        [b64encode(name).decode('ascii'), [b64encode(value).decode('ascii') for value in values]]
+        for name, values in data['headers'].items()
+    ]
+    encoded = json.dumps(data, ensure_ascii=False)
+    if json.loads(encoded) != data:
+        return None
+    return encoded.encode('utf-8')
+
+
+def decode_request(data, spider):
+    """The request encode_request() serialized; raises ValueError for anything else"""
+    data = json.loads(data)
+    request_class = load_object(data.get('_class', 'scrapy.http.Request'))
+    if not (isinstance(request_class, type) and issubclass(request_class, Request)):
+        raise ValueError(f"{data['_class']} is not a request class")
+    data['body'] = b64decode(data['body'])
+    data['headers'] = {b64decode(name): [b64decode(value) for value in values] for name, values in data['headers']}
+    return request_from_dict(data, spider=spider)
+
+
+class MemoryRedis:
+    """In-process stand-in for the Redis commands the shared frontier uses
+
+    Values come back as bytes, as from a redis.Redis client without
+    decode_responses. Key expiry is only honoured for string keys.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def _live(self, key):
+        key = _bytes(key)
+        expires = self.expiry.get(key)
+        if expires is not None and expires <= time.monotonic():
+            self.data.pop(key, None)
+            del self.expiry[key]
+        return key
+
+    def set(self, key, value, nx=False, px=None):
+        key = self._live(key)
+        if nx and key in self.data:
+            return None
+        self.data[key] = _bytes(value)
+        self.expiry.pop(key, None)
+        if px is not None:
+            self.expiry[key] = time.monotonic() + px / 1000
+        return True
+
+    def get(self, key):
+        return self.data.get(self._live(key))
+
+    def pttl(self, key):
+        key = self._live(key)
+        if key not in self.data:
+            return -2
+        if key not in self.expiry:
+            return -1
+        return max(0, int((self.expiry[key] - time.monotonic()) * 1000))
+
+    def incr(self, key):
+        key = self._live(key)
+        value = int(self.data.get(key, b'0')) + 1
+        self.data[key] = str(value).encode()
+        return value
+
+    def delete(self, *keys):
+        return sum(self.data.pop(self._live(key), None) is not None for key in keys)
+
+    def sadd(self, key, *members):
+        members_set = self.data.setdefault(_bytes(key), set())
+        added = 0
+        for member in members:
+            member = _bytes(member)
+            if member not in members_set:
+                members_set.add(member)
+                added += 1
+        return added
+
+    def scard(self, key):
+        return len(self.data.get(_bytes(key), ()))
+
+    def zadd(self, key, mapping):
+        # {member: score}; scores are kept with the members in a heap
+        zset = self.data.setdefault(_bytes(key), {'heap': [], 'members': {}})
+        added = 0
+        for member, score in mapping.items():
+            member = _bytes(member)
+            if member not in zset['members']:
+                added += 1
+            zset['members'][member] = score
+            heapq.heappush(zset['heap'], (score, member))
+        return added
+
+    def zpopmin(self, key, count=1):
+        zset = self.data.get(_bytes(key))
+        popped = []
+        while zset and zset['heap'] and len(popped) < count:
+            score, member = heapq.heappop(zset['heap'])
+            # Skip heap entries left behind by a later zadd of the same member
+            if zset['members'].get(member) == score:
+                del zset['members'][member]
+                popped.append((member, score))
+        return popped
+
+    def zcard(self, key):
+        zset = self.data.get(_bytes(key))
+        return len(zset['members']) if zset else 0
+
+    def hset(self, key, field, value):
+        fields = self.data.setdefault(_bytes(key), {})
+        added = _bytes(field) not in fields
+        fields[_bytes(field)] = _bytes(value)
+        return int(added)
+
+    def hdel(self, key, *fields):
+        hash_ = self.data.get(_bytes(key), {})
+        return sum(hash_.pop(_bytes(field), None) is not None for field in fields)
+
+    def hgetall(self, key):
+        return dict(self.data.get(_bytes(key), {}))
+
+
+# memory:// URL -> the MemoryRedis it names, shared within the process
+_memory_servers = {}
+
+
+def connect(url):
+    """A Redis client for a redis:// URL, or the shared MemoryRedis for a memory:// one"""
+    if url.startswith('memory://'):
+        return _memory_servers.setdefault(url, MemoryRedis())
+    if redis is None:
+        raise NotConfigured('The shared frontier needs the redis package (pip install redis)')
+    return redis.Redis.from_url(url)
+
+
+def shared_frontier_settings(url):
+    """Settings that switch a crawl to the shared frontier at url"""
+    return {
+        'SCHEDULER': 'web_scraper.redis_frontier.RedisScheduler',
+        'DUPEFILTER_CLASS': 'web_scraper.redis_frontier.RedisDupeFilter',
+        'REDIS_FRONTIER_URL': url
+    }
+
+
+def frontier_key(crawler, spider=None):
+    """Key prefix of a crawl's frontier: REDIS_FRONTIER_KEY, the spider and its website"""
+    spider = spider or crawler.spider
+    key = f"{crawler.settings.get('REDIS_FRONTIER_KEY', 'webscraper')}:{spider.name}"
+    website = getattr(spider, 'website_name', None)
+    return f"{key}:{website}" if website else key
+
+
+_workers = count(1)
+
+
+def worker_id():
+    """Name of a worker: host, process and crawler within the process"""
+    return f"{socket.gethostname()}:{os.getpid()}:{next(_workers)}"
+
+
+class RedisDupeFilter(BaseDupeFilter):
+    """Request dupefilter (DUPEFILTER_CLASS) sharing its seen set through Redis"""
+
+    def __init__(self, server, key, debug=False, *, fingerprinter=None):
+        self.server = server
+        self.key = key
+        self.debug = debug
+        self.fingerprinter = fingerprinter
+        self.logged = False
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        url = crawler.settings.get('REDIS_FRONTIER_URL')
+        if not url:
+            raise NotConfigured('RedisDupeFilter needs REDIS_FRONTIER_URL')
+        return cls(
+            connect(url),
+            frontier_key(crawler) + ':seen',
+            crawler.settings.getbool('DUPEFILTER_DEBUG'),
+            fingerprinter=crawler.request_fingerprinter
+        )
+
+    def request_seen(self, request):
+        return not self.server.sadd(self.key, self.fingerprinter.fingerprint(request))
+
+    def log(self, request, spider):
+        if self.debug:
+            spider.logger.debug(f"Filtered duplicate request: {request}")
+        elif not self.logged:
+            spider.logger.debug(f"Filtered duplicate request: {request} - no more duplicates will be shown")
+            self.logged = True
+        spider.crawler.stats.inc_value('dupefilter/filtered')
+
+    def clear(self):
+        self.server.delete(self.key)
+
+
+class RedisScheduler:
+    """Scheduler (SCHEDULER) whose pending requests are a sorted set in Redis
+
+    Requests that cannot be serialized (a lambda callback, say, or meta
+    that is not plain JSON) stay in a local priority queue, as Scrapy's own
+    scheduler keeps them in memory.
+    """
+
+    def __init__(self, crawler, server, dupefilter, idle_timeout=30.0):
+        self.crawler = crawler
+        self.server = server
+        self.df = dupefilter
+        self.idle_timeout = idle_timeout
+        self.stats = crawler.stats
+        self.worker = worker_id()
+        self.local = []
+        self._local_order = count()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        url = crawler.settings.get('REDIS_FRONTIER_URL')
+        if not url:
+            raise NotConfigured('RedisScheduler needs REDIS_FRONTIER_URL')
+        dupefilter = build_from_crawler(load_object(crawler.settings['DUPEFILTER_CLASS']), crawler)
+        return cls(crawler, connect(url), dupefilter,
+                   idle_timeout=crawler.settings.getfloat('REDIS_FRONTIER_IDLE_TIMEOUT', 30.0))
+
+    def open(self, spider):
+        self.spider = spider
+        self.key = frontier_key(self.crawler, spider)
+        self.queue_key = self.key + ':queue'
+        self.workers_key = self.key + ':workers'
+        self.heartbeat()
+        spider.logger.info(
+            f"Shared frontier {self.key}: {self.server.zcard(self.queue_key)} pending requests, "
+            f"{len(self.other_workers())} other workers"
+        )
+        return self.df.open()
+
+    def heartbeat(self):
+        self.server.hset(self.workers_key, self.worker, repr(time.time()))
+
+    def other_workers(self, within=None):
+        """Other workers on this crawl, optionally only those active within the last seconds"""
+        now = time.time()
+        workers = []
+        for worker, seen in self.server.hgetall(self.workers_key).items():
+            worker = worker.decode('utf-8')
+            if worker != self.worker and (within is None or now - float(seen) <= within):
+                workers.append(worker)
+        return workers
+
+    def close(self, reason):
+        self.server.hdel(self.workers_key, self.worker)
+        # The last worker out of a finished crawl clears it for the next one
+        if reason == 'finished' and not self.other_workers(within=self.idle_timeout):
+            self.server.delete(self.queue_key, self.key + ':seq', self.workers_key)
+            if hasattr(self.df, 'clear'):
+                self.df.clear()
+        return self.df.close(reason)
+
+    def enqueue_request(self, request):
+        # Every worker yields the same start requests; only the first is kept
+        filtered = not request.dont_filter or request.meta.get('is_start_request')
+        if filtered and self.df.request_seen(request):
+            self.df.log(request, self.spider)
+            return False
+        try:
+            data = encode_request(request, self.spider)
+        except (ValueError, TypeError, AttributeError):
+            data = None
+        if data is None:
+            heapq.heappush(self.local, (-request.priority, next(self._local_order), request))
+            self.stats.inc_value('scheduler/enqueued/memory')
+        else:
+            # A sequence number ahead of the data keeps equal priorities first in, first out
+            sequence = self.server.incr(self.key + ':seq')
+            self.server.zadd(self.queue_key, {sequence.to_bytes(8, 'big') + data: -request.priority})
+            self.stats.inc_value('scheduler/enqueued/redis')
+        self.heartbeat()
+        self.stats.inc_value('scheduler/enqueued')
+        return True
+
+    def next_request(self):
+        request = None
+        if self.local:
+            request = heapq.heappop(self.local)[2]
+            self.stats.inc_value('scheduler/dequeued/memory')
+        else:
+            popped = self.server.zpopmin(self.queue_key, 1)
+            if popped:
+                try:
+                    request = decode_request(popped[0][0][8:], self.spider)
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    self.spider.logger.warning(f"Dropping a malformed request from the shared frontier: {e}")
+                    self.stats.inc_value('scheduler/dequeued/redis/malformed')
+                    return None
+                self.stats.inc_value('scheduler/dequeued/redis')
+        if request is not None:
+            self.heartbeat()
+            self.stats.inc_value('scheduler/dequeued')
+        return request
+
+    def has_pending_requests(self):
+        if self.local or self.server.zcard(self.queue_key):
+            return True
+        # Others may still add to the frontier; wait for them while they are active
+        return bool(self.other_workers(within=self.idle_timeout))
+
+    def __len__(self):
+        return len(self.local) + self.server.zcard(self.queue_key)
+
+
+class RedisPolitenessMiddleware:
+    """Downloader middleware holding each request until its domain's shared token is free
+
+    The token is a Redis key that expires after the domain's delay: the
+    downloader slot's current delay (which the adaptive throttle adjusts),
+    or REDIS_FRONTIER_DELAY (by default DOWNLOAD_DELAY) for a new domain.
+    Only active with RedisScheduler.
+    """
+
+    def __init__(self, crawler, server, delay):
+        from twisted.internet import reactor
+        self.reactor = reactor
+        self.crawler = crawler
+        self.server = server
+        self.delay = delay
+        self.worker = worker_id()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        url = crawler.settings.get('REDIS_FRONTIER_URL')
+        scheduler = crawler.settings.get('SCHEDULER')
+        if not url or load_object(scheduler) is not RedisScheduler:
+            raise NotConfigured
+        delay = crawler.settings.getfloat('REDIS_FRONTIER_DELAY', crawler.settings.getfloat('DOWNLOAD_DELAY'))
+        return cls(crawler, connect(url), delay)
+
+    def _delay(self, request):
+        downloader = self.crawler.engine.downloader
+        slot = downloader.slots.get(downloader.get_slot_key(request))
+        return max(self.delay, slot.delay) if slot is not None else self.delay
+
+    async def process_request(self, request, spider):
+        delay = self._delay(request)
+        if delay <= 0:
+            return None
+        key = f"{frontier_key(self.crawler, spider)}:token:{urlparse_cached(request).hostname}"
+        while not self.server.set(key, self.worker, nx=True, px=max(1, int(delay * 1000))):
+            wait = self.server.pttl(key)
+            self.crawler.stats.inc_value('redis_frontier/token_waits')
+            await maybe_deferred_to_future(deferLater(self.reactor, max(wait, 10) / 1000))
+        return None
@@ -0,0 +1,251 @@
+"""
+Offline re-extraction from recorded crawls
+
+Every live crawl is recorded in the HTTP cache (see web_scraper.httpcache).
+A replay runs a spider again with its start() replaced by the recorded
+responses of one crawl: each response goes straight to the callback that
+handled it live, with the same meta and cb_kwargs, and the items the
+callback yields pass through the item pipelines as usual. Requests the
+callbacks yield are dropped, so nothing touches the network and no
+politeness delay applies.
+
+Responses are replayed in the order they were received, the spider gets
+the start time of the recorded crawl and pages are dated by their original
+fetch time, so when neither the HTML nor the spider changed a replay writes
+the same knowledge-base files as the live crawl did. Each recording is
+replayed in its own process, several at a time.
+
+A recovery is the same without the recording: for a crawl that was killed
+before its spider saved its outputs, the spider is run with nothing to
+crawl over the records its checkpoint (see web_scraper.checkpoint) says are
+durable, and writes the knowledge-base files from them.
+"""
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from scrapy import Request
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import data_path, get_project_settings
+
+from web_scraper.httpcache import CacheArchive
+
+
+# Nothing is downloaded and nothing should be recorded or resumed
+REPLAY_SETTINGS = {
+    'HTTPCACHE_ENABLED': False,
+    'RESUMABLE_CRAWLS': False,
+    'ROBOTSTXT_OBEY': False,
+    'DOWNLOAD_DELAY': 0,
+    'TELNETCONSOLE_ENABLED': False
+}
+
+
+def reaches_callback(response, spider):
+    """Whether HttpErrorMiddleware lets a response through to its callback"""
+    if 200 <= response.status < 300 or response.meta.get('handle_httpstatus_all'):
+        return True
+    allowed = response.meta.get('handle_httpstatus_list', getattr(spider, 'handle_httpstatus_list', ()))
+    return response.status in allowed
+
+
+class ReplayMixin:
+    """Spider mixin whose start() feeds a recorded crawl to the spider's callbacks"""
+
+    replaying = True
+    replay_directory = None
+    replay_crawl = None
+
+    async def start(self):
+        # The spider's own start() still runs, for whatever state it sets up
+        async for result in super().start():
+            if not isinstance(result, Request):
+                yield result
+
+        archive = CacheArchive(self.replay_directory)
+        try:
+            for response in archive.responses(self.replay_crawl, self):
+                if not reaches_callback(response, self):
+                    continue
+                self.crawler.stats.inc_value('replay/responses')
+                request = response.request
+                try:
+                    for result in request.callback(response, **request.cb_kwargs) or ():
+                        # Everything a live crawl requested is already recorded
+                        if not isinstance(result, Request):
+                            yield result
+                except Exception:
+                    self.crawler.stats.inc_value('replay/callback_errors')
+                    self.logger.exception(f"Replaying {response.url} failed")
+        finally:
+            archive.close()
+
+
+class RecoveryMixin:
+    """Spider mixin that crawls nothing and saves the records an interrupted crawl stored"""
+
+    replaying = True
+    recovered_stats = {}
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        # WebScraperPipeline keeps the checkpointed records instead of starting over
+        spider.resuming = True
+        return spider
+
+    async def start(self):
+        # The dedup counters feed the index files
+        for key, value in self.recovered_stats.items():
+            self.crawler.stats.set_value(key, value)
+        # The spider's own start() still runs, for whatever state it sets up,
+        # but everything it asks for was crawled already
+        async for result in super().start():
+            pass
+        for result in ():
+            yield result
+
+
+def replayable(crawl):
+    """Whether a recorded crawl reproduces every page it emitted
+
+    A refresh (revisit_budget) emitted most of its pages from the validator
+    store without fetching them; its recording is only complete together
+    with the list of those pages, which refreshes recorded before that list
+    existed, or interrupted ones, lack. Replaying such a recording would
+    rewrite the outputs, and prune the search index, down to the pages it
+    fetched.
+    """
+    args = crawl['spider_args']
+    return not args.get('revisit_budget') or 'revisit_reused' in args
+
+
+def find_recordings(cachedir=None):
+    """Newest replayable crawl of every recorded spider and website in the HTTP cache
+
+    Returns a list of dicts with the spider name, the cache directory and
+    the crawl (as returned by CacheArchive.crawls()).
+    """
+    cachedir = cachedir or data_path(get_project_settings()['HTTPCACHE_DIR'])
+    recordings = []
+    for index in sorted(glob.glob(os.path.join(cachedir, '*', 'index.sqlite')) +
+                        glob.glob(os.path.join(cachedir, '*', '*', 'index.sqlite'))):
+        directory = os.path.dirname(index)
+        spider_name = os.path.relpath(directory, cachedir).split(os.sep)[0]
+        archive = CacheArchive(directory)
+        try:
+            crawls = [crawl for crawl in archive.crawls() if crawl['responses'] and replayable(crawl)]
+        finally:
+            archive.close()
+        if crawls:
+            recordings.append({'spider': spider_name, 'directory': directory, 'crawl': crawls[-1]})
+    return recordings
+
+
+def latest_per_page_store(recordings):
+    """Keep one recording per page store: the most recent crawl that wrote to it
+
+    Some spiders write to the same knowledge-base directory (support_spider
+    and support_api_spider, for one); replaying both at once would have them
+    overwrite each other, and the newest crawl is what the files show.
+    """
+    latest = {}
+    for recording in recordings:
+        key = recording['crawl']['page_store'] or recording['directory']
+        if key not in latest or recording['crawl']['opened_at'] > latest[key]['crawl']['opened_at']:
+            latest[key] = recording
+    kept = list(latest.values())
+    return [recording for recording in recordings if recording in kept]
+
+
+def replay(recording, settings=None):
+    """Replay one recording in this process and return a summary of it
+
+    Runs a Twisted reactor, which cannot be restarted, so call it once per
+    process (replay_all() does).
+    """
+    crawl = recording['crawl']
+    project_settings = get_project_settings()
+    project_settings.setdict(REPLAY_SETTINGS, priority='cmdline')
+    project_settings.setdict(settings or {}, priority='cmdline')
+    process = CrawlerProcess(project_settings)
+    spidercls = process.spider_loader.load(recording['spider'])
+    replaycls = type(spidercls.__name__, (ReplayMixin, spidercls), {
+        'replay_directory': recording['directory'],
+        'replay_crawl': crawl['id']
+    })
+    crawler = process.create_crawler(replaycls)
+    started = time.monotonic()
+    process.crawl(crawler, **crawl['spider_args'])
+    process.start()
+    stats = crawler.stats.get_stats()
+    return {
+        'spider': recording['spider'],
+        'directory': recording['directory'],
+        'crawl': crawl['id'],
+        'responses': stats.get('replay/responses', 0),
+        'items': stats.get('item_scraped_count', 0),
+        'errors': stats.get('replay/callback_errors', 0),
+        'reason': stats.get('finish_reason'),
+        'elapsed': time.monotonic() - started
+    }
+
+
+def recover(checkpoint, settings=None):
+    """Save the outputs of an interrupted crawl from its checkpoint, in this process
+
+    Like replay(), runs a Twisted reactor, so call it once per process.
+    """
+    project_settings = get_project_settings()
+    project_settings.setdict(REPLAY_SETTINGS, priority='cmdline')
+    project_settings.setdict(settings or {}, priority='cmdline')
+    process = CrawlerProcess(project_settings)
+    spidercls = process.spider_loader.load(checkpoint['spider'])
+    recoverycls = type(spidercls.__name__, (RecoveryMixin, spidercls), {
+        'recovered_stats': checkpoint.get('stats', {})
+    })
+    crawler = process.create_crawler(recoverycls)
+    started = time.monotonic()
+    process.crawl(crawler, **checkpoint.get('crawl_args', {}))
+    process.start()
+    stats = crawler.stats.get_stats()
+    return {
+        'spider': checkpoint['spider'],
+        'path': checkpoint['path'],
+        'records': stats.get('checkpoint/records_kept', 0),
+        'dropped': stats.get('checkpoint/records_dropped', 0),
+        'reason': stats.get('finish_reason'),
+        'elapsed': time.monotonic() - started
+    }
+
+
+def _in_processes(function, jobs, workers, settings, failed):
+    """Run function(job, settings) for every job in a pool of processes, yielding results as they finish"""
+    # A fresh process per job: each one runs its own reactor
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        futures = {pool.submit(function, job, settings): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield dict(failed(futures[future]), error=str(e))
+
+
+def replay_all(recordings, workers=None, settings=None):
+    """Replay recordings in a pool of processes, yielding summaries as they finish
+
+    A recording that fails yields a summary with an 'error' instead.
+    """
+    return _in_processes(replay, recordings, workers, settings,
+                         lambda recording: {'spider': recording['spider'], 'directory': recording['directory']})
+
+
+def recover_all(checkpoints, workers=None, settings=None):
+    """Recover interrupted crawls in a pool of processes, yielding summaries as they finish
+
+    A recovery that fails yields a summary with an 'error' instead.
+    """
+    return _in_processes(recover, checkpoints, workers, settings,
+                         lambda checkpoint: {'spider': checkpoint['spider'], 'path': checkpoint['path']})
@@ -0,0 +1,198 @@
+"""
+Adaptive revisits: refresh the pages most likely to have changed
+
+Most pages of a site never change once published, while a few (pricing,
+features, the home page) change all the time. RevisitHistory keeps, for
+every page a crawl has seen, how many times it was visited again, over how
+long, and how many of those visits found it changed: a 200 whose content
+digest differs from the last one. A 304, or a sitemap lastmod older than
+the last crawl, is a visit that found it unchanged.
+
+Modelling each page's changes as a Poisson process, its change rate is
+estimated from those counts with Cho and Garcia-Molina's estimator for
+visits at regular intervals, -log((n - X + 0.5) / (n + 0.5)) / I, where n
+is the number of visits again, X the number that found a change and I the
+mean time between them. A page seen only once gets REVISIT_DEFAULT_RATE;
+none goes below REVISIT_MIN_RATE, so pages that never changed are still
+checked now and then.
+
+A refresh run fetches only its budget of pages: those whose expected
+gain in freshness over the next REVISIT_INTERVAL_DAYS is highest. That gain
+is the probability that the page changed since its last visit times the
+share of the next interval it can be expected to stay fresh once fetched,
+so pages that change faster than they can be refreshed are not worth the
+budget either. The records of every other page are reused from the
+validator store (see web_scraper.validators), so the outputs stay complete.
+The reused URLs are recorded with the crawl, and a replay of the refresh
+reuses them from the validator store again.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import sqlite3
+import time
+
+
+DAY = 86400
+
+
+def content_digest(data):
+    """Digest of a page's extracted content, leaving out when it was scraped"""
+    content = {key: value for key, value in data.items() if key != 'scraped_at'}
+    return hashlib.blake2b(json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8'),
+                           digest_size=16).hexdigest()
+
+
+def change_rate(visits, changes, elapsed, default_rate=1 / 7, min_rate=1 / 90):
+    """Estimated changes per day of a page visited again visits times over elapsed seconds"""
+    if visits == 0 or elapsed <= 0:
+        return default_rate
+    rate = -math.log((visits - changes + 0.5) / (visits + 0.5)) / (elapsed / visits / DAY)
+    return max(rate, min_rate)
+
+
+def freshness_gain(rate, age, interval):
+    """Expected freshness gained over the next interval by fetching a page now
+
+    rate is in changes per day, age and interval in days; a page never
+    visited again has an infinite age.
+    """
+    stale = -math.expm1(-rate * age)
+    spread = rate * interval
+    fresh_after = -math.expm1(-spread) / spread if spread > 0 else 1.0
+    return stale * fresh_after
+
+
+def budget_pages(budget, pages):
+    """Pages a refresh of a site with pages known pages may fetch: a count, or a share like '10%'"""
+    budget = str(budget).strip()
+    if budget.endswith('%'):
+        return math.ceil(pages * float(budget[:-1]) / 100)
+    return int(budget)
+
+
+class RevisitHistory:
+    """SQLite table of per-URL visit and change counts
+
+    Without a path nothing is recorded and nothing is planned: spiders
+    hold one of those until from_crawler() opens the real one (see
+    open_revisit_history()).
+    """
+
+    # Commit after this many writes rather than after every page
+    COMMIT_EVERY = 100
+
+    def __init__(self, path=None, default_rate=1 / 7, min_rate=1 / 90, interval=1.0):
+        self.path = path
+        self.default_rate = default_rate
+        self.min_rate = min_rate
+        self.interval = interval
+        # Pages visited since this are visited again by the current crawl
+        self.started = time.time()
+        self._pending = 0
+        if path is None:
+            self.conn = None
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS revisits ('
+            ' url TEXT PRIMARY KEY,'
+            ' digest TEXT,'
+            ' first_seen REAL NOT NULL,'
+            ' last_visit REAL NOT NULL,'
+            ' last_change REAL NOT NULL,'
+            ' visits INTEGER NOT NULL,'
+            ' changes INTEGER NOT NULL,'
+            ' elapsed REAL NOT NULL)'
+        )
+
+    def observe(self, url, digest=None, now=None):
+        """Record a visit to a page with the digest of its content, or None if it is known unchanged
+
+        Returns True if the visit found the page changed.
+        """
+        if self.conn is None:
+            return False
+        now = time.time() if now is None else now
+        row = self.conn.execute('SELECT digest, last_visit FROM revisits WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            self.conn.execute(
+                'INSERT INTO revisits (url, digest, first_seen, last_visit, last_change, visits, changes, elapsed)'
+                ' VALUES (?, ?, ?, ?, ?, 0, 0, 0)',
+                (url, digest, now, now, now)
+            )
+            changed = False
+        elif row[1] >= self.started:
+            # Seen twice in one crawl (a link and a sitemap entry, say)
+            return False
+        else:
+            # Pages stored before their digest was known have nothing to compare to
+            changed = digest is not None and row[0] is not None and digest != row[0]
+            self.conn.execute(
+                'UPDATE revisits SET digest = COALESCE(?, digest), last_visit = ?,'
+                ' last_change = CASE WHEN ? THEN ? ELSE last_change END,'
+                ' visits = visits + 1, changes = changes + ?, elapsed = elapsed + ? WHERE url = ?',
+                (digest, now, changed, now, int(changed), now - row[1], url)
+            )
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+        return changed
+
+    def rates(self):
+        """{url: (estimated changes per day, last visit)} of every page in the history"""
+        if self.conn is None:
+            return {}
+        return {
+            url: (change_rate(visits, changes, elapsed, self.default_rate, self.min_rate), last_visit)
+            for url, visits, changes, elapsed, last_visit in self.conn.execute(
+                'SELECT url, visits, changes, elapsed, last_visit FROM revisits')
+        }
+
+    def plan(self, urls, budget, always=(), now=None):
+        """The URLs a refresh should fetch, at most budget of them, best first
+
+        The URLs in always (the start pages) are fetched whatever their
+        gain; URLs without history have never been checked for changes, so
+        they count as long unchecked and come early in the plan.
+        """
+        now = time.time() if now is None else now
+        rates = self.rates()
+        gains = []
+        for url in urls:
+            if url in always:
+                continue
+            rate, last_visit = rates.get(url, (self.default_rate, None))
+            age = (now - last_visit) / DAY if last_visit is not None else math.inf
+            gains.append((freshness_gain(rate, age, self.interval), url))
+        always = list(always)[:budget]
+        return always + [url for _, url in heapq.nlargest(budget - len(always), gains)]
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+
+def open_revisit_history(crawler, spider, directory):
+    """The RevisitHistory of a site, kept in directory/revisits.sqlite
+
+    Returns one that records nothing when the spider is replaying a
+    recorded crawl, whose live run already observed its pages.
+    """
+    if getattr(spider, 'replaying', False):
+        return RevisitHistory()
+    settings = crawler.settings
+    return RevisitHistory(
+        os.path.join(directory, 'revisits.sqlite'),
+        default_rate=settings.getfloat('REVISIT_DEFAULT_RATE', 1 / 7),
+        min_rate=settings.getfloat('REVISIT_MIN_RATE', 1 / 90),
+        interval=settings.getfloat('REVISIT_INTERVAL_DAYS', 1.0)
+    )
@@ -0,0 +1,196 @@
+"""
+Full-text search over the scraped knowledge-base
+
+SearchIndexPipeline keeps a SQLite FTS5 index, knowledge-base/search.sqlite,
+up to date as pages are scraped: one document per page (its title and
+text) and one per category snippet (the text a page files under a
+category, as in the category .txt files). Each document is keyed by site,
+URL and section ('page' or the category name) and carries a digest of its
+text, so a recrawl only rewrites the documents whose text changed. When a
+complete crawl finishes, the documents of its site it did not see are
+removed.
+
+Results are ranked by BM25, with title matches weighted above body
+matches:
+
+    from web_scraper.search import search
+    for hit in search('candidate import', site='brightmove/support'):
+        print(hit['score'], hit['url'], hit['snippet'])
+
+search_knowledge_base.py is the command-line front end.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+
+from web_scraper.checkpoint import KNOWLEDGE_BASE_DIRS
+
+
+SEARCH_INDEX_FILE = 'search.sqlite'
+
+# Page fields whose text is searchable; links and navigation are left out
+BODY_FIELDS = (
+    'description',
+    'headlines',
+    'paragraphs',
+    'lists',
+    'code_blocks',
+    'hero_content',
+    'features',
+    'cta_text'
+)
+
+# BM25 weights of the title and body columns
+TITLE_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def field_texts(data, fields):
+    """The texts of some fields of a record's data, in field order"""
+    texts = []
+    for field in fields:
+        value = data.get(field)
+        if isinstance(value, str):
+            texts.append(value)
+        elif value:
+            texts.extend(text for text in value if isinstance(text, str))
+    return texts
+
+
+def match_expression(query):
+    """FTS5 query matching documents that contain every word of a plain-text query"""
+    return ' '.join(f'"{term}"' for term in TERM_RE.findall(query))
+
+
+class SearchIndex:
+    """SQLite FTS5 index of pages and category snippets"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Several crawls (or replays) may update the same index at once
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS documents ('
+            ' id INTEGER PRIMARY KEY,'
+            ' site TEXT NOT NULL,'
+            ' url TEXT NOT NULL,'
+            ' section TEXT NOT NULL,'
+            ' title TEXT,'
+            ' digest BLOB NOT NULL,'
+            ' crawl TEXT,'
+            ' UNIQUE (site, url, section))'
+        )
+        self.conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS fts USING fts5(title, body, tokenize='porter unicode61')"
+        )
+        self.conn.commit()
+
+    def update(self, documents, crawl=None):
+        """Add or replace documents in one transaction
+
+        documents are (site, url, section, title, body) tuples. A document
+        whose title and body are unchanged is not rewritten, only marked as
+        seen by crawl. Returns the number of documents added or changed.
+        """
+        changed = 0
+        with self.conn:
+            for site, url, section, title, body in documents:
+                digest = hashlib.blake2b(f"{title}\0{body}".encode('utf-8'), digest_size=16).digest()
+                row = self.conn.execute(
+                    'SELECT id, digest FROM documents WHERE site = ? AND url = ? AND section = ?',
+                    (site, url, section)
+                ).fetchone()
+                if row is not None and row[1] == digest:
+                    self.conn.execute('UPDATE documents SET crawl = ? WHERE id = ?', (crawl, row[0]))
+                    continue
+                if row is None:
+                    doc_id = self.conn.execute(
+                        'INSERT INTO documents (site, url, section, title, digest, crawl) VALUES (?, ?, ?, ?, ?, ?)',
+                        (site, url, section, title, digest, crawl)
+                    ).lastrowid
+                else:
+                    doc_id = row[0]
+                    self.conn.execute(
+                        'UPDATE documents SET title = ?, digest = ?, crawl = ? WHERE id = ?',
+                        (title, digest, crawl, doc_id)
+                    )
+                    self.conn.execute('DELETE FROM fts WHERE rowid = ?', (doc_id,))
+                self.conn.execute('INSERT INTO fts (rowid, title, body) VALUES (?, ?, ?)', (doc_id, title, body))
+                changed += 1
+        return changed
+
+    def prune(self, site, crawl):
+        """Remove the documents of a site that crawl did not see; returns how many"""
+        with self.conn:
+            self.conn.execute(
+                'DELETE FROM fts WHERE rowid IN (SELECT id FROM documents WHERE site = ? AND crawl IS NOT ?)',
+                (site, crawl)
+            )
+            return self.conn.execute(
+                'DELETE FROM documents WHERE site = ? AND crawl IS NOT ?', (site, crawl)
+            ).rowcount
+
+    def search(self, query, site=None, section=None, limit=10, raw=False):
+        """Best matches for a query, best first
+
+        query is plain text, every word of which must occur, or with
+        raw=True an FTS5 query expression (phrases, OR, NEAR, prefix*).
+        Returns dicts with site, url, section, title, snippet and score
+        (BM25, lower is better).
+        """
+        expression = query if raw else match_expression(query)
+        if not expression:
+            return []
+        sql = (
+            "SELECT d.site, d.url, d.section, d.title, snippet(fts, 1, '[', ']', '…', 16), bm25(fts, ?, ?) AS score"
+            " FROM fts JOIN documents d ON d.id = fts.rowid WHERE fts MATCH ?"
+        )
+        params = [TITLE_WEIGHT, BODY_WEIGHT, expression]
+        if site is not None:
+            sql += ' AND d.site = ?'
+            params.append(site)
+        if section is not None:
+            sql += ' AND d.section = ?'
+            params.append(section)
+        sql += ' ORDER BY score LIMIT ?'
+        params.append(limit)
+        return [
+            {'site': row[0], 'url': row[1], 'section': row[2], 'title': row[3], 'snippet': row[4], 'score': row[5]}
+            for row in self.conn.execute(sql, params)
+        ]
+
+    def sites(self):
+        """Number of pages and category snippets indexed for each site"""
+        rows = self.conn.execute(
+            "SELECT site, SUM(section = 'page'), SUM(section != 'page') FROM documents GROUP BY site ORDER BY site"
+        )
+        return {site: {'pages': pages, 'snippets': snippets} for site, pages, snippets in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+def index_paths(directories=KNOWLEDGE_BASE_DIRS):
+    """The search indexes that exist under the knowledge-base directories"""
+    paths = (os.path.join(directory, SEARCH_INDEX_FILE) for directory in directories)
+    return [path for path in paths if os.path.exists(path)]
+
+
+def search(query, paths=None, site=None, section=None, limit=10, raw=False):
+    """Search one or more indexes (by default every knowledge-base's) and merge the results"""
+    hits = []
+    for path in index_paths() if paths is None else paths:
+        index = SearchIndex(path)
+        try:
+            hits.extend(index.search(query, site=site, section=section, limit=limit, raw=raw))
+        finally:
+            index.close()
+    hits.sort(key=lambda hit: hit['score'])
+    return hits[:limit]
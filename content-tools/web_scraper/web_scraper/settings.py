@@ -23,8 +23,37 @@ ROBOTSTXT_OBEY = True
 
 # Concurrency and throttling settings
 #CONCURRENT_REQUESTS = 16
+# Every domain starts at these and WebScraperDownloaderMiddleware adapts them
+# to the domain's latency, errors and Retry-After, within the floors and
+# ceilings below (per domain in ADAPTIVE_THROTTLE_DOMAINS, e.g.
+# {"partner.example.com": {"max_concurrency": 2, "min_delay": 2.0}})
 CONCURRENT_REQUESTS_PER_DOMAIN = 1
 DOWNLOAD_DELAY = 1
+ADAPTIVE_THROTTLE_ENABLED = True
+ADAPTIVE_THROTTLE_MIN_CONCURRENCY = 1
+ADAPTIVE_THROTTLE_MAX_CONCURRENCY = 8
+ADAPTIVE_THROTTLE_MIN_DELAY = 0.25
+ADAPTIVE_THROTTLE_MAX_DELAY = 60
+# Average response time (seconds) above which a domain is slowed down
+ADAPTIVE_THROTTLE_TARGET_LATENCY = 2.0
+ADAPTIVE_THROTTLE_DOMAINS = {}
+
+# Keep each spider's frontier and seen-URL Bloom filters on disk under
+# raw_data/crawl_state so an interrupted crawl resumes where it stopped
+RESUMABLE_CRAWLS = True
+DUPEFILTER_CLASS = "web_scraper.frontier.BloomDupeFilter"
+BLOOM_FILTER_CAPACITY = 1000000
+BLOOM_FILTER_ERROR_RATE = 0.001
+
+# Shared frontier for several workers crawling the same sites, in Redis (see
+# web_scraper.redis_frontier); "memory://<name>" is an in-process stand-in.
+# multi_site_scraper.py switches to it when REDIS_FRONTIER_URL is set in the
+# environment
+#SCHEDULER = "web_scraper.redis_frontier.RedisScheduler"
+#DUPEFILTER_CLASS = "web_scraper.redis_frontier.RedisDupeFilter"
+#REDIS_FRONTIER_URL = "redis://localhost:6379/0"
+# A worker with nothing left to crawl waits this long for the others' new links
+REDIS_FRONTIER_IDLE_TIMEOUT = 30
 
 # Disable cookies (enabled by default)
 #COOKIES_ENABLED = False
@@ -40,27 +69,116 @@ DOWNLOAD_DELAY = 1
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "web_scraper.middlewares.WebScraperSpiderMiddleware": 543,
-#}
+# CallbackTimingMiddleware sits closest to the spider, so it times only the
+# callbacks' own work
+# CrawlPriorityMiddleware comes after DepthMiddleware (900), which sets the
+# depth it prioritizes by
+SPIDER_MIDDLEWARES = {
+    "web_scraper.middlewares.WebScraperSpiderMiddleware": 543,
+    "web_scraper.crawl_budget.CrawlPriorityMiddleware": 850,
+    "web_scraper.metrics.CallbackTimingMiddleware": 950,
+}
+
+# Sampling profiler of the spider callbacks and of CALLBACK_PROFILE_METHODS
+# (opt-in: scrapy crawl ... -s CALLBACK_PROFILE_ENABLED=1). Collapsed stacks
+# for flamegraph.pl or speedscope are written to CALLBACK_PROFILE_DIR
+CALLBACK_PROFILE_ENABLED = False
+CALLBACK_PROFILE_INTERVAL = 0.005
+CALLBACK_PROFILE_DIR = "profiles"
+CALLBACK_PROFILE_METHODS = ["save_organized_content"]
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "web_scraper.middlewares.WebScraperDownloaderMiddleware": 543,
-#}
+# The adaptive throttle sits after RetryMiddleware (550) in response order,
+# so it sees the 5xx and 429 responses that get retried. CrawlBudgetMiddleware
+# comes first, so requests over budget are dropped before anything else
+DOWNLOADER_MIDDLEWARES = {
+    "web_scraper.crawl_budget.CrawlBudgetMiddleware": 50,
+    "web_scraper.middlewares.WebScraperDownloaderMiddleware": 560,
+    "web_scraper.redis_frontier.RedisPolitenessMiddleware": 590,
+}
+
+# Per-site crawl budgets (0 = no limit); CRAWL_BUDGETS overrides them for a
+# site, keyed by its content directory, e.g. {"brightmove/support": {"pages":
+# 5000, "soft_pages": 4000, "bytes": 500000000, "seconds": 3600}}. Past a soft
+# budget only pages of the CRAWL_BUDGET_SOFT_KEEP types are fetched, past a
+# hard one none are; the spider then drains its queue and writes its outputs.
+# Spiders rank their requests by page type and depth with their
+# priority_profile in crawl_priorities.json
+CRAWL_BUDGET_PAGES = 0
+CRAWL_BUDGET_BYTES = 0
+CRAWL_BUDGET_SECONDS = 0
+CRAWL_BUDGET_SOFT_PAGES = 0
+CRAWL_BUDGET_SOFT_BYTES = 0
+CRAWL_BUDGET_SOFT_SECONDS = 0
+CRAWL_BUDGET_SOFT_KEEP = ["article"]
+CRAWL_BUDGETS = {}
+
+# Every crawl saves the links between its pages, ranked with PageRank, to
+# raw_data/link_graph.npz (needs numpy). The next crawl adds up to
+# LINK_GRAPH_RANK_PRIORITY to the priority of the highest-ranked pages;
+# link_report.py lists a site's top pages and orphans
+LINK_GRAPH_ENABLED = True
+LINK_GRAPH_RANK_PRIORITY = 100
+LINK_GRAPH_DAMPING = 0.85
+
+# universal_spider records how often each page changes in raw_data/
+# revisits.sqlite; a refresh ("-a revisit_budget=10%", or a page count)
+# fetches only the pages most likely to have changed since they were last
+# fetched and reuses the rest (see web_scraper.revisit). Rates are in changes
+# per day: REVISIT_DEFAULT_RATE for pages seen once, at least REVISIT_MIN_RATE
+# for pages never seen to change; refreshes run every REVISIT_INTERVAL_DAYS
+REVISIT_DEFAULT_RATE = 1 / 7
+REVISIT_MIN_RATE = 1 / 90
+REVISIT_INTERVAL_DAYS = 1
+
+# scrape_daemon.py keeps Scrapy loaded and runs the crawls it is sent as
+# jobs (see web_scraper.daemon); at most this many run at once
+SCRAPE_DAEMON_MAX_JOBS = 4
+# The only settings a submitted job may override (fnmatch patterns)
+SCRAPE_DAEMON_JOB_SETTINGS = ['CRAWL_BUDGET_*', 'CLOSESPIDER_*']
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    "web_scraper.metrics.CrawlMetrics": 500,
+}
+
+# Download latency, slot wait, response size, callback CPU time and item rate
+# of every crawl, written as crawl_metrics_<spider>.prom (Prometheus textfile
+# format) and crawl_metrics_<spider>.json next to scraping_results.json, or
+# to CRAWL_METRICS_DIR if set
+CRAWL_METRICS_ENABLED = True
+#CRAWL_METRICS_DIR = "/var/lib/node_exporter/textfile_collector"
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "web_scraper.pipelines.WebScraperPipeline": 300,
-#}
+# WebScraperPipeline streams every page to raw_data/pages.jsonl; the spiders
+# build their knowledge-base outputs from that file when they close.
+# DeduplicationPipeline runs first and drops boilerplate and near-duplicates;
+# SearchIndexPipeline keeps knowledge-base/search.sqlite up to date
+ITEM_PIPELINES = {
+    "web_scraper.pipelines.DeduplicationPipeline": 200,
+    "web_scraper.pipelines.WebScraperPipeline": 300,
+    "web_scraper.pipelines.SearchIndexPipeline": 400,
+}
+
+# A text block seen on this many pages of a site is boilerplate and is
+# dropped from later pages
+DEDUP_BOILERPLATE_MIN_PAGES = 3
+# Pages whose SimHash differs in at most this many of 64 bits are near-duplicates
+DEDUP_SIMHASH_DISTANCE = 3
+
+# WebScraperPipeline syncs pages.jsonl and writes raw_data/checkpoint.json
+# every this many seconds or stored records, so a killed crawl loses at most
+# that much; recover_scraper.py saves a killed crawl's outputs from it
+CHECKPOINT_INTERVAL = 30
+CHECKPOINT_ITEMS = 1000
+
+# Full-text index of pages and category snippets, searched with
+# search_knowledge_base.py; written this many documents at a time
+SEARCH_INDEX_ENABLED = True
+SEARCH_INDEX_BATCH = 100
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -75,13 +193,23 @@ DOWNLOAD_DELAY = 1
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
-# Enable and configure HTTP caching (disabled by default)
+# Enable and configure HTTP caching
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
 #HTTPCACHE_EXPIRATION_SECS = 0
 #HTTPCACHE_DIR = "httpcache"
 #HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+# Every live crawl is recorded (always fetched, never served from the cache)
+# so replay_scraper.py can re-run the spider callbacks offline. Bodies are
+# zstd-compressed and deduplicated in packed segment files with a SQLite index
+HTTPCACHE_ENABLED = True
+HTTPCACHE_POLICY = "web_scraper.httpcache.RecordingPolicy"
+# To serve repeated development crawls from the cache instead, fetching
+# only pages never cached (--from-cache of run_scraper.py and
+# multi_site_scraper.py crawl for a single run):
+#HTTPCACHE_POLICY = "scrapy.extensions.httpcache.DummyPolicy"
+HTTPCACHE_STORAGE = "web_scraper.httpcache.PackedCacheStorage"
+HTTPCACHE_SEGMENT_SIZE = 64 * 1024 * 1024
+HTTPCACHE_ZSTD_LEVEL = 3
 
 # Set settings whose default value is deprecated to a future-proof value
 FEED_EXPORT_ENCODING = "utf-8"
@@ -0,0 +1,279 @@
+"""
+Random-access sidecar of complete_scrape.json
+
+complete_scrape.json is one indented JSON document: to count its pages or
+read one of them a tool has to parse all of it. Next to it the spiders
+write, in the same pass over the page store:
+
+- complete_scrape.jsonl: one line per value of the JSON document, in the
+  same order, as {"section": "pages", "value": {...}} (a list section gives
+  one line per element, any other section a single line);
+- complete_scrape.idx: a binary index of that file. It starts with the
+  magic bytes, a 4-byte length and a JSON header holding every section's
+  count and first line; then the byte offset of every line as 8-byte
+  little-endian integers; then the 'texts' section's references, sorted,
+  each as 8 bytes of reference and the 8-byte number of its line.
+
+Reading the header gives every count without touching the records;
+element i of a section is one seek into the offsets and one into the
+JSONL file, and a text reference resolves with a binary search.
+
+Writing keeps neither the offsets nor the text references in memory: the
+offsets go to a temporary file as the lines are written, and the
+references are sorted in chunks of TEXT_CHUNK, each saved to a temporary
+file and merged into the index at the end.
+
+    sidecar = open_sidecar('raw_data/complete_scrape.json')
+    if sidecar is not None:
+        print(sidecar.counts['pages'])
+        page = sidecar.get('pages', 41, resolve=True)
+"""
+
+import heapq
+import json
+import os
+import shutil
+import struct
+import tempfile
+from contextlib import ExitStack
+
+from web_scraper.checkpoint import atomic_write
+
+
+MAGIC = b'WSIDX\x00\x00\x01'
+OFFSET = struct.Struct('<Q')
+TEXT_ENTRY = struct.Struct('<8sQ')
+
+# Text references sorted in memory at a time (16 bytes each)
+TEXT_CHUNK = 65536
+
+
+def sidecar_paths(json_path):
+    """The JSONL file and index of a complete_scrape.json"""
+    base = os.path.splitext(json_path)[0]
+    return base + '.jsonl', base + '.idx'
+
+
+class SidecarWriter:
+    """Writes the sidecar of a JSON document as dump_json_stream() writes the document
+
+    Both files are written atomically when the block ends; dump_json_stream()
+    reports each value and element, and the size of the JSON file.
+    """
+
+    def __init__(self, json_path, text_chunk=TEXT_CHUNK):
+        self.json_path = json_path
+        self.jsonl_path, self.index_path = sidecar_paths(json_path)
+        self.text_chunk = text_chunk
+        self.sections = []
+        self.records = 0
+        self.text_count = 0
+        self.source_bytes = None
+        self._position = 0
+        # The current chunk of text entries, and the sorted chunks saved so far
+        self._texts = []
+        self._runs = []
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        self._file = self._stack.enter_context(atomic_write(self.jsonl_path, 'wb'))
+        self._offsets = self._temporary()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # atomic_write drops the JSONL when it sees the exception
+            return self._stack.__exit__(exc_type, exc, tb)
+        with self._stack:
+            self._write_index()
+        return False
+
+    def _temporary(self):
+        # Next to the index, closed (and so deleted) when the block ends
+        return self._stack.enter_context(tempfile.TemporaryFile(dir=os.path.dirname(self.index_path) or '.'))
+
+    def _line(self, section, value):
+        line = (json.dumps({'section': section, 'value': value}, ensure_ascii=False) + '\n').encode('utf-8')
+        self._offsets.write(OFFSET.pack(self._position))
+        self.records += 1
+        self._file.write(line)
+        self._position += len(line)
+
+    def value(self, section, value):
+        """Record a section that is not a list of records"""
+        self.sections.append({'name': section, 'list': isinstance(value, list), 'first': self.records,
+                              'count': len(value) if isinstance(value, (list, dict)) else 1})
+        if isinstance(value, list):
+            for element in value:
+                self._line(section, element)
+        else:
+            self._line(section, value)
+
+    def start_list(self, section):
+        self.sections.append({'name': section, 'list': True, 'first': self.records, 'count': 0})
+
+    def element(self, element):
+        """Record the next element of the list section started last"""
+        if self.sections[-1]['name'] == 'texts' and isinstance(element, dict):
+            self._texts.append(TEXT_ENTRY.pack(bytes.fromhex(element['id']), self.records))
+            self.text_count += 1
+            if len(self._texts) >= self.text_chunk:
+                self._save_texts()
+        self.sections[-1]['count'] += 1
+        self._line(self.sections[-1]['name'], element)
+
+    def _save_texts(self):
+        """Sort the current chunk of text entries into a temporary file"""
+        self._texts.sort()
+        run = self._temporary()
+        run.writelines(self._texts)
+        run.seek(0)
+        self._runs.append(run)
+        self._texts = []
+
+    def _sorted_texts(self):
+        if not self._runs:
+            self._texts.sort()
+            return self._texts
+        if self._texts:
+            self._save_texts()
+        return heapq.merge(*(self._entries(run) for run in self._runs))
+
+    def _entries(self, run):
+        while True:
+            block = run.read(TEXT_ENTRY.size * 4096)
+            if not block:
+                return
+            for i in range(0, len(block), TEXT_ENTRY.size):
+                yield block[i:i + TEXT_ENTRY.size]
+
+    def _write_index(self):
+        header = json.dumps({
+            'source': os.path.basename(self.json_path),
+            'source_bytes': self.source_bytes,
+            'records': self.records,
+            'texts': self.text_count,
+            'sections': self.sections
+        }, ensure_ascii=False).encode('utf-8')
+        with atomic_write(self.index_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            self._offsets.seek(0)
+            shutil.copyfileobj(self._offsets, f)
+            f.writelines(self._sorted_texts())
+
+
+class Sidecar:
+    """Reader of a complete_scrape sidecar; counts come from the header alone"""
+
+    def __init__(self, json_path):
+        self.jsonl_path, self.index_path = sidecar_paths(json_path)
+        self._index = open(self.index_path, 'rb')
+        if self._index.read(len(MAGIC)) != MAGIC:
+            self._index.close()
+            raise ValueError(f"{self.index_path} is not a complete_scrape index")
+        length, = struct.unpack('<I', self._index.read(4))
+        self.header = json.loads(self._index.read(length))
+        self._offsets_at = len(MAGIC) + 4 + length
+        self._texts_at = self._offsets_at + self.header['records'] * OFFSET.size
+        self.sections = {section['name']: section for section in self.header['sections']}
+        self.counts = {name: section['count'] for name, section in self.sections.items()}
+        self._jsonl = open(self.jsonl_path, 'rb')
+
+    def _record(self, number):
+        self._index.seek(self._offsets_at + number * OFFSET.size)
+        offset, = OFFSET.unpack(self._index.read(OFFSET.size))
+        self._jsonl.seek(offset)
+        return json.loads(self._jsonl.readline())['value']
+
+    def value(self, section):
+        """A whole section: the value of a non-list section, or every element of a list"""
+        info = self.sections[section]
+        if info['list']:
+            return list(self.iter(section))
+        return self._record(info['first'])
+
+    def iter(self, section):
+        """Stream the elements of a list section"""
+        info = self.sections[section]
+        self._index.seek(self._offsets_at + info['first'] * OFFSET.size)
+        if not info['count']:
+            return
+        offset, = OFFSET.unpack(self._index.read(OFFSET.size))
+        with open(self.jsonl_path, 'rb') as f:
+            f.seek(offset)
+            for _ in range(info['count']):
+                yield json.loads(f.readline())['value']
+
+    def get(self, section, i, resolve=False):
+        """Element i of a list section
+
+        With resolve=True the text references in it (a page's text lists, or
+        the element itself in a category section) are replaced by their text.
+        """
+        info = self.sections[section]
+        if not 0 <= i < info['count']:
+            raise IndexError(f"{section}[{i}] out of range ({info['count']} elements)")
+        element = self._record(info['first'] + i)
+        if resolve and section != 'texts':
+            if isinstance(element, dict):
+                return self._resolve(element)
+            if isinstance(element, str):
+                return self.text(element)
+        return element
+
+    def _resolve(self, data):
+        # The lists of strings PageStore interned (see PageStore._intern)
+        resolved = {}
+        for key, value in data.items():
+            if isinstance(value, dict):
+                value = self._resolve(value)
+            elif isinstance(value, list) and all(isinstance(ref, str) for ref in value):
+                value = [self.text(ref) for ref in value]
+            resolved[key] = value
+        return resolved
+
+    def text(self, ref):
+        """The text of a reference, found by binary search in the index; the reference itself if unknown"""
+        try:
+            key = bytes.fromhex(ref)
+        except (TypeError, ValueError):
+            return ref
+        low, high = 0, self.header['texts']
+        while low < high:
+            middle = (low + high) // 2
+            self._index.seek(self._texts_at + middle * TEXT_ENTRY.size)
+            entry, number = TEXT_ENTRY.unpack(self._index.read(TEXT_ENTRY.size))
+            if entry < key:
+                low = middle + 1
+            elif entry > key:
+                high = middle
+            else:
+                return self._record(number)['text']
+        return ref
+
+    def close(self):
+        self._index.close()
+        self._jsonl.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_sidecar(json_path):
+    """The Sidecar of a complete_scrape.json, or None if it is missing or older than the JSON"""
+    _, index_path = sidecar_paths(json_path)
+    if not os.path.exists(index_path):
+        return None
+    try:
+        sidecar = Sidecar(json_path)
+    except (OSError, ValueError):
+        return None
+    if sidecar.header.get('source_bytes') != os.path.getsize(json_path):
+        sidecar.close()
+        return None
+    return sidecar
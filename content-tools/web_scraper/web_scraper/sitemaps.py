@@ -0,0 +1,98 @@
+"""
+Sitemap discovery: robots.txt Sitemap lines, sitemap indexes and url sets
+
+Sitemaps are parsed incrementally with lxml's iterparse, clearing every
+<url> or <sitemap> entry once it has been read, so a 50,000-URL sitemap
+never becomes a full element tree in memory. Gzipped sitemaps (.xml.gz)
+are decompressed within the download size limit.
+"""
+
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from urllib.parse import urljoin
+
+from lxml import etree
+from scrapy.http import XmlResponse
+from scrapy.utils.gz import gunzip
+from scrapy.utils.sitemap import sitemap_urls_from_robots
+
+
+# Entries of a sitemap index and of a url set
+ENTRY_TAGS = ('sitemap', 'url')
+
+
+def robots_sitemaps(response):
+    """Sitemap URLs listed in a robots.txt response, or the conventional /sitemap.xml"""
+    urls = list(sitemap_urls_from_robots(response.body, base_url=response.url)) if response.status == 200 else []
+    return urls or [urljoin(response.url, '/sitemap.xml')]
+
+
+def sitemap_body(response, max_size=0):
+    """The XML of a sitemap response, gunzipped if needed, or None if it is not one"""
+    if isinstance(response, XmlResponse):
+        return response.body
+    if response.body[:2] == b'\x1f\x8b':
+        try:
+            return gunzip(response.body, max_size=max_size)
+        except (OSError, ValueError):
+            return None
+    if response.url.split('?')[0].endswith(('.xml', '.xml.gz')):
+        return response.body
+    return None
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else None
+
+
+def iter_sitemap(body):
+    """Yield (kind, loc, lastmod) for each entry of a sitemap index or url set
+
+    kind is 'sitemap' for an entry of a sitemap index and 'url' for a page;
+    lastmod is the raw text of its <lastmod>, or None. Extension elements
+    (image:loc, news:...) are ignored.
+    """
+    parser = etree.iterparse(BytesIO(body), events=('end',), recover=True,
+                             resolve_entities=False, no_network=True, huge_tree=True)
+    loc = lastmod = None
+    try:
+        for _, element in parser:
+            name = _local_name(element.tag)
+            if name in ('loc', 'lastmod'):
+                parent = element.getparent()
+                if parent is None or _local_name(parent.tag) not in ENTRY_TAGS:
+                    continue
+                text = (element.text or '').strip() or None
+                if name == 'loc':
+                    loc = text
+                else:
+                    lastmod = text
+            elif name in ENTRY_TAGS:
+                if loc:
+                    yield name, loc, lastmod
+                loc = lastmod = None
+                # Drop the entry and its finished siblings from the partial tree
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+    except etree.XMLSyntaxError:
+        # Whatever was read before the damage has been yielded
+        return
+
+
+def lastmod_timestamp(value):
+    """POSIX timestamp of a W3C datetime <lastmod>, or None if it cannot be read
+
+    A bare date counts as the end of that day, so a page changed later on
+    the day a crawl ran is not taken as older than the crawl. A time without
+    a timezone is taken as local time, like the spiders' own timestamps.
+    """
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            day = datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            return (day + timedelta(days=1)).timestamp()
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
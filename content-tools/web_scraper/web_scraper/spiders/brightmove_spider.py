@@ -5,30 +5,63 @@ from urllib.parse import urljoin, urlparse
 from datetime import datetime
 import re
 
+from web_scraper.categorizer import load_categorizer
+from web_scraper.checkpoint import atomic_write
+from web_scraper.dedup import dedup_summary
+from web_scraper.extraction import extract_page
+from web_scraper.frontier import enable_resumable_crawl, stored_start_pages
+from web_scraper.httpcache import fetched_at
+from web_scraper.items import WebScraperItem
+from web_scraper.link_graph import LinkGraphRecorder, open_link_graph
+from web_scraper.page_store import PageStore, dump_json_stream
+from web_scraper.sidecar import SidecarWriter
+
 
 class BrightmoveSpiderSpider(scrapy.Spider):
     name = "brightmove_spider"
     allowed_domains = ["brightmove.com"]
     start_urls = ["https://brightmove.com"]
     
+    # Keyword rules and page fields for each content category (category_rules.json)
+    category_profile = 'brightmove'
+    
+    # Page types and priorities its links are requested by (crawl_priorities.json)
+    priority_profile = 'marketing'
+    
     def __init__(self, *args, **kwargs):
         super(BrightmoveSpiderSpider, self).__init__(*args, **kwargs)
+        self.categorizer = load_categorizer(self.category_profile)
+        self.category_fields = self.categorizer.fields
         # Create knowledge-base directory structure with website_content subfolder
         self.knowledge_base_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'knowledge-base')
         self.website_content_dir = os.path.join(self.knowledge_base_dir, 'website_content')
         self.create_directory_structure()
         
-        # Track scraped content
-        self.scraped_content = {
-            'company_info': {},
-            'features': [],
-            'solutions': [],
-            'pages': [],
-            'pricing': [],
-            'testimonials': [],
-            'case_studies': [],
-            'technical_specs': []
-        }
+        # A replay passes the start time of the crawl it reproduces
+        self.started_at = kwargs.get('started_at') or datetime.now().isoformat()
+        self.crawl_args = {'started_at': self.started_at}
+        
+        # Scraped records are streamed to disk by WebScraperPipeline
+        self.page_store_path = os.path.join(self.website_content_dir, 'brightmove', 'raw_data', 'pages.jsonl')
+        self.page_store = PageStore(self.page_store_path)
+        
+        # Links between pages, recorded once from_crawler opens the site's graph
+        self.link_graph = LinkGraphRecorder()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(BrightmoveSpiderSpider, cls).from_crawler(crawler, *args, **kwargs)
+        # Keep the frontier and seen-URL filter on disk so a killed crawl resumes
+        enable_resumable_crawl(crawler, spider, os.path.join(os.path.dirname(spider.page_store_path), 'crawl_state'))
+        spider.link_graph = open_link_graph(crawler, spider, os.path.dirname(spider.page_store_path))
+        return spider
+
+    async def start(self):
+        # A resumed crawl does not parse the start pages it already stored again
+        self.parsed_start_pages = stored_start_pages(self)
+        for url in self.start_urls:
+            if url not in self.parsed_start_pages:
+                yield scrapy.Request(url, callback=self.parse, dont_filter=True)
 
     def create_directory_structure(self):
         """Create organized directory structure in knowledge-base/website_content"""
@@ -75,187 +108,189 @@ class BrightmoveSpiderSpider(scrapy.Spider):
 
     def parse(self, response):
         """Parse the main page and extract key information"""
+        # The start request may also be in the queue of a resumed crawl
+        if response.url in self.parsed_start_pages:
+            return
+        self.parsed_start_pages.add(response.url)
+        fields = extract_page(response)
+        
         # Extract company information
         company_info = {
             'url': response.url,
-            'title': response.css('title::text').get(),
-            'description': response.css('meta[name="description"]::attr(content)').get(),
-            'keywords': response.css('meta[name="keywords"]::attr(content)').get(),
-            'scraped_at': datetime.now().isoformat()
+            'title': fields['title'],
+            'description': fields['description'],
+            'keywords': fields['keywords'],
+            'scraped_at': fetched_at(response)
         }
         
         # Extract main content sections
         main_content = {
-            'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
-            'paragraphs': [p.strip() for p in response.css('p::text').getall() if p.strip()],
-            'features': [f.strip() for f in response.css('[class*="feature"], [class*="benefit"]::text').getall() if f.strip()],
-            'cta_text': [c.strip() for c in response.css('[class*="button"], [class*="cta"]::text').getall() if c.strip()],
-            'navigation': [n.strip() for n in response.css('nav a::text').getall() if n.strip()]
+            'headlines': fields['headlines'],
+            'paragraphs': fields['paragraphs'],
+            'features': fields['features'],
+            'cta_text': fields['cta_text'],
+            'navigation': fields['navigation']
         }
         
-        self.scraped_content['company_info'] = company_info
-        self.scraped_content['pages'].append({
+        yield WebScraperItem(kind='company_info', url=response.url, data=company_info, categories=[])
+        yield WebScraperItem(kind='page', url=response.url, data={
             'url': response.url,
             'content': main_content
-        })
+        }, categories=[])
         
         # Follow links to other pages
-        for link in response.css('a::attr(href)').getall():
+        links = self.site_links(response.url, fields['links'])
+        self.link_graph.add(response.url, links)
+        for full_url in links:
+            yield scrapy.Request(full_url, callback=self.parse_page)
+    
+    def site_links(self, base_url, links):
+        """Absolute URLs of the links to brightmove.com pages"""
+        urls = []
+        for link in links:
             if link and not link.startswith(('#', 'javascript:', 'mailto:')):
-                full_url = urljoin(response.url, link)
+                full_url = urljoin(base_url, link)
                 if 'brightmove.com' in full_url:
-                    yield scrapy.Request(full_url, callback=self.parse_page)
+                    urls.append(full_url)
+        return urls
     
     def parse_page(self, response):
         """Parse individual pages"""
+        fields = extract_page(response)
         page_content = {
             'url': response.url,
-            'title': response.css('title::text').get(),
-            'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
-            'paragraphs': [p.strip() for p in response.css('p::text').getall() if p.strip()],
-            'lists': [l.strip() for l in response.css('ul li::text, ol li::text').getall() if l.strip()],
-            'scraped_at': datetime.now().isoformat()
+            'title': fields['title'],
+            'headlines': fields['headlines'],
+            'paragraphs': fields['paragraphs'],
+            'lists': fields['lists'],
+            'scraped_at': fetched_at(response)
         }
         
-        self.scraped_content['pages'].append(page_content)
-        
         # Categorize content based on URL and content
-        self.categorize_content(response.url, page_content)
+        categories = self.categorize_content(response.url, page_content)
+        
+        yield WebScraperItem(kind='page', url=response.url, data=page_content, categories=categories)
+        # Only the main page's links are followed, but every page's are part of the graph
+        self.link_graph.add(response.url, self.site_links(response.url, fields['links']))
     
     def categorize_content(self, url, content):
-        """Categorize content based on URL patterns and content"""
-        url_lower = url.lower()
-        
-        # Features
-        if any(keyword in url_lower for keyword in ['feature', 'capability', 'functionality']):
-            features = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['features'].extend(features)
-        
-        # Solutions
-        if any(keyword in url_lower for keyword in ['solution', 'use-case', 'industry']):
-            solutions = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['solutions'].extend(solutions)
-        
-        # Pricing
-        if any(keyword in url_lower for keyword in ['pricing', 'price', 'cost', 'plan']):
-            pricing = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['pricing'].extend(pricing)
-        
-        # Testimonials
-        if any(keyword in url_lower for keyword in ['testimonial', 'review', 'customer']):
-            testimonials = content.get('paragraphs', [])
-            self.scraped_content['testimonials'].extend(testimonials)
-        
-        # Case Studies
-        if any(keyword in url_lower for keyword in ['case-study', 'case', 'success']):
-            case_studies = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['case_studies'].extend(case_studies)
-        
-        # Technical specs
-        if any(keyword in url_lower for keyword in ['technical', 'spec', 'api', 'integration']):
-            tech_specs = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['technical_specs'].extend(tech_specs)
+        """Categorize content by the URL keywords of its category profile"""
+        return self.categorizer.categorize(url)
     
     def closed(self, reason):
         """Save scraped content when spider finishes"""
         # Save all content to knowledge-base with organized structure
         self.save_organized_content()
+        self.page_store.close()
+        
+        # The links between the pages rank them for the next crawl
+        graph = self.link_graph.close(self.start_urls, keep_state=reason != 'finished')
+        if graph is not None:
+            self.logger.info(f"Link graph: {graph['fetched']} pages parsed, {graph['links']} links, {graph['orphans']} orphaned pages")
         
         self.logger.info(f"All scraped content saved to {self.website_content_dir}/brightmove")
     
     def save_organized_content(self):
         """Save content in organized structure under website_content/brightmove"""
         brightmove_dir = os.path.join(self.website_content_dir, 'brightmove')
+        # Counts and category texts for every file below, from one pass over the page store
+        self.store_summary = self.page_store.summarize(self.category_fields)
+        company_info = self.store_summary.latest('company_info')
         
-        # Save raw JSON data
+        # Save raw JSON data, streamed from the page store; pages and categories
+        # hold references into the 'texts' table, each distinct text stored once
         raw_data_file = os.path.join(brightmove_dir, 'raw_data', 'complete_scrape.json')
-        with open(raw_data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.scraped_content, f, indent=2, ensure_ascii=False)
+        with atomic_write(raw_data_file) as f, SidecarWriter(raw_data_file) as sidecar:
+            dump_json_stream(f, [
+                ('company_info', company_info),
+                ('features', self.store_summary.category_refs('features')),
+                ('solutions', self.store_summary.category_refs('solutions')),
+                ('pages', self.page_store.pages(resolve=False)),
+                ('pricing', self.store_summary.category_refs('pricing')),
+                ('testimonials', self.store_summary.category_refs('testimonials')),
+                ('case_studies', self.store_summary.category_refs('case_studies')),
+                ('technical_specs', self.store_summary.category_refs('technical_specs')),
+                ('texts', self.page_store.text_items())
+            ], sidecar)
         
         # Save company information
-        if self.scraped_content['company_info']:
+        if company_info:
             company_file = os.path.join(brightmove_dir, 'company', 'company_overview.txt')
-            with open(company_file, 'w', encoding='utf-8') as f:
+            with atomic_write(company_file) as f:
                 f.write("BRIGHTMOVE COMPANY OVERVIEW\n")
                 f.write("=" * 50 + "\n\n")
-                f.write(f"Title: {self.scraped_content['company_info'].get('title', 'N/A')}\n")
-                f.write(f"Description: {self.scraped_content['company_info'].get('description', 'N/A')}\n")
-                f.write(f"Keywords: {self.scraped_content['company_info'].get('keywords', 'N/A')}\n")
-                f.write(f"Scraped from: {self.scraped_content['company_info'].get('url', 'N/A')}\n")
-                f.write(f"Scraped at: {self.scraped_content['company_info'].get('scraped_at', 'N/A')}\n")
+                f.write(f"Title: {company_info.get('title', 'N/A')}\n")
+                f.write(f"Description: {company_info.get('description', 'N/A')}\n")
+                f.write(f"Keywords: {company_info.get('keywords', 'N/A')}\n")
+                f.write(f"Scraped from: {company_info.get('url', 'N/A')}\n")
+                f.write(f"Scraped at: {company_info.get('scraped_at', 'N/A')}\n")
         
         # Save features
-        if self.scraped_content['features']:
+        if self.store_summary.has_texts('features'):
             features_file = os.path.join(brightmove_dir, 'features', 'features.txt')
-            with open(features_file, 'w', encoding='utf-8') as f:
+            with atomic_write(features_file) as f:
                 f.write("BRIGHTMOVE FEATURES\n")
                 f.write("=" * 30 + "\n\n")
-                unique_features = list(set(self.scraped_content['features']))
-                for feature in unique_features:
+                for feature in self.store_summary.category_texts('features'):
                     if feature.strip():
                         f.write(f"• {feature.strip()}\n")
         
         # Save solutions
-        if self.scraped_content['solutions']:
+        if self.store_summary.has_texts('solutions'):
             solutions_file = os.path.join(brightmove_dir, 'solutions', 'solutions.txt')
-            with open(solutions_file, 'w', encoding='utf-8') as f:
+            with atomic_write(solutions_file) as f:
                 f.write("BRIGHTMOVE SOLUTIONS\n")
                 f.write("=" * 30 + "\n\n")
-                unique_solutions = list(set(self.scraped_content['solutions']))
-                for solution in unique_solutions:
+                for solution in self.store_summary.category_texts('solutions'):
                     if solution.strip():
                         f.write(f"• {solution.strip()}\n")
         
         # Save pricing information
-        if self.scraped_content['pricing']:
+        if self.store_summary.has_texts('pricing'):
             pricing_file = os.path.join(brightmove_dir, 'pricing', 'pricing_info.txt')
-            with open(pricing_file, 'w', encoding='utf-8') as f:
+            with atomic_write(pricing_file) as f:
                 f.write("BRIGHTMOVE PRICING INFORMATION\n")
                 f.write("=" * 40 + "\n\n")
-                unique_pricing = list(set(self.scraped_content['pricing']))
-                for price_info in unique_pricing:
+                for price_info in self.store_summary.category_texts('pricing'):
                     if price_info.strip():
                         f.write(f"• {price_info.strip()}\n")
         
         # Save testimonials
-        if self.scraped_content['testimonials']:
+        if self.store_summary.has_texts('testimonials'):
             testimonials_file = os.path.join(brightmove_dir, 'testimonials', 'testimonials.txt')
-            with open(testimonials_file, 'w', encoding='utf-8') as f:
+            with atomic_write(testimonials_file) as f:
                 f.write("BRIGHTMOVE TESTIMONIALS\n")
                 f.write("=" * 30 + "\n\n")
-                unique_testimonials = list(set(self.scraped_content['testimonials']))
-                for testimonial in unique_testimonials:
+                for testimonial in self.store_summary.category_texts('testimonials'):
                     if testimonial.strip():
                         f.write(f"\"{testimonial.strip()}\"\n\n")
         
         # Save case studies
-        if self.scraped_content['case_studies']:
+        if self.store_summary.has_texts('case_studies'):
             case_studies_file = os.path.join(brightmove_dir, 'case_studies', 'case_studies.txt')
-            with open(case_studies_file, 'w', encoding='utf-8') as f:
+            with atomic_write(case_studies_file) as f:
                 f.write("BRIGHTMOVE CASE STUDIES\n")
                 f.write("=" * 30 + "\n\n")
-                unique_cases = list(set(self.scraped_content['case_studies']))
-                for case in unique_cases:
+                for case in self.store_summary.category_texts('case_studies'):
                     if case.strip():
                         f.write(f"• {case.strip()}\n")
         
         # Save technical specifications
-        if self.scraped_content['technical_specs']:
+        if self.store_summary.has_texts('technical_specs'):
             tech_file = os.path.join(brightmove_dir, 'technical', 'technical_specs.txt')
-            with open(tech_file, 'w', encoding='utf-8') as f:
+            with atomic_write(tech_file) as f:
                 f.write("BRIGHTMOVE TECHNICAL SPECIFICATIONS\n")
                 f.write("=" * 40 + "\n\n")
-                unique_specs = list(set(self.scraped_content['technical_specs']))
-                for spec in unique_specs:
+                for spec in self.store_summary.category_texts('technical_specs'):
                     if spec.strip():
                         f.write(f"• {spec.strip()}\n")
         
         # Save comprehensive page content
         pages_file = os.path.join(brightmove_dir, 'raw_data', 'all_pages.txt')
-        with open(pages_file, 'w', encoding='utf-8') as f:
+        with atomic_write(pages_file) as f:
             f.write("BRIGHTMOVE ALL PAGE CONTENT\n")
             f.write("=" * 35 + "\n\n")
-            for page in self.scraped_content['pages']:
+            for page in self.page_store.pages():
                 f.write(f"URL: {page.get('url', 'N/A')}\n")
                 f.write(f"Title: {page.get('title', 'N/A')}\n")
                 f.write("-" * 50 + "\n")
@@ -286,7 +321,7 @@ class BrightmoveSpiderSpider(scrapy.Spider):
     def create_website_index(self, website_dir):
         """Create a summary index file for the specific website"""
         index_file = os.path.join(website_dir, 'index.txt')
-        with open(index_file, 'w', encoding='utf-8') as f:
+        with atomic_write(index_file) as f:
             f.write("BRIGHTMOVE WEBSITE CONTENT INDEX\n")
             f.write("=" * 40 + "\n\n")
             f.write("This directory contains scraped content from BrightMove's website.\n\n")
@@ -303,11 +338,13 @@ class BrightmoveSpiderSpider(scrapy.Spider):
             
             f.write("CONTENT SUMMARY:\n")
             f.write("-" * 20 + "\n")
-            f.write(f"Total pages scraped: {len(self.scraped_content['pages'])}\n")
-            f.write(f"Features found: {len(set(self.scraped_content['features']))}\n")
-            f.write(f"Solutions found: {len(set(self.scraped_content['solutions']))}\n")
-            f.write(f"Pricing items: {len(set(self.scraped_content['pricing']))}\n")
-            f.write(f"Testimonials: {len(set(self.scraped_content['testimonials']))}\n")
-            f.write(f"Case studies: {len(set(self.scraped_content['case_studies']))}\n")
-            f.write(f"Technical specs: {len(set(self.scraped_content['technical_specs']))}\n")
-            f.write(f"Scraped at: {datetime.now().isoformat()}\n")
+            f.write(f"Total pages scraped: {self.store_summary.count()}\n")
+            f.write(f"Features found: {self.store_summary.category_count('features')}\n")
+            f.write(f"Solutions found: {self.store_summary.category_count('solutions')}\n")
+            f.write(f"Pricing items: {self.store_summary.category_count('pricing')}\n")
+            f.write(f"Testimonials: {self.store_summary.category_count('testimonials')}\n")
+            f.write(f"Case studies: {self.store_summary.category_count('case_studies')}\n")
+            f.write(f"Technical specs: {self.store_summary.category_count('technical_specs')}\n")
+            for line in dedup_summary(self.crawler.stats, os.path.join(website_dir, 'raw_data')):
+                f.write(line + "\n")
+            f.write(f"Scraped at: {self.started_at}\n")
@@ -5,14 +5,33 @@ from urllib.parse import urljoin, urlparse
 from datetime import datetime
 import re
 
+from web_scraper.categorizer import load_categorizer
+from web_scraper.checkpoint import atomic_write
+from web_scraper.dedup import dedup_summary
+from web_scraper.extraction import extract_page
+from web_scraper.frontier import BloomFilter, enable_resumable_crawl, open_bloom_filter, stored_start_pages
+from web_scraper.httpcache import fetched_at
+from web_scraper.items import WebScraperItem
+from web_scraper.link_graph import LinkGraphRecorder, open_link_graph
+from web_scraper.page_store import PageStore, dump_json_stream
+from web_scraper.sidecar import SidecarWriter
+
 
 class InoviumSpiderSpider(scrapy.Spider):
     name = "inovium_spider"
     allowed_domains = ["inovium.com"]
     start_urls = ["https://www.inovium.com/"]
     
+    # Keyword rules and page fields for each content category (category_rules.json)
+    category_profile = 'inovium'
+    
+    # Page types and priorities its links are requested by (crawl_priorities.json)
+    priority_profile = 'marketing'
+    
     def __init__(self, *args, **kwargs):
         super(InoviumSpiderSpider, self).__init__(*args, **kwargs)
+        self.categorizer = load_categorizer(self.category_profile)
+        self.category_fields = self.categorizer.fields
         # Create knowledge-base directory structure for Inovium
         # Get the project root directory (3 levels up from spider file)
         spider_dir = os.path.dirname(__file__)
@@ -24,26 +43,40 @@ class InoviumSpiderSpider(scrapy.Spider):
         self.inovium_dir = os.path.join(self.website_content_dir, 'partners', 'inovium')
         self.create_directory_structure()
         
-        # Track scraped content
-        self.scraped_content = {
-            'website_info': {
-                'name': 'inovium',
-                'start_url': 'https://www.inovium.com/',
-                'scraped_at': datetime.now().isoformat()
-            },
-            'company_info': {},
-            'services': [],
-            'solutions': [],
-            'case_studies': [],
-            'team': [],
-            'blog_posts': [],
-            'pages': [],
-            'contact_info': {},
-            'partnership_info': []
+        # A replay passes the start time of the crawl it reproduces
+        self.started_at = kwargs.get('started_at') or datetime.now().isoformat()
+        self.crawl_args = {'started_at': self.started_at}
+        self.website_info = {
+            'name': 'inovium',
+            'start_url': 'https://www.inovium.com/',
+            'scraped_at': self.started_at
         }
         
-        # Track visited URLs to avoid duplicates
-        self.visited_urls = set()
+        # Scraped records are streamed to disk by WebScraperPipeline
+        self.page_store_path = os.path.join(self.inovium_dir, 'raw_data', 'pages.jsonl')
+        self.page_store = PageStore(self.page_store_path)
+        
+        # Track visited URLs to avoid duplicates; from_crawler swaps in a
+        # filter persisted with the crawl state
+        self.visited_urls = BloomFilter()
+        # Links between pages, recorded once from_crawler opens the site's graph
+        self.link_graph = LinkGraphRecorder()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(InoviumSpiderSpider, cls).from_crawler(crawler, *args, **kwargs)
+        # Keep the frontier and seen-URL filter on disk so a killed crawl resumes
+        enable_resumable_crawl(crawler, spider, os.path.join(os.path.dirname(spider.page_store_path), 'crawl_state'))
+        spider.visited_urls = open_bloom_filter(crawler, 'visited_urls.bloom', reset=not spider.resuming)
+        spider.link_graph = open_link_graph(crawler, spider, os.path.dirname(spider.page_store_path))
+        return spider
+
+    async def start(self):
+        # A resumed crawl does not fetch the start pages it already stored again
+        stored = stored_start_pages(self)
+        for url in self.start_urls:
+            if url not in stored:
+                yield scrapy.Request(url, callback=self.parse, dont_filter=True)
 
     def create_directory_structure(self):
         """Create organized directory structure for Inovium content"""
@@ -70,41 +103,35 @@ class InoviumSpiderSpider(scrapy.Spider):
         if response.url in self.visited_urls:
             return
         self.visited_urls.add(response.url)
+        fields = extract_page(response)
         
         # Extract company information
         company_info = {
             'url': response.url,
-            'title': response.css('title::text').get(),
-            'description': response.css('meta[name="description"]::attr(content)').get(),
-            'scraped_at': datetime.now().isoformat()
+            'title': fields['title'],
+            'description': fields['description'],
+            'scraped_at': fetched_at(response)
         }
         
         # Extract main content sections
         main_content = {
-            'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
-            'paragraphs': [p.strip() for p in response.css('p::text').getall() if p.strip()],
-            'navigation': [n.strip() for n in response.css('nav a::text, .nav a::text').getall() if n.strip()],
-            'hero_content': [h.strip() for h in response.css('.hero h1::text, .hero p::text, .banner h1::text, .banner p::text').getall() if h.strip()]
+            'headlines': fields['headlines'],
+            'paragraphs': fields['paragraphs'],
+            'navigation': fields['navigation'],
+            'hero_content': fields['hero_content']
         }
         
-        self.scraped_content['company_info'] = company_info
-        self.scraped_content['pages'].append({
+        yield WebScraperItem(kind='company_info', url=response.url, data=company_info, categories=[])
+        yield WebScraperItem(kind='page', url=response.url, data={
             'url': response.url,
             'content': main_content
-        })
+        }, categories=[])
         
         # Extract all links - be comprehensive
         all_links = []
         
-        # Get all anchor tags
-        for link in response.css('a::attr(href)').getall():
-            if link and not link.startswith(('#', 'javascript:', 'mailto:')):
-                full_url = urljoin(response.url, link)
-                if 'inovium.com' in full_url:
-                    all_links.append(full_url)
-        
-        # Also look for links in data attributes and other sources
-        for link in response.css('[data-href]::attr(data-href), [href]::attr(href)').getall():
+        # Anchor tags, plus links in data attributes and other sources
+        for link in fields['links'] + fields['extra_links']:
             if link and not link.startswith(('#', 'javascript:', 'mailto:')):
                 full_url = urljoin(response.url, link)
                 if 'inovium.com' in full_url:
@@ -113,6 +140,7 @@ class InoviumSpiderSpider(scrapy.Spider):
         # Remove duplicates and follow links
         unique_links = list(set(all_links))
         self.logger.info(f"Found {len(unique_links)} unique links on {response.url}")
+        self.link_graph.add(response.url, unique_links)
         
         for link in unique_links:
             if link not in self.visited_urls:
@@ -128,93 +156,100 @@ class InoviumSpiderSpider(scrapy.Spider):
         url_path = urlparse(response.url).path
         url_lower = url_path.lower()
         
+        fields = extract_page(response)
         page_content = {
             'url': response.url,
-            'title': response.css('title::text').get(),
-            'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
-            'paragraphs': [p.strip() for p in response.css('p::text').getall() if p.strip()],
-            'lists': [l.strip() for l in response.css('ul li::text, ol li::text').getall() if l.strip()],
-            'images': [img.strip() for img in response.css('img::attr(alt)').getall() if img.strip()],
-            'scraped_at': datetime.now().isoformat()
+            'title': fields['title'],
+            'headlines': fields['headlines'],
+            'paragraphs': fields['paragraphs'],
+            'lists': fields['lists'],
+            'images': fields['images'],
+            'scraped_at': fetched_at(response)
         }
         
-        self.scraped_content['pages'].append(page_content)
-        
         # Categorize content based on URL patterns and content
-        self.categorize_inovium_content(response.url, page_content)
+        categories = self.categorize_inovium_content(response.url, page_content)
+        
+        yield WebScraperItem(kind='page', url=response.url, data=page_content, categories=categories)
         
         # Follow all links to find more content
-        for link in response.css('a::attr(href)').getall():
+        links = []
+        for link in fields['links']:
             if link and not link.startswith(('#', 'javascript:', 'mailto:')):
                 full_url = urljoin(response.url, link)
-                if 'inovium.com' in full_url and full_url not in self.visited_urls:
-                    yield scrapy.Request(full_url, callback=self.parse_inovium_page, meta={'source_url': response.url})
+                if 'inovium.com' in full_url:
+                    links.append(full_url)
+        self.link_graph.add(response.url, links)
+        for full_url in links:
+            if full_url not in self.visited_urls:
+                yield scrapy.Request(full_url, callback=self.parse_inovium_page, meta={'source_url': response.url})
     
     def categorize_inovium_content(self, url, content):
-        """Categorize Inovium content based on URL patterns and content"""
-        url_lower = url.lower()
-        
-        # Services
-        if any(keyword in url_lower for keyword in ['services', 'consulting', 'solutions', 'offerings']):
-            service_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['services'].extend(service_content)
-        
-        # Solutions
-        if any(keyword in url_lower for keyword in ['solutions', 'platforms', 'technology', 'tools']):
-            solution_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['solutions'].extend(solution_content)
-        
-        # Case studies
-        if any(keyword in url_lower for keyword in ['case-study', 'case-studies', 'success', 'clients', 'results']):
-            case_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['case_studies'].extend(case_content)
-        
-        # Team
-        if any(keyword in url_lower for keyword in ['team', 'about', 'leadership', 'people']):
-            team_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['team'].extend(team_content)
-        
-        # Blog posts
-        if any(keyword in url_lower for keyword in ['blog', 'news', 'insights', 'articles']):
-            blog_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['blog_posts'].extend(blog_content)
-        
-        # Contact information
-        if any(keyword in url_lower for keyword in ['contact', 'location', 'phone', 'email']):
-            contact_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['contact_info'][url] = contact_content
-        
-        # Partnership information
-        if any(keyword in url_lower for keyword in ['partners', 'partnership', 'alliances', 'ecosystem']):
-            partnership_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['partnership_info'].extend(partnership_content)
+        """Categorize Inovium content by the URL keywords of its category profile"""
+        return self.categorizer.categorize(url)
     
     def closed(self, reason):
         """Save scraped content when spider finishes"""
         # Save all content to knowledge-base with organized structure
         self.save_organized_content()
+        self.page_store.close()
+        
+        # A finished crawl has nothing left to resume
+        if reason == 'finished':
+            self.visited_urls.discard()
+        else:
+            self.visited_urls.close()
+        
+        # The links between the pages rank them for the next crawl
+        graph = self.link_graph.close(self.start_urls, keep_state=reason != 'finished')
+        if graph is not None:
+            self.logger.info(f"Link graph: {graph['fetched']} pages parsed, {graph['links']} links, {graph['orphans']} orphaned pages")
         
         self.logger.info(f"All Inovium content saved to {self.inovium_dir}")
-        self.logger.info(f"Total pages scraped: {len(self.scraped_content['pages'])}")
+        self.logger.info(f"Total pages scraped: {self.store_summary.count()}")
     
     def save_organized_content(self):
         """Save content in organized structure under partners/inovium"""
         
-        # Save raw JSON data
+        # Counts and category texts for every file below, from one pass over the page store
+        self.store_summary = self.page_store.summarize(self.category_fields)
+        company_info = self.store_summary.latest('company_info')
+        
+        # Contact pages are kept per URL rather than merged into one list
+        contact_info = {}
+        for record in self.page_store.category_pages('contact_info', resolve=False):
+            contact_info[record['url']] = [
+                ref for field in self.category_fields['contact_info'] for ref in record['data'].get(field, [])
+            ]
+        
+        # Save raw JSON data, streamed from the page store; pages and categories
+        # hold references into the 'texts' table, each distinct text stored once
         raw_data_file = os.path.join(self.inovium_dir, 'raw_data', 'complete_scrape.json')
-        with open(raw_data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.scraped_content, f, indent=2, ensure_ascii=False)
+        with atomic_write(raw_data_file) as f, SidecarWriter(raw_data_file) as sidecar:
+            dump_json_stream(f, [
+                ('website_info', self.website_info),
+                ('company_info', company_info),
+                ('services', self.store_summary.category_refs('services')),
+                ('solutions', self.store_summary.category_refs('solutions')),
+                ('case_studies', self.store_summary.category_refs('case_studies')),
+                ('team', self.store_summary.category_refs('team')),
+                ('blog_posts', self.store_summary.category_refs('blog_posts')),
+                ('pages', self.page_store.pages(resolve=False)),
+                ('contact_info', contact_info),
+                ('partnership_info', self.store_summary.category_refs('partnership_info')),
+                ('texts', self.page_store.text_items())
+            ], sidecar)
         
         # Save company information
-        if self.scraped_content['company_info']:
+        if company_info:
             info_file = os.path.join(self.inovium_dir, 'company', 'company_info.txt')
-            with open(info_file, 'w', encoding='utf-8') as f:
+            with atomic_write(info_file) as f:
                 f.write("INOVIUM COMPANY INFORMATION\n")
                 f.write("=" * 40 + "\n\n")
-                f.write(f"Title: {self.scraped_content['company_info'].get('title', 'N/A')}\n")
-                f.write(f"Description: {self.scraped_content['company_info'].get('description', 'N/A')}\n")
-                f.write(f"Scraped from: {self.scraped_content['company_info'].get('url', 'N/A')}\n")
-                f.write(f"Scraped at: {self.scraped_content['company_info'].get('scraped_at', 'N/A')}\n")
+                f.write(f"Title: {company_info.get('title', 'N/A')}\n")
+                f.write(f"Description: {company_info.get('description', 'N/A')}\n")
+                f.write(f"Scraped from: {company_info.get('url', 'N/A')}\n")
+                f.write(f"Scraped at: {company_info.get('scraped_at', 'N/A')}\n")
         
         # Save all categorized content
         content_categories = {
@@ -227,35 +262,38 @@ class InoviumSpiderSpider(scrapy.Spider):
         }
         
         for category, title in content_categories.items():
-            if self.scraped_content[category]:
-                category_file = os.path.join(self.inovium_dir, category, f'{category}.txt')
-                with open(category_file, 'w', encoding='utf-8') as f:
+            if self.store_summary.has_texts(category):
+                category_dir = os.path.join(self.inovium_dir, category)
+                os.makedirs(category_dir, exist_ok=True)
+                category_file = os.path.join(category_dir, f'{category}.txt')
+                with atomic_write(category_file) as f:
                     f.write(f"INOVIUM - {title}\n")
                     f.write("=" * (len(title) + 10) + "\n\n")
-                    unique_items = list(set(self.scraped_content[category]))
+                    unique_items = self.store_summary.category_texts(category)
                     for item in unique_items:
                         if item.strip():
                             f.write(f"• {item.strip()}\n")
         
         # Save contact information
-        if self.scraped_content['contact_info']:
+        if contact_info:
             contact_file = os.path.join(self.inovium_dir, 'contact', 'contact_info.txt')
-            with open(contact_file, 'w', encoding='utf-8') as f:
+            with atomic_write(contact_file) as f:
                 f.write("INOVIUM CONTACT INFORMATION\n")
                 f.write("=" * 40 + "\n\n")
-                for url, content in self.scraped_content['contact_info'].items():
+                for url, refs in contact_info.items():
+                    texts = self.page_store.texts.lookup(refs)
                     f.write(f"URL: {url}\n")
                     f.write("-" * 50 + "\n")
-                    for item in content:
-                        f.write(f"  {item}\n")
+                    for ref in refs:
+                        f.write(f"  {texts[ref]}\n")
                     f.write("\n")
         
         # Save comprehensive page content
         pages_file = os.path.join(self.inovium_dir, 'raw_data', 'all_pages.txt')
-        with open(pages_file, 'w', encoding='utf-8') as f:
+        with atomic_write(pages_file) as f:
             f.write("INOVIUM - ALL PAGE CONTENT\n")
             f.write("=" * 40 + "\n\n")
-            for page in self.scraped_content['pages']:
+            for page in self.page_store.pages():
                 f.write(f"URL: {page.get('url', 'N/A')}\n")
                 f.write(f"Title: {page.get('title', 'N/A')}\n")
                 f.write("-" * 50 + "\n")
@@ -275,11 +313,13 @@ class InoviumSpiderSpider(scrapy.Spider):
     def create_inovium_index(self):
         """Create an index file for easy navigation of Inovium content"""
         index_file = os.path.join(self.inovium_dir, 'index.txt')
-        with open(index_file, 'w', encoding='utf-8') as f:
+        with atomic_write(index_file) as f:
             f.write("INOVIUM KNOWLEDGE BASE INDEX\n")
             f.write("=" * 50 + "\n\n")
-            f.write(f"Total Pages Scraped: {len(self.scraped_content['pages'])}\n")
-            f.write(f"Scraped At: {datetime.now().isoformat()}\n\n")
+            f.write(f"Total Pages Scraped: {self.store_summary.count()}\n")
+            for line in dedup_summary(self.crawler.stats, os.path.join(self.inovium_dir, 'raw_data')):
+                f.write(line + "\n")
+            f.write(f"Scraped At: {self.started_at}\n\n")
             
             f.write("CONTENT CATEGORIES:\n")
             f.write("-" * 20 + "\n")
@@ -291,14 +331,17 @@ class InoviumSpiderSpider(scrapy.Spider):
                 ('blog_posts', 'Blog Posts'),
                 ('partnership_info', 'Partnership Information')
             ]:
-                count = len(self.scraped_content[category])
+                count = self.store_summary.category_count(category, unique=False)
                 f.write(f"• {title}: {count} items\n")
             
             f.write("\nSAMPLE CONTENT:\n")
             f.write("-" * 20 + "\n")
-            if self.scraped_content['company_info'].get('title'):
-                f.write(f"Company: {self.scraped_content['company_info']['title']}\n")
-            if self.scraped_content['services']:
-                f.write(f"Sample Service: {self.scraped_content['services'][0]}\n")
-            if self.scraped_content['solutions']:
-                f.write(f"Sample Solution: {self.scraped_content['solutions'][0]}\n") 
\ No newline at end of file
+            company_info = self.store_summary.latest('company_info')
+            if company_info.get('title'):
+                f.write(f"Company: {company_info['title']}\n")
+            sample_service = next(self.store_summary.category_texts('services'), None)
+            if sample_service is not None:
+                f.write(f"Sample Service: {sample_service}\n")
+            sample_solution = next(self.store_summary.category_texts('solutions'), None)
+            if sample_solution is not None:
+                f.write(f"Sample Solution: {sample_solution}\n") 
\ No newline at end of file
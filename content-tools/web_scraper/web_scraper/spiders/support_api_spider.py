@@ -0,0 +1,236 @@
+import scrapy
+import json
+import os
+from urllib.parse import urlencode
+from datetime import datetime
+
+from scrapy.http import HtmlResponse
+
+from web_scraper.checkpoint import atomic_write
+from web_scraper.extraction import extract_page
+from web_scraper.httpcache import fetched_at
+from web_scraper.items import WebScraperItem
+from web_scraper.spiders.support_spider import SupportSpiderSpider
+from web_scraper.validators import ValidatorStore
+
+
+class SupportApiSpiderSpider(SupportSpiderSpider):
+    """Ingest the BrightMove help center through its paginated JSON API
+    
+    Instead of crawling HTML and guessing article links, collections and
+    articles are listed through the help center API (Intercom's
+    /help_center/collections and /articles), 50 per request, and every page
+    of a listing is fetched concurrently once the first one reports how many
+    there are. The output is written to the same brightmove/support layout
+    as support_spider.
+    
+    Crawls are incremental: the newest updated_at seen is kept as a cursor,
+    the next crawl asks only for articles updated after it, and articles that
+    have not changed are re-emitted from the records stored for them.
+    Articles the listing shows unpublished are dropped; deleted ones drop
+    out of the listing altogether, so only a full crawl notices them. Pass
+    -a full=1 to ignore the cursor.
+        
+        scrapy crawl support_api_spider -a token=... [-a api_url=http://127.0.0.1:8770]
+    """
+    name = "support_api_spider"
+    allowed_domains = []
+    start_urls = []
+    
+    per_page = 50
+    
+    # Set by web_scraper.replay when re-running a recorded crawl
+    replaying = False
+    
+    def __init__(self, api_url=None, token=None, full=False, *args, **kwargs):
+        super(SupportApiSpiderSpider, self).__init__(*args, **kwargs)
+        self.api_url = (api_url or os.environ.get('HELP_CENTER_API_URL', 'https://api.intercom.io')).rstrip('/')
+        self.token = token or os.environ.get('HELP_CENTER_API_TOKEN')
+        self.full = str(full).lower() in ('1', 'true', 'yes')
+        self.website_info['start_url'] = self.api_url
+        self.crawl_args.update(api_url=self.api_url, full=self.full)
+        
+        raw_data_dir = os.path.join(self.support_dir, 'raw_data')
+        self.cursor_file = os.path.join(raw_data_dir, 'api_cursor.json')
+        # A replay re-extracts every article it has a recorded response for
+        self.cursor = None if self.full or self.replaying else self.load_cursor()
+        self.newest_update = self.cursor
+        
+        # Records extracted for every article, reused while it is unchanged
+        self.article_store = ValidatorStore(os.path.join(raw_data_dir, 'api_articles.sqlite'))
+        self.seen_articles = set()
+        self.collection_urls = {}
+        self.pending_pages = {'collections': 0, 'articles': 0}
+        self.api_failed = False
+        self.api_counts = {'collections': 0, 'articles_extracted': 0, 'articles_reused': 0, 'articles_removed': 0}
+    
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        # Skips support_spider's resumable crawl state: the listing is a few
+        # dozen requests whose progress is only counted in memory
+        spider = super(SupportSpiderSpider, cls).from_crawler(crawler, *args, **kwargs)
+        spider.resuming = False
+        return spider
+    
+    def load_cursor(self):
+        if not os.path.exists(self.cursor_file):
+            return None
+        with open(self.cursor_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('updated_at')
+    
+    def api_request(self, listing, path, page, callback, **params):
+        """Request one page of an API listing"""
+        query = dict(params, page=page, per_page=self.per_page)
+        headers = {'Accept': 'application/json', 'Intercom-Version': '2.11'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        return scrapy.Request(
+            f'{self.api_url}{path}?{urlencode(query)}',
+            callback=callback,
+            errback=self.api_error,
+            headers=headers,
+            cb_kwargs={'path': path, 'params': params},
+            meta={'listing': listing}
+        )
+    
+    def start_requests(self):
+        # Collections first, so articles can be linked to their collection URL
+        self.pending_pages['collections'] = 1
+        yield self.api_request('collections', '/help_center/collections', 1, self.parse_collections)
+    
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+    
+    def more_pages(self, response, listing, path, params, callback):
+        """After the first page of a listing, request all the others at once"""
+        pages = listing.get('pages') or {}
+        if pages.get('page', 1) != 1:
+            return
+        total_pages = pages.get('total_pages', 1)
+        self.pending_pages[response.meta['listing']] += max(0, total_pages - 1)
+        for page in range(2, total_pages + 1):
+            yield self.api_request(response.meta['listing'], path, page, callback, **params)
+    
+    def parse_collections(self, response, path, params):
+        """Emit one page of collections"""
+        listing = json.loads(response.text)
+        yield from self.more_pages(response, listing, path, params, self.parse_collections)
+        
+        for collection in listing.get('data', []):
+            url = collection.get('url') or f"{self.api_url}/help_center/collections/{collection['id']}"
+            self.collection_urls[str(collection['id'])] = url
+            self.api_counts['collections'] += 1
+            yield WebScraperItem(kind='collection', url=url, data={
+                'url': url,
+                'title': collection.get('name'),
+                'headlines': [collection['name']] if collection.get('name') else [],
+                'description': [collection['description']] if collection.get('description') else [],
+                'scraped_at': fetched_at(response)
+            }, categories=[])
+        
+        yield from self.listing_done('collections')
+    
+    def parse_articles(self, response, path, params):
+        """Emit one page of articles, extracting only those updated since the last crawl"""
+        listing = json.loads(response.text)
+        yield from self.more_pages(response, listing, path, params, self.parse_articles)
+        
+        for article in listing.get('data', []):
+            if not article.get('url'):
+                continue
+            url = article['url']
+            updated_at = article.get('updated_at') or 0
+            self.seen_articles.add(url)
+            self.newest_update = max(self.newest_update or 0, updated_at)
+            if article.get('state', 'published') != 'published':
+                # A published article turned back into a draft
+                self.remove_article(url)
+                continue
+        
+            stored = self.article_store.lookup(url)
+            if stored is not None and self.cursor is not None and updated_at <= self.cursor:
+                yield from self.reuse_article(stored)
+                continue
+        
+            item = self.article_item(article, fetched_at(response))
+            self.article_store.store(url, [dict(item)], last_modified=str(updated_at))
+            self.api_counts['articles_extracted'] += 1
+            yield item
+        
+        yield from self.listing_done('articles')
+    
+    def article_item(self, article, scraped_at):
+        """Build the same article record support_spider extracts from the HTML page"""
+        response = HtmlResponse(url=article['url'], body=article.get('body') or '', encoding='utf-8')
+        fields = extract_page(response)
+        parent_id = article.get('parent_id')
+        article_content = {
+            'url': article['url'],
+            'title': article.get('title'),
+            'headlines': ([article['title']] if article.get('title') else []) + fields['headlines'],
+            'paragraphs': fields['paragraphs'],
+            'lists': fields['lists'],
+            'code_blocks': fields['code_blocks'],
+            'images': fields['images'],
+            'collection_url': self.collection_urls.get(str(parent_id), '') if parent_id is not None else '',
+            'scraped_at': scraped_at
+        }
+        
+        categories = self.categorize_support_content(article['url'], article_content)
+        return WebScraperItem(kind='article', url=article['url'], data=article_content, categories=categories)
+    
+    def reuse_article(self, stored):
+        self.api_counts['articles_reused'] += 1
+        for record in stored[2]:
+            yield WebScraperItem(**record)
+    
+    def remove_article(self, url):
+        if self.article_store.lookup(url) is not None:
+            self.article_store.delete(url)
+            self.api_counts['articles_removed'] += 1
+    
+    def listing_done(self, listing):
+        """Count a finished listing page and start the next stage after the last one"""
+        self.pending_pages[listing] -= 1
+        if self.pending_pages[listing]:
+            return
+        
+        if listing == 'collections':
+            params = {} if self.cursor is None else {'updated_after': self.cursor}
+            self.pending_pages['articles'] = 1
+            yield self.api_request('articles', '/articles', 1, self.parse_articles, **params)
+        else:
+            # A complete full listing has every article; those it left out were deleted
+            deleted = self.cursor is None and not self.api_failed
+            # An API that honours updated_after leaves unchanged articles out
+            # of the listing; emit what was stored for them
+            for url in self.article_store.urls():
+                if url in self.seen_articles:
+                    continue
+                if deleted:
+                    self.remove_article(url)
+                else:
+                    yield from self.reuse_article(self.article_store.lookup(url))
+    
+    def api_error(self, failure):
+        self.logger.error(f"API request failed: {failure.request.url}: {failure.value}")
+        self.api_failed = True
+        yield from self.listing_done(failure.request.meta['listing'])
+    
+    def closed(self, reason):
+        """Save content as support_spider does and advance the updated_at cursor"""
+        super(SupportApiSpiderSpider, self).closed(reason)
+        self.article_store.close()
+        
+        # Only a complete live listing may move the cursor forward
+        if reason == 'finished' and not self.api_failed and not self.replaying and self.newest_update is not None:
+            with atomic_write(self.cursor_file) as f:
+                json.dump({'updated_at': self.newest_update, 'saved_at': datetime.now().isoformat()}, f, indent=2)
+        
+        requests = self.crawler.stats.get_value('downloader/request_count', 0)
+        self.logger.info(
+            f"API requests: {requests}, collections: {self.api_counts['collections']}, "
+            f"articles extracted: {self.api_counts['articles_extracted']}, reused: {self.api_counts['articles_reused']}, "
+            f"removed: {self.api_counts['articles_removed']}"
+        )
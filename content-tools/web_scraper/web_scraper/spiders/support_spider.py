@@ -1,46 +1,81 @@
 import scrapy
+import itertools
 import json
 import os
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
 import re
 
+from web_scraper.categorizer import load_categorizer
+from web_scraper.checkpoint import atomic_write
+from web_scraper.dedup import dedup_summary
+from web_scraper.extraction import extract_page
+from web_scraper.frontier import BloomFilter, enable_resumable_crawl, open_bloom_filter, stored_start_pages
+from web_scraper.httpcache import fetched_at
+from web_scraper.items import WebScraperItem
+from web_scraper.link_graph import LinkGraphRecorder, open_link_graph
+from web_scraper.page_store import PageStore, dump_json_stream
+from web_scraper.sidecar import SidecarWriter
+from web_scraper.url_policy import load_url_policy
+
 
 class SupportSpiderSpider(scrapy.Spider):
     name = "support_spider"
     allowed_domains = ["support.brightmove.com"]
     start_urls = ["https://support.brightmove.com/en/"]
     
+    # Keyword rules and page fields for each content category (category_rules.json)
+    category_profile = 'support'
+    
+    # Page types and priorities its links are requested by (crawl_priorities.json)
+    priority_profile = 'support'
+    
     def __init__(self, *args, **kwargs):
         super(SupportSpiderSpider, self).__init__(*args, **kwargs)
+        self.categorizer = load_categorizer(self.category_profile)
+        self.category_fields = self.categorizer.fields
         # Create knowledge-base directory structure
         self.knowledge_base_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'knowledge-base')
         self.website_content_dir = os.path.join(self.knowledge_base_dir, 'website_content')
         self.support_dir = os.path.join(self.website_content_dir, 'brightmove', 'support')
         self.create_directory_structure()
         
-        # Track scraped content
-        self.scraped_content = {
-            'website_info': {
-                'name': 'support_brightmove',
-                'start_url': 'https://support.brightmove.com/en/',
-                'scraped_at': datetime.now().isoformat()
-            },
-            'company_info': {},
-            'help_articles': [],
-            'faqs': [],
-            'tutorials': [],
-            'pages': [],
-            'technical_docs': [],
-            'user_guides': [],
-            'api_docs': [],
-            'troubleshooting': [],
-            'collections': [],
-            'articles': []
+        # A replay passes the start time of the crawl it reproduces
+        self.started_at = kwargs.get('started_at') or datetime.now().isoformat()
+        self.crawl_args = {'started_at': self.started_at}
+        self.website_info = {
+            'name': 'support_brightmove',
+            'start_url': 'https://support.brightmove.com/en/',
+            'scraped_at': self.started_at
         }
         
-        # Track visited URLs to avoid duplicates
-        self.visited_urls = set()
+        # Scraped records are streamed to disk by WebScraperPipeline
+        self.page_store_path = os.path.join(self.support_dir, 'raw_data', 'pages.jsonl')
+        self.page_store = PageStore(self.page_store_path)
+        
+        # Track visited URLs to avoid duplicates; from_crawler swaps in a
+        # filter persisted with the crawl state. URLs are recorded in
+        # canonical form when they are scheduled, so each page is requested once
+        self.visited_urls = BloomFilter()
+        self.url_policy = load_url_policy('support.brightmove.com')
+        # Links between pages, recorded once from_crawler opens the site's graph
+        self.link_graph = LinkGraphRecorder()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(SupportSpiderSpider, cls).from_crawler(crawler, *args, **kwargs)
+        # Keep the frontier and seen-URL filter on disk so a killed crawl resumes
+        enable_resumable_crawl(crawler, spider, os.path.join(os.path.dirname(spider.page_store_path), 'crawl_state'))
+        spider.visited_urls = open_bloom_filter(crawler, 'visited_urls.bloom', reset=not spider.resuming)
+        spider.link_graph = open_link_graph(crawler, spider, os.path.dirname(spider.page_store_path))
+        return spider
+
+    async def start(self):
+        # A resumed crawl does not fetch the start pages it already stored again
+        stored = stored_start_pages(self)
+        for url in self.start_urls:
+            if url not in stored:
+                yield scrapy.Request(url, callback=self.parse, dont_filter=True)
 
     def create_directory_structure(self):
         """Create organized directory structure for support content"""
@@ -63,62 +98,49 @@ class SupportSpiderSpider(scrapy.Spider):
 
     def parse(self, response):
         """Parse the support main page and extract key information"""
-        if response.url in self.visited_urls:
+        if not self.visited_urls.add(self.url_policy.canonicalize(response.url)):
             return
-        self.visited_urls.add(response.url)
+        fields = extract_page(response)
         
         # Extract support site information
         support_info = {
             'url': response.url,
-            'title': response.css('title::text').get(),
-            'description': response.css('meta[name="description"]::attr(content)').get(),
-            'scraped_at': datetime.now().isoformat()
+            'title': fields['title'],
+            'description': fields['description'],
+            'scraped_at': fetched_at(response)
         }
         
         # Extract main content sections
         main_content = {
-            'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
-            'paragraphs': [p.strip() for p in response.css('p::text').getall() if p.strip()],
-            'navigation': [n.strip() for n in response.css('nav a::text, .nav a::text').getall() if n.strip()],
-            'search_terms': [s.strip() for s in response.css('[class*="search"]::text, [placeholder*="search"]::attr(placeholder)').getall() if s.strip()]
+            'headlines': fields['headlines'],
+            'paragraphs': fields['paragraphs'],
+            'navigation': fields['navigation'],
+            'search_terms': fields['search_terms']
         }
         
-        self.scraped_content['company_info'] = support_info
-        self.scraped_content['pages'].append({
+        yield WebScraperItem(kind='company_info', url=response.url, data=support_info, categories=[])
+        yield WebScraperItem(kind='page', url=response.url, data={
             'url': response.url,
             'content': main_content
-        })
-        
-        # Extract all links - be more comprehensive
-        all_links = []
-        
-        # Get all anchor tags
-        for link in response.css('a::attr(href)').getall():
-            if link and not link.startswith(('#', 'javascript:', 'mailto:')):
-                full_url = urljoin(response.url, link)
-                if 'support.brightmove.com' in full_url:
-                    all_links.append(full_url)
-        
-        # Also look for links in data attributes and other sources
-        for link in response.css('[data-href]::attr(data-href), [href]::attr(href)').getall():
-            if link and not link.startswith(('#', 'javascript:', 'mailto:')):
-                full_url = urljoin(response.url, link)
-                if 'support.brightmove.com' in full_url:
-                    all_links.append(full_url)
+        }, categories=[])
         
-        # Remove duplicates and follow links
-        unique_links = list(set(all_links))
+        # Anchor tags, plus links in data attributes and other sources
+        unique_links = list(self.url_policy.links(response.url, fields['links'] + fields['extra_links']))
         self.logger.info(f"Found {len(unique_links)} unique links on {response.url}")
-        
-        for link in unique_links:
-            if link not in self.visited_urls:
-                yield scrapy.Request(link, callback=self.parse_support_page, meta={'source_url': response.url})
+        self.link_graph.add(self.url_policy.canonicalize(response.url), unique_links)
+        yield from self.follow(unique_links, self.parse_support_page, {'source_url': response.url})
+    
+    def follow(self, urls, callback, meta):
+        """Request canonical URLs that have not been scheduled before"""
+        for url in urls:
+            if self.visited_urls.add(url):
+                yield scrapy.Request(url, callback=callback, meta=meta)
     
     def parse_support_page(self, response):
         """Parse individual support pages"""
-        if response.url in self.visited_urls:
+        # A redirect may land on a page that was already crawled under its own URL
+        if response.meta.get('redirect_urls') and not self.visited_urls.add(self.url_policy.canonicalize(response.url)):
             return
-        self.visited_urls.add(response.url)
         
         # Determine if this is a collection page or article page
         url_path = urlparse(response.url).path
@@ -135,181 +157,147 @@ class SupportSpiderSpider(scrapy.Spider):
     
     def parse_collection_page(self, response):
         """Parse collection pages and extract article links"""
+        fields = extract_page(response)
         collection_info = {
             'url': response.url,
-            'title': response.css('title::text').get(),
-            'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
-            'description': [p.strip() for p in response.css('p::text').getall() if p.strip()],
-            'scraped_at': datetime.now().isoformat()
+            'title': fields['title'],
+            'headlines': fields['headlines'],
+            'description': fields['paragraphs'],
+            'scraped_at': fetched_at(response)
         }
         
-        self.scraped_content['collections'].append(collection_info)
+        yield WebScraperItem(kind='collection', url=response.url, data=collection_info, categories=[])
         
-        # Extract article links from collection page
-        article_links = []
-        
-        # Look for article links in various selectors
-        selectors = [
-            'a[href*="/articles/"]::attr(href)',
-            'a[href*="/posts/"]::attr(href)',
-            '.article-link::attr(href)',
-            '.post-link::attr(href)',
-            '[data-article-url]::attr(data-article-url)',
-            'a::attr(href)'  # General links that might be articles
+        # Look for article links in anchors, .article-link / .post-link elements and
+        # data-url / data-href / data-article-url attributes
+        unique_article_links = [
+            url for url in self.url_policy.links(response.url, fields['links'] + fields['extra_links'])
+            if '/articles/' in url or '/posts/' in url
         ]
-        
-        for selector in selectors:
-            links = response.css(selector).getall()
-            for link in links:
-                if link and not link.startswith(('#', 'javascript:', 'mailto:')):
-                    full_url = urljoin(response.url, link)
-                    if 'support.brightmove.com' in full_url and ('/articles/' in full_url or '/posts/' in full_url):
-                        article_links.append(full_url)
-        
-        # Also look for links in JavaScript data or other attributes
-        for link in response.css('[data-url]::attr(data-url), [data-href]::attr(data-href)').getall():
-            if link and not link.startswith(('#', 'javascript:', 'mailto:')):
-                full_url = urljoin(response.url, link)
-                if 'support.brightmove.com' in full_url and ('/articles/' in full_url or '/posts/' in full_url):
-                    article_links.append(full_url)
-        
-        # Remove duplicates
-        unique_article_links = list(set(article_links))
         self.logger.info(f"Found {len(unique_article_links)} article links in collection {response.url}")
+        links = list(self.url_policy.links(response.url, fields['links']))
+        self.link_graph.add(self.url_policy.canonicalize(response.url), unique_article_links + links)
         
         # Follow article links
-        for link in unique_article_links:
-            if link not in self.visited_urls:
-                yield scrapy.Request(link, callback=self.parse_article_page, meta={'collection_url': response.url})
+        yield from self.follow(unique_article_links, self.parse_article_page, {'collection_url': response.url})
         
         # Also follow any other links that might lead to more content
-        for link in response.css('a::attr(href)').getall():
-            if link and not link.startswith(('#', 'javascript:', 'mailto:')):
-                full_url = urljoin(response.url, link)
-                if 'support.brightmove.com' in full_url and full_url not in self.visited_urls:
-                    yield scrapy.Request(full_url, callback=self.parse_support_page, meta={'source_url': response.url})
+        yield from self.follow(links, self.parse_support_page, {'source_url': response.url})
     
     def parse_article_page(self, response):
         """Parse individual article pages"""
+        fields = extract_page(response)
         article_content = {
             'url': response.url,
-            'title': response.css('title::text').get(),
-            'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
-            'paragraphs': [p.strip() for p in response.css('p::text').getall() if p.strip()],
-            'lists': [l.strip() for l in response.css('ul li::text, ol li::text').getall() if l.strip()],
-            'code_blocks': [c.strip() for c in response.css('code::text, pre::text').getall() if c.strip()],
-            'images': [img.strip() for img in response.css('img::attr(alt)').getall() if img.strip()],
+            'title': fields['title'],
+            'headlines': fields['headlines'],
+            'paragraphs': fields['paragraphs'],
+            'lists': fields['lists'],
+            'code_blocks': fields['code_blocks'],
+            'images': fields['images'],
             'collection_url': response.meta.get('collection_url', ''),
-            'scraped_at': datetime.now().isoformat()
+            'scraped_at': fetched_at(response)
         }
         
-        self.scraped_content['articles'].append(article_content)
-        self.scraped_content['pages'].append(article_content)
-        
         # Categorize content based on URL and content
-        self.categorize_support_content(response.url, article_content)
+        categories = self.categorize_support_content(response.url, article_content)
+        
+        yield WebScraperItem(kind='article', url=response.url, data=article_content, categories=categories)
         
         # Follow any related links
-        for link in response.css('a::attr(href)').getall():
-            if link and not link.startswith(('#', 'javascript:', 'mailto:')):
-                full_url = urljoin(response.url, link)
-                if 'support.brightmove.com' in full_url and full_url not in self.visited_urls:
-                    yield scrapy.Request(full_url, callback=self.parse_support_page, meta={'source_url': response.url})
+        links = list(self.url_policy.links(response.url, fields['links']))
+        self.link_graph.add(self.url_policy.canonicalize(response.url), links)
+        yield from self.follow(links, self.parse_support_page, {'source_url': response.url})
     
     def parse_generic_page(self, response):
         """Parse generic pages that aren't clearly collections or articles"""
+        fields = extract_page(response)
         page_content = {
             'url': response.url,
-            'title': response.css('title::text').get(),
-            'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
-            'paragraphs': [p.strip() for p in response.css('p::text').getall() if p.strip()],
-            'lists': [l.strip() for l in response.css('ul li::text, ol li::text').getall() if l.strip()],
-            'code_blocks': [c.strip() for c in response.css('code::text, pre::text').getall() if c.strip()],
-            'scraped_at': datetime.now().isoformat()
+            'title': fields['title'],
+            'headlines': fields['headlines'],
+            'paragraphs': fields['paragraphs'],
+            'lists': fields['lists'],
+            'code_blocks': fields['code_blocks'],
+            'scraped_at': fetched_at(response)
         }
         
-        self.scraped_content['pages'].append(page_content)
-        
         # Categorize content based on URL and content
-        self.categorize_support_content(response.url, page_content)
+        categories = self.categorize_support_content(response.url, page_content)
+        
+        yield WebScraperItem(kind='page', url=response.url, data=page_content, categories=categories)
         
         # Follow all links to find more content
-        for link in response.css('a::attr(href)').getall():
-            if link and not link.startswith(('#', 'javascript:', 'mailto:')):
-                full_url = urljoin(response.url, link)
-                if 'support.brightmove.com' in full_url and full_url not in self.visited_urls:
-                    yield scrapy.Request(full_url, callback=self.parse_support_page, meta={'source_url': response.url})
+        links = list(self.url_policy.links(response.url, fields['links']))
+        self.link_graph.add(self.url_policy.canonicalize(response.url), links)
+        yield from self.follow(links, self.parse_support_page, {'source_url': response.url})
     
     def categorize_support_content(self, url, content):
-        """Categorize support content based on URL patterns and content"""
-        url_lower = url.lower()
-        
-        # Help articles
-        if any(keyword in url_lower for keyword in ['article', 'help', 'guide']):
-            help_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['help_articles'].extend(help_content)
-        
-        # FAQs
-        if any(keyword in url_lower for keyword in ['faq', 'question', 'answer']):
-            faq_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['faqs'].extend(faq_content)
-        
-        # Tutorials
-        if any(keyword in url_lower for keyword in ['tutorial', 'how-to', 'step-by-step']):
-            tutorial_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['tutorials'].extend(tutorial_content)
-        
-        # Technical documentation
-        if any(keyword in url_lower for keyword in ['technical', 'api', 'integration', 'developer']):
-            tech_content = content.get('headlines', []) + content.get('paragraphs', []) + content.get('code_blocks', [])
-            self.scraped_content['technical_docs'].extend(tech_content)
-        
-        # User guides
-        if any(keyword in url_lower for keyword in ['user', 'manual', 'guide', 'instruction']):
-            guide_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['user_guides'].extend(guide_content)
-        
-        # API documentation
-        if any(keyword in url_lower for keyword in ['api', 'endpoint', 'rest', 'webhook']):
-            api_content = content.get('headlines', []) + content.get('paragraphs', []) + content.get('code_blocks', [])
-            self.scraped_content['api_docs'].extend(api_content)
-        
-        # Troubleshooting
-        if any(keyword in url_lower for keyword in ['troubleshoot', 'error', 'fix', 'problem', 'issue']):
-            trouble_content = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['troubleshooting'].extend(trouble_content)
+        """Categorize support content by the URL keywords of its category profile"""
+        return self.categorizer.categorize(url)
     
     def closed(self, reason):
         """Save scraped content when spider finishes"""
         # Save all content to knowledge-base with organized structure
         self.save_organized_content()
+        self.page_store.close()
+        
+        # A finished crawl has nothing left to resume
+        if reason == 'finished':
+            self.visited_urls.discard()
+        else:
+            self.visited_urls.close()
+        
+        # The links between the pages rank them for the next crawl
+        graph = self.link_graph.close(self.start_urls, keep_state=reason != 'finished')
+        if graph is not None:
+            self.logger.info(f"Link graph: {graph['fetched']} pages parsed, {graph['links']} links, {graph['orphans']} orphaned pages")
         
         self.logger.info(f"All support content saved to {self.support_dir}")
-        self.logger.info(f"Total pages scraped: {len(self.scraped_content['pages'])}")
-        self.logger.info(f"Total articles found: {len(self.scraped_content['articles'])}")
-        self.logger.info(f"Total collections found: {len(self.scraped_content['collections'])}")
+        self.logger.info(f"Total pages scraped: {self.store_summary.count()}")
+        self.logger.info(f"Total articles found: {self.store_summary.count(('article',))}")
+        self.logger.info(f"Total collections found: {self.store_summary.count(('collection',))}")
     
     def save_organized_content(self):
         """Save content in organized structure under brightmove/support"""
         
-        # Save raw JSON data
+        # Counts and category texts for every file below, from one pass over the page store
+        self.store_summary = self.page_store.summarize(self.category_fields)
+        company_info = self.store_summary.latest('company_info')
+        
+        # Save raw JSON data, streamed from the page store; pages and categories
+        # hold references into the 'texts' table, each distinct text stored once
         raw_data_file = os.path.join(self.support_dir, 'raw_data', 'complete_scrape.json')
-        with open(raw_data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.scraped_content, f, indent=2, ensure_ascii=False)
+        with atomic_write(raw_data_file) as f, SidecarWriter(raw_data_file) as sidecar:
+            dump_json_stream(f, [
+                ('website_info', self.website_info),
+                ('company_info', company_info),
+                ('help_articles', self.store_summary.category_refs('help_articles')),
+                ('faqs', self.store_summary.category_refs('faqs')),
+                ('tutorials', self.store_summary.category_refs('tutorials')),
+                ('pages', self.page_store.pages(resolve=False)),
+                ('technical_docs', self.store_summary.category_refs('technical_docs')),
+                ('user_guides', self.store_summary.category_refs('user_guides')),
+                ('api_docs', self.store_summary.category_refs('api_docs')),
+                ('troubleshooting', self.store_summary.category_refs('troubleshooting')),
+                ('collections', self.page_store.pages(('collection',), resolve=False)),
+                ('articles', self.page_store.pages(('article',), resolve=False)),
+                ('texts', self.page_store.text_items())
+            ], sidecar)
         
         # Save support site information
-        if self.scraped_content['company_info']:
+        if company_info:
             info_file = os.path.join(self.support_dir, 'support_info.txt')
-            with open(info_file, 'w', encoding='utf-8') as f:
+            with atomic_write(info_file) as f:
                 f.write("BRIGHTMOVE SUPPORT SITE INFORMATION\n")
                 f.write("=" * 40 + "\n\n")
-                f.write(f"Title: {self.scraped_content['company_info'].get('title', 'N/A')}\n")
-                f.write(f"Description: {self.scraped_content['company_info'].get('description', 'N/A')}\n")
-                f.write(f"Scraped from: {self.scraped_content['company_info'].get('url', 'N/A')}\n")
-                f.write(f"Scraped at: {self.scraped_content['company_info'].get('scraped_at', 'N/A')}\n")
-                f.write(f"Total pages scraped: {len(self.scraped_content['pages'])}\n")
-                f.write(f"Total articles found: {len(self.scraped_content['articles'])}\n")
-                f.write(f"Total collections found: {len(self.scraped_content['collections'])}\n")
+                f.write(f"Title: {company_info.get('title', 'N/A')}\n")
+                f.write(f"Description: {company_info.get('description', 'N/A')}\n")
+                f.write(f"Scraped from: {company_info.get('url', 'N/A')}\n")
+                f.write(f"Scraped at: {company_info.get('scraped_at', 'N/A')}\n")
+                f.write(f"Total pages scraped: {self.store_summary.count()}\n")
+                f.write(f"Total articles found: {self.store_summary.count(('article',))}\n")
+                f.write(f"Total collections found: {self.store_summary.count(('collection',))}\n")
         
         # Save all categorized content
         content_categories = {
@@ -323,22 +311,22 @@ class SupportSpiderSpider(scrapy.Spider):
         }
         
         for category, title in content_categories.items():
-            if self.scraped_content[category]:
+            if self.store_summary.has_texts(category):
                 category_file = os.path.join(self.support_dir, category, f'{category}.txt')
-                with open(category_file, 'w', encoding='utf-8') as f:
+                with atomic_write(category_file) as f:
                     f.write(f"BRIGHTMOVE SUPPORT - {title}\n")
                     f.write("=" * (len(title) + 20) + "\n\n")
-                    unique_items = list(set(self.scraped_content[category]))
+                    unique_items = self.store_summary.category_texts(category)
                     for item in unique_items:
                         if item.strip():
                             f.write(f"• {item.strip()}\n")
         
         # Save comprehensive page content
         pages_file = os.path.join(self.support_dir, 'raw_data', 'all_pages.txt')
-        with open(pages_file, 'w', encoding='utf-8') as f:
+        with atomic_write(pages_file) as f:
             f.write("BRIGHTMOVE SUPPORT - ALL PAGE CONTENT\n")
             f.write("=" * 40 + "\n\n")
-            for page in self.scraped_content['pages']:
+            for page in self.page_store.pages():
                 f.write(f"URL: {page.get('url', 'N/A')}\n")
                 f.write(f"Title: {page.get('title', 'N/A')}\n")
                 f.write("-" * 50 + "\n")
@@ -357,12 +345,12 @@ class SupportSpiderSpider(scrapy.Spider):
                 f.write("\n" + "=" * 50 + "\n\n")
         
         # Save articles separately
-        if self.scraped_content['articles']:
+        if self.store_summary.count(('article',)):
             articles_file = os.path.join(self.support_dir, 'raw_data', 'articles.txt')
-            with open(articles_file, 'w', encoding='utf-8') as f:
+            with atomic_write(articles_file) as f:
                 f.write("BRIGHTMOVE SUPPORT - ALL ARTICLES\n")
                 f.write("=" * 40 + "\n\n")
-                for article in self.scraped_content['articles']:
+                for article in self.page_store.pages(('article',)):
                     f.write(f"ARTICLE: {article.get('title', 'N/A')}\n")
                     f.write(f"URL: {article.get('url', 'N/A')}\n")
                     f.write(f"Collection: {article.get('collection_url', 'N/A')}\n")
@@ -381,13 +369,15 @@ class SupportSpiderSpider(scrapy.Spider):
     def create_support_index(self):
         """Create an index file for easy navigation of support content"""
         index_file = os.path.join(self.support_dir, 'index.txt')
-        with open(index_file, 'w', encoding='utf-8') as f:
+        with atomic_write(index_file) as f:
             f.write("BRIGHTMOVE SUPPORT KNOWLEDGE BASE INDEX\n")
             f.write("=" * 50 + "\n\n")
-            f.write(f"Total Pages Scraped: {len(self.scraped_content['pages'])}\n")
-            f.write(f"Total Articles: {len(self.scraped_content['articles'])}\n")
-            f.write(f"Total Collections: {len(self.scraped_content['collections'])}\n")
-            f.write(f"Scraped At: {datetime.now().isoformat()}\n\n")
+            f.write(f"Total Pages Scraped: {self.store_summary.count()}\n")
+            f.write(f"Total Articles: {self.store_summary.count(('article',))}\n")
+            f.write(f"Total Collections: {self.store_summary.count(('collection',))}\n")
+            for line in dedup_summary(self.crawler.stats, os.path.join(self.support_dir, 'raw_data')):
+                f.write(line + "\n")
+            f.write(f"Scraped At: {self.started_at}\n\n")
             
             f.write("CONTENT CATEGORIES:\n")
             f.write("-" * 20 + "\n")
@@ -400,15 +390,15 @@ class SupportSpiderSpider(scrapy.Spider):
                 ('api_docs', 'API Documentation'),
                 ('troubleshooting', 'Troubleshooting')
             ]:
-                count = len(self.scraped_content[category])
+                count = self.store_summary.category_count(category, unique=False)
                 f.write(f"• {title}: {count} items\n")
             
             f.write("\nCOLLECTIONS FOUND:\n")
             f.write("-" * 20 + "\n")
-            for collection in self.scraped_content['collections']:
+            for collection in self.page_store.pages(('collection',)):
                 f.write(f"• {collection.get('title', 'N/A')} - {collection.get('url', 'N/A')}\n")
             
             f.write("\nSAMPLE ARTICLES:\n")
             f.write("-" * 20 + "\n")
-            for i, article in enumerate(self.scraped_content['articles'][:10]):  # Show first 10
+            for i, article in enumerate(itertools.islice(self.page_store.pages(('article',)), 10)):  # Show first 10
                 f.write(f"{i+1}. {article.get('title', 'N/A')} - {article.get('url', 'N/A')}\n") 
\ No newline at end of file
@@ -4,43 +4,196 @@ import os
 from urllib.parse import urljoin, urlparse
 from datetime import datetime
 import re
+from w3lib.url import canonicalize_url
+
+from web_scraper.categorizer import load_categorizer
+from web_scraper.checkpoint import atomic_write
+from web_scraper.dedup import dedup_summary
+from web_scraper.extraction import extract_page
+from web_scraper.frontier import enable_resumable_crawl, stored_start_pages
+from web_scraper.httpcache import fetched_at
+from web_scraper.items import WebScraperItem
+from web_scraper.link_graph import LinkGraphRecorder, open_link_graph
+from web_scraper.page_store import PageStore, dump_json_stream
+from web_scraper.revisit import RevisitHistory, budget_pages, content_digest, open_revisit_history
+from web_scraper.sidecar import SidecarWriter
+from web_scraper.sitemaps import iter_sitemap, lastmod_timestamp, robots_sitemaps, sitemap_body
+from web_scraper.validators import ValidatorStore
 
 
 class UniversalSpiderSpider(scrapy.Spider):
     name = "universal_spider"
     
-    def __init__(self, website_name=None, start_url=None, allowed_domains=None, *args, **kwargs):
+    # Unchanged pages answer conditional requests with 304 Not Modified
+    handle_httpstatus_list = [304]
+    
+    # Keyword rules and page fields for each content category (category_rules.json)
+    category_profile = 'website'
+    
+    # Page types and priorities its links are requested by (crawl_priorities.json)
+    priority_profile = 'marketing'
+    
+    # Set by web_scraper.replay when re-running a recorded crawl
+    replaying = False
+    
+    def __init__(self, website_name=None, start_url=None, allowed_domains=None, sitemaps=False,
+                 revisit_budget=None, revisit_reused=None, *args, **kwargs):
         super(UniversalSpiderSpider, self).__init__(*args, **kwargs)
+        self.categorizer = load_categorizer(self.category_profile)
+        self.category_fields = self.categorizer.fields
         
         # Set website-specific parameters
         self.website_name = website_name or 'unknown_website'
         self.start_urls = [start_url] if start_url else []
+        # "scrapy crawl -a allowed_domains=a.com,b.com" passes a comma-separated string
+        if isinstance(allowed_domains, str):
+            allowed_domains = [domain.strip() for domain in allowed_domains.split(',') if domain.strip()]
         self.allowed_domains = allowed_domains or []
+        # "-a sitemaps=1": discover pages from the site's sitemaps first
+        self.use_sitemaps = str(sitemaps).lower() in ('1', 'true', 'yes')
+        # "-a revisit_budget=10%" (or a page count): only refresh the pages
+        # most likely to have changed, reusing the rest (see web_scraper.revisit)
+        self.revisit_budget = revisit_budget or None
+        # A replay of a refresh passes the pages it reused, which were never fetched
+        self.revisit_reused = revisit_reused or []
         
         # Create knowledge-base directory structure
         self.knowledge_base_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'knowledge-base')
         self.website_content_dir = os.path.join(self.knowledge_base_dir, 'website_content')
         self.create_directory_structure()
         
-        # Track scraped content
-        self.scraped_content = {
-            'website_info': {
-                'name': self.website_name,
-                'start_url': start_url,
-                'scraped_at': datetime.now().isoformat()
-            },
-            'company_info': {},
-            'features': [],
-            'solutions': [],
-            'pages': [],
-            'pricing': [],
-            'testimonials': [],
-            'case_studies': [],
-            'technical_specs': [],
-            'products': [],
-            'services': []
+        # A replay passes the start time of the crawl it reproduces
+        self.started_at = kwargs.get('started_at') or datetime.now().isoformat()
+        self.website_info = {
+            'name': self.website_name,
+            'start_url': start_url,
+            'scraped_at': self.started_at
         }
+        
+        # Recorded with the crawl by the HTTP cache, so replays can reproduce it
+        self.crawl_args = {
+            'website_name': self.website_name,
+            'start_url': start_url,
+            'allowed_domains': self.allowed_domains,
+            'sitemaps': self.use_sitemaps,
+            'revisit_budget': self.revisit_budget,
+            'started_at': self.started_at
+        }
+        
+        # Scraped records are streamed to disk by WebScraperPipeline
+        self.page_store_path = os.path.join(self.website_content_dir, self.website_name, 'raw_data', 'pages.jsonl')
+        self.page_store = PageStore(self.page_store_path)
+        
+        # ETag/Last-Modified validators from earlier crawls of this site
+        self.validator_store = ValidatorStore(os.path.join(self.website_content_dir, self.website_name, 'raw_data', 'validators.sqlite'))
+        self.crawl_counts = {'fetched': 0, 'unchanged': 0, 'new': 0, 'sitemap_urls': 0, 'sitemap_skipped': 0,
+                             'revisit_planned': 0, 'revisit_reused': 0}
+        
+        # Sitemap discovery state: pages listed so far (canonical URLs, not
+        # followed again from links) and sitemaps requested or still pending
+        self.sitemap_urls = set()
+        self.seen_sitemaps = set()
+        self.pending_sitemaps = 0
+        self.start_page_requested = False
+        self.last_success = self.load_last_success()
+        
+        # Pages a refresh reused without fetching (canonical URLs, not followed from links)
+        self.reused_urls = set()
+        
+        # Links between pages, recorded once from_crawler opens the site's graph
+        self.link_graph = LinkGraphRecorder()
+        
+        # How often each page changed, opened by from_crawler
+        self.revisit_history = RevisitHistory()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super(UniversalSpiderSpider, cls).from_crawler(crawler, *args, **kwargs)
+        # Keep the frontier and seen-URL filter on disk so a killed crawl resumes
+        enable_resumable_crawl(crawler, spider, os.path.join(os.path.dirname(spider.page_store_path), 'crawl_state'))
+        spider.link_graph = open_link_graph(crawler, spider, os.path.dirname(spider.page_store_path))
+        spider.revisit_history = open_revisit_history(crawler, spider, os.path.dirname(spider.page_store_path))
+        return spider
+
+    def load_last_success(self):
+        """Start time of the last crawl of this site that finished, from crawl_summary.json"""
+        summary_file = os.path.join(self.website_content_dir, self.website_name, 'raw_data', 'crawl_summary.json')
+        try:
+            with open(summary_file, encoding='utf-8') as f:
+                last_success = json.load(f).get('last_success')
+        except (OSError, ValueError):
+            return None
+        return datetime.fromisoformat(last_success).timestamp() if last_success else None
+
+    async def start(self):
+        # A resumed crawl does not parse the start pages it already stored again
+        self.parsed_start_pages = stored_start_pages(self)
+        
+        if self.replaying and self.revisit_reused:
+            # Not in the recording; their stored records are what the refresh emitted
+            for item in self.reuse_pages(self.revisit_reused):
+                yield item
+        
+        if self.revisit_budget and not self.replaying:
+            if self.resuming:
+                # The rest of the interrupted refresh is in the queue on disk
+                return
+            known = self.validator_store.urls()
+            if known:
+                for result in self.revisit_plan(known):
+                    yield result
+                return
+            self.logger.info("No page of this site has been stored yet; crawling it in full")
+        
+        if not self.use_sitemaps:
+            for request in self.start_page_requests():
+                yield request
+            return
+        
+        # Sitemaps first; the start page follows once they have all been read
+        for url in self.start_urls:
+            self.pending_sitemaps += 1
+            yield scrapy.Request(urljoin(url, '/robots.txt'), callback=self.parse_robots,
+                                 errback=self.sitemap_failed, dont_filter=True,
+                                 meta={'handle_httpstatus_list': [404, 410]})
 
+    def start_page_requests(self):
+        """Request the start pages that have not been stored yet"""
+        for url in self.start_urls:
+            if url not in self.parsed_start_pages:
+                yield scrapy.Request(url, callback=self.parse, dont_filter=True)
+    
+    def revisit_plan(self, known):
+        """Fetch the start pages and the known pages the revisit budget allows; reuse the others"""
+        budget = budget_pages(self.revisit_budget, len(known) + len(self.start_urls))
+        plan = self.revisit_history.plan(known, budget, always=self.start_urls)
+        self.crawl_counts['revisit_planned'] = len(plan)
+        self.logger.info(f"Refreshing {len(plan)} of {len(known)} known pages")
+        # Marked before the start page can be parsed, so its links to them are not followed
+        planned = set(plan)
+        reused = [url for url in known if url not in planned]
+        self.reused_urls.update(canonicalize_url(url) for url in reused)
+        # Recorded with the crawl (the HTTP cache updates it at close), so a replay can reuse them too
+        self.crawl_args['revisit_reused'] = reused
+        for url in plan:
+            if url in self.start_urls:
+                yield scrapy.Request(url, callback=self.parse, dont_filter=True)
+            else:
+                yield self.page_request(url)
+        
+        yield from self.reuse_pages(reused)
+    
+    def reuse_pages(self, urls):
+        """Re-emit the records stored for pages a refresh did not fetch"""
+        for url in urls:
+            stored = self.validator_store.lookup(url)
+            if stored is None:
+                continue
+            self.crawl_counts['revisit_reused'] += 1
+            self.link_graph.carry(url)
+            for record in stored[2]:
+                yield WebScraperItem(**record)
+    
     def create_directory_structure(self):
         """Create organized directory structure in knowledge-base/website_content"""
         # Main knowledge-base structure
@@ -88,124 +241,255 @@ class UniversalSpiderSpider(scrapy.Spider):
 
     def parse(self, response):
         """Parse the main page and extract key information"""
+        # The start request may also be in the queue of a resumed crawl
+        if response.url in self.parsed_start_pages:
+            return
+        self.parsed_start_pages.add(response.url)
+        fields = extract_page(response)
+        
         # Extract company information
         company_info = {
             'url': response.url,
-            'title': response.css('title::text').get(),
-            'description': response.css('meta[name="description"]::attr(content)').get(),
-            'keywords': response.css('meta[name="keywords"]::attr(content)').get(),
-            'scraped_at': datetime.now().isoformat()
+            'title': fields['title'],
+            'description': fields['description'],
+            'keywords': fields['keywords'],
+            'scraped_at': fetched_at(response)
         }
         
         # Extract main content sections
         main_content = {
-            'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
-            'paragraphs': [p.strip() for p in response.css('p::text').getall() if p.strip()],
-            'features': [f.strip() for f in response.css('[class*="feature"], [class*="benefit"]::text').getall() if f.strip()],
-            'cta_text': [c.strip() for c in response.css('[class*="button"], [class*="cta"]::text').getall() if c.strip()],
-            'navigation': [n.strip() for n in response.css('nav a::text').getall() if n.strip()]
+            'headlines': fields['headlines'],
+            'paragraphs': fields['paragraphs'],
+            'features': fields['features'],
+            'cta_text': fields['cta_text'],
+            'navigation': fields['navigation']
         }
         
-        self.scraped_content['company_info'] = company_info
-        self.scraped_content['pages'].append({
+        yield WebScraperItem(kind='company_info', url=response.url, data=company_info, categories=[])
+        yield WebScraperItem(kind='page', url=response.url, data={
             'url': response.url,
             'content': main_content
-        })
+        }, categories=[])
+        self.revisit_history.observe(response.url, content_digest(main_content))
         
         # Follow links to other pages
-        for link in response.css('a::attr(href)').getall():
+        links = self.site_links(response.url, fields['links'])
+        self.link_graph.add(response.url, links)
+        for full_url in links:
+            # Pages a sitemap listed are already scheduled (or known unchanged),
+            # and a refresh reused the pages it did not plan to fetch
+            key = canonicalize_url(full_url)
+            if key not in self.sitemap_urls and key not in self.reused_urls:
+                yield self.page_request(full_url)
+    
+    def site_links(self, base_url, links):
+        """Absolute URLs of the links to pages of the allowed domains"""
+        urls = []
+        for link in links:
             if link and not link.startswith(('#', 'javascript:', 'mailto:')):
-                full_url = urljoin(response.url, link)
+                full_url = urljoin(base_url, link)
                 if any(domain in full_url for domain in self.allowed_domains):
-                    yield scrapy.Request(full_url, callback=self.parse_page)
+                    urls.append(full_url)
+        return urls
+    
+    def page_request(self, url, conditional=True, meta=None):
+        """Build a page request, conditional on the validators stored for the URL"""
+        headers = self.validator_store.conditional_headers(url) if conditional else {}
+        return scrapy.Request(url, callback=self.parse_page, headers=headers, dont_filter=not conditional, meta=meta)
+    
+    def parse_robots(self, response):
+        """Request the sitemaps robots.txt lists (or /sitemap.xml)"""
+        for url in robots_sitemaps(response):
+            yield from self.sitemap_request(url)
+        yield from self.sitemap_finished()
+    
+    def sitemap_request(self, url):
+        """Request a sitemap once, counting it as pending until it is read"""
+        if url in self.seen_sitemaps:
+            return
+        self.seen_sitemaps.add(url)
+        self.pending_sitemaps += 1
+        yield scrapy.Request(url, callback=self.parse_sitemap, errback=self.sitemap_failed, dont_filter=True)
+    
+    def parse_sitemap(self, response):
+        """Follow a sitemap index, or schedule the pages of a url set by their lastmod"""
+        max_size = response.meta.get('download_maxsize', self.settings.getint('DOWNLOAD_MAXSIZE'))
+        body = sitemap_body(response, max_size)
+        if body is None:
+            self.logger.warning(f"Ignoring {response.url}: not a sitemap")
+        else:
+            for kind, loc, lastmod in iter_sitemap(body):
+                loc = urljoin(response.url, loc)
+                if kind == 'sitemap':
+                    yield from self.sitemap_request(loc)
+                elif any(domain in loc for domain in self.allowed_domains):
+                    yield from self.sitemap_page(loc, lastmod)
+        yield from self.sitemap_finished()
+    
+    def sitemap_page(self, url, lastmod):
+        """Schedule a page a sitemap lists, unless it has not changed since the last crawl"""
+        key = canonicalize_url(url)
+        # The start page is fetched (and its links followed) after the sitemaps
+        if key in self.sitemap_urls or any(canonicalize_url(start) == key for start in self.start_urls):
+            return
+        self.sitemap_urls.add(key)
+        self.crawl_counts['sitemap_urls'] += 1
+        
+        modified = lastmod_timestamp(lastmod)
+        if modified is not None and self.last_success is not None and modified < self.last_success:
+            stored = self.validator_store.lookup(url)
+            if stored is not None:
+                self.crawl_counts['sitemap_skipped'] += 1
+                self.link_graph.carry(url)
+                self.revisit_history.observe(url)
+                for record in stored[2]:
+                    yield WebScraperItem(**record)
+                return
+        yield self.page_request(url, meta={'sitemap_lastmod': lastmod})
+    
+    def sitemap_failed(self, failure):
+        """A sitemap (or robots.txt) could not be fetched; carry on without it"""
+        self.logger.warning(f"Sitemap {failure.request.url} failed: {failure.getErrorMessage()}")
+        if failure.request.callback == self.parse_robots:
+            yield from self.sitemap_request(urljoin(failure.request.url, '/sitemap.xml'))
+        yield from self.sitemap_finished()
+    
+    def sitemap_finished(self):
+        """Once every sitemap is read, fetch the start page and follow the links no sitemap listed"""
+        self.pending_sitemaps -= 1
+        if self.pending_sitemaps > 0 or self.start_page_requested:
+            return
+        self.start_page_requested = True
+        self.logger.info(
+            f"Sitemaps listed {self.crawl_counts['sitemap_urls']} pages, "
+            f"{self.crawl_counts['sitemap_skipped']} unchanged since the last crawl"
+        )
+        yield from self.start_page_requests()
     
     def parse_page(self, response):
         """Parse individual pages"""
+        if response.status == 304:
+            yield from self.reuse_unchanged_page(response)
+            return
+        
+        if self.validator_store.lookup(response.url) is None:
+            self.crawl_counts['new'] += 1
+        self.crawl_counts['fetched'] += 1
+        
+        fields = extract_page(response)
         page_content = {
             'url': response.url,
-            'title': response.css('title::text').get(),
-            'headlines': [h.strip() for h in response.css('h1, h2, h3::text').getall() if h.strip()],
-            'paragraphs': [p.strip() for p in response.css('p::text').getall() if p.strip()],
-            'lists': [l.strip() for l in response.css('ul li::text, ol li::text').getall() if l.strip()],
-            'scraped_at': datetime.now().isoformat()
+            'title': fields['title'],
+            'headlines': fields['headlines'],
+            'paragraphs': fields['paragraphs'],
+            'lists': fields['lists'],
+            'scraped_at': fetched_at(response)
         }
         
-        self.scraped_content['pages'].append(page_content)
-        
         # Categorize content based on URL and content
-        self.categorize_content(response.url, page_content)
+        categories = self.categorize_content(response.url, page_content)
+        
+        item = WebScraperItem(kind='page', url=response.url, data=page_content, categories=categories)
+        self.validator_store.remember(response, [dict(item)])
+        self.revisit_history.observe(response.url, content_digest(page_content))
+        # Only the start page's links are followed, but every page's are part of the graph
+        self.link_graph.add(response.url, self.site_links(response.url, fields['links']))
+        yield item
+    
+    def reuse_unchanged_page(self, response):
+        """Re-emit the records stored for a page the server reports as unchanged"""
+        stored = self.validator_store.lookup(response.url)
+        if stored is None:
+            # Validators came from another URL (e.g. across a redirect); fetch in full
+            yield self.page_request(response.url, conditional=False)
+            return
+        
+        self.crawl_counts['unchanged'] += 1
+        self.link_graph.carry(response.url)
+        self.revisit_history.observe(response.url)
+        for record in stored[2]:
+            yield WebScraperItem(**record)
     
     def categorize_content(self, url, content):
-        """Categorize content based on URL patterns and content"""
-        url_lower = url.lower()
-        
-        # Features
-        if any(keyword in url_lower for keyword in ['feature', 'capability', 'functionality']):
-            features = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['features'].extend(features)
-        
-        # Solutions
-        if any(keyword in url_lower for keyword in ['solution', 'use-case', 'industry']):
-            solutions = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['solutions'].extend(solutions)
-        
-        # Pricing
-        if any(keyword in url_lower for keyword in ['pricing', 'price', 'cost', 'plan']):
-            pricing = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['pricing'].extend(pricing)
-        
-        # Testimonials
-        if any(keyword in url_lower for keyword in ['testimonial', 'review', 'customer']):
-            testimonials = content.get('paragraphs', [])
-            self.scraped_content['testimonials'].extend(testimonials)
-        
-        # Case Studies
-        if any(keyword in url_lower for keyword in ['case-study', 'case', 'success']):
-            case_studies = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['case_studies'].extend(case_studies)
-        
-        # Technical specs
-        if any(keyword in url_lower for keyword in ['technical', 'spec', 'api', 'integration']):
-            tech_specs = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['technical_specs'].extend(tech_specs)
-        
-        # Products
-        if any(keyword in url_lower for keyword in ['product', 'platform', 'software']):
-            products = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['products'].extend(products)
-        
-        # Services
-        if any(keyword in url_lower for keyword in ['service', 'consulting', 'support']):
-            services = content.get('headlines', []) + content.get('paragraphs', [])
-            self.scraped_content['services'].extend(services)
+        """Categorize content by the URL keywords of its category profile"""
+        return self.categorizer.categorize(url)
     
     def closed(self, reason):
         """Save scraped content when spider finishes"""
         # Save all content to knowledge-base with organized structure
         self.save_organized_content()
+        self.page_store.close()
+        self.validator_store.close()
+        self.revisit_history.close()
+        
+        # The links between the pages rank them for the next crawl
+        graph = self.link_graph.close(self.start_urls, keep_state=reason != 'finished')
+        if graph is not None:
+            self.logger.info(f"Link graph: {graph['fetched']} pages parsed, {graph['links']} links, {graph['orphans']} orphaned pages")
+        
+        # Record how much of the site actually changed since the last crawl;
+        # a replay fetched nothing, so it keeps the live crawl's summary
+        if not self.replaying:
+            summary_file = os.path.join(self.website_content_dir, self.website_name, 'raw_data', 'crawl_summary.json')
+            # Sitemap lastmods are compared with the start of the last crawl that
+            # finished; a refresh that reused pages did not check them all
+            complete = reason == 'finished' and not self.crawl_counts['revisit_reused']
+            last_success = self.started_at if complete else (
+                self.last_success and datetime.fromtimestamp(self.last_success).isoformat()
+            )
+            # The budget that cut the crawl short, if one did
+            budget = self.crawler.stats.get_value('budget/exhausted') or self.crawler.stats.get_value('budget/soft_exhausted')
+            with atomic_write(summary_file) as f:
+                json.dump(dict(self.crawl_counts, reason=reason, started_at=self.started_at,
+                               finished_at=datetime.now().isoformat(), last_success=last_success,
+                               budget_exhausted=budget), f, indent=2)
         
         self.logger.info(f"All scraped content saved to {self.website_content_dir}/{self.website_name}")
+        self.logger.info(
+            f"Pages fetched: {self.crawl_counts['fetched']}, unchanged: {self.crawl_counts['unchanged']}, "
+            f"new: {self.crawl_counts['new']}"
+        )
     
     def save_organized_content(self):
         """Save content in organized structure under website_content/[website_name]"""
         website_dir = os.path.join(self.website_content_dir, self.website_name)
+        os.makedirs(os.path.join(website_dir, 'raw_data'), exist_ok=True)
+        # Counts and category texts for every file below, from one pass over the page store
+        self.store_summary = self.page_store.summarize(self.category_fields)
+        company_info = self.store_summary.latest('company_info')
         
-        # Save raw JSON data
+        # Save raw JSON data, streamed from the page store; pages and categories
+        # hold references into the 'texts' table, each distinct text stored once
         raw_data_file = os.path.join(website_dir, 'raw_data', 'complete_scrape.json')
-        with open(raw_data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.scraped_content, f, indent=2, ensure_ascii=False)
+        with atomic_write(raw_data_file) as f, SidecarWriter(raw_data_file) as sidecar:
+            dump_json_stream(f, [
+                ('website_info', self.website_info),
+                ('company_info', company_info),
+                ('features', self.store_summary.category_refs('features')),
+                ('solutions', self.store_summary.category_refs('solutions')),
+                ('pages', self.page_store.pages(resolve=False)),
+                ('pricing', self.store_summary.category_refs('pricing')),
+                ('testimonials', self.store_summary.category_refs('testimonials')),
+                ('case_studies', self.store_summary.category_refs('case_studies')),
+                ('technical_specs', self.store_summary.category_refs('technical_specs')),
+                ('products', self.store_summary.category_refs('products')),
+                ('services', self.store_summary.category_refs('services')),
+                ('texts', self.page_store.text_items())
+            ], sidecar)
         
         # Save company information
-        if self.scraped_content['company_info']:
-            company_file = os.path.join(website_dir, 'company', 'company_overview.txt')
-            with open(company_file, 'w', encoding='utf-8') as f:
+        if company_info:
+            company_dir = os.path.join(website_dir, 'company')
+            os.makedirs(company_dir, exist_ok=True)
+            company_file = os.path.join(company_dir, 'company_overview.txt')
+            with atomic_write(company_file) as f:
                 f.write(f"{self.website_name.upper()} COMPANY OVERVIEW\n")
                 f.write("=" * 50 + "\n\n")
-                f.write(f"Title: {self.scraped_content['company_info'].get('title', 'N/A')}\n")
-                f.write(f"Description: {self.scraped_content['company_info'].get('description', 'N/A')}\n")
-                f.write(f"Keywords: {self.scraped_content['company_info'].get('keywords', 'N/A')}\n")
-                f.write(f"Scraped from: {self.scraped_content['company_info'].get('url', 'N/A')}\n")
-                f.write(f"Scraped at: {self.scraped_content['company_info'].get('scraped_at', 'N/A')}\n")
+                f.write(f"Title: {company_info.get('title', 'N/A')}\n")
+                f.write(f"Description: {company_info.get('description', 'N/A')}\n")
+                f.write(f"Keywords: {company_info.get('keywords', 'N/A')}\n")
+                f.write(f"Scraped from: {company_info.get('url', 'N/A')}\n")
+                f.write(f"Scraped at: {company_info.get('scraped_at', 'N/A')}\n")
         
         # Save all categorized content
         content_categories = {
@@ -220,12 +504,14 @@ class UniversalSpiderSpider(scrapy.Spider):
         }
         
         for category, title in content_categories.items():
-            if self.scraped_content[category]:
-                category_file = os.path.join(website_dir, category, f'{category}.txt')
-                with open(category_file, 'w', encoding='utf-8') as f:
+            if self.store_summary.has_texts(category):
+                category_dir = os.path.join(website_dir, category)
+                os.makedirs(category_dir, exist_ok=True)
+                category_file = os.path.join(category_dir, f'{category}.txt')
+                with atomic_write(category_file) as f:
                     f.write(f"{self.website_name.upper()} {title}\n")
                     f.write("=" * (len(title) + 10) + "\n\n")
-                    unique_items = list(set(self.scraped_content[category]))
+                    unique_items = self.store_summary.category_texts(category)
                     for item in unique_items:
                         if item.strip():
                             if category == 'testimonials':
@@ -235,10 +521,10 @@ class UniversalSpiderSpider(scrapy.Spider):
         
         # Save comprehensive page content
         pages_file = os.path.join(website_dir, 'raw_data', 'all_pages.txt')
-        with open(pages_file, 'w', encoding='utf-8') as f:
+        with atomic_write(pages_file) as f:
             f.write(f"{self.website_name.upper()} ALL PAGE CONTENT\n")
             f.write("=" * 35 + "\n\n")
-            for page in self.scraped_content['pages']:
+            for page in self.page_store.pages():
                 f.write(f"URL: {page.get('url', 'N/A')}\n")
                 f.write(f"Title: {page.get('title', 'N/A')}\n")
                 f.write("-" * 50 + "\n")
@@ -269,7 +555,7 @@ class UniversalSpiderSpider(scrapy.Spider):
     def create_website_index(self, website_dir):
         """Create a summary index file for the specific website"""
         index_file = os.path.join(website_dir, 'index.txt')
-        with open(index_file, 'w', encoding='utf-8') as f:
+        with atomic_write(index_file) as f:
             f.write(f"{self.website_name.upper()} WEBSITE CONTENT INDEX\n")
             f.write("=" * 40 + "\n\n")
             f.write(f"This directory contains scraped content from {self.website_name}'s website.\n\n")
@@ -288,13 +574,15 @@ class UniversalSpiderSpider(scrapy.Spider):
             
             f.write("CONTENT SUMMARY:\n")
             f.write("-" * 20 + "\n")
-            f.write(f"Total pages scraped: {len(self.scraped_content['pages'])}\n")
-            f.write(f"Features found: {len(set(self.scraped_content['features']))}\n")
-            f.write(f"Solutions found: {len(set(self.scraped_content['solutions']))}\n")
-            f.write(f"Pricing items: {len(set(self.scraped_content['pricing']))}\n")
-            f.write(f"Testimonials: {len(set(self.scraped_content['testimonials']))}\n")
-            f.write(f"Case studies: {len(set(self.scraped_content['case_studies']))}\n")
-            f.write(f"Technical specs: {len(set(self.scraped_content['technical_specs']))}\n")
-            f.write(f"Products: {len(set(self.scraped_content['products']))}\n")
-            f.write(f"Services: {len(set(self.scraped_content['services']))}\n")
-            f.write(f"Scraped at: {datetime.now().isoformat()}\n") 
\ No newline at end of file
+            f.write(f"Total pages scraped: {self.store_summary.count()}\n")
+            f.write(f"Features found: {self.store_summary.category_count('features')}\n")
+            f.write(f"Solutions found: {self.store_summary.category_count('solutions')}\n")
+            f.write(f"Pricing items: {self.store_summary.category_count('pricing')}\n")
+            f.write(f"Testimonials: {self.store_summary.category_count('testimonials')}\n")
+            f.write(f"Case studies: {self.store_summary.category_count('case_studies')}\n")
+            f.write(f"Technical specs: {self.store_summary.category_count('technical_specs')}\n")
+            f.write(f"Products: {self.store_summary.category_count('products')}\n")
+            f.write(f"Services: {self.store_summary.category_count('services')}\n")
+            for line in dedup_summary(self.crawler.stats, os.path.join(website_dir, 'raw_data')):
+                f.write(line + "\n")
+            f.write(f"Scraped at: {self.started_at}\n")
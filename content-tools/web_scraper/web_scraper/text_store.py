@@ -0,0 +1,100 @@
+"""
+Content-addressed store for the text of scraped pages
+
+Headers, footers, navigation and boilerplate paragraphs repeat on every page
+of a site, and the same paragraph is filed under several categories. The
+page store therefore keeps each distinct text once, in raw_data/texts.sqlite,
+keyed by a short hash of its content; pages hold lists of those hashes
+instead of the text itself. Texts are numbered in the order they were first
+seen, so everything written from the store comes out in a deterministic
+order.
+"""
+
+import hashlib
+import os
+import sqlite3
+
+
+# SQLite's default limit on the number of ? parameters in one statement
+MAX_VARIABLES = 900
+
+
+def text_id(text):
+    """Content hash used as the reference to a text"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class TextStore:
+    """SQLite table holding each distinct text once, keyed by its text_id()"""
+
+    # Commit after this many new texts rather than after every page
+    COMMIT_EVERY = 500
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        # The implicit rowid keeps first-seen order
+        self.conn.execute('CREATE TABLE IF NOT EXISTS texts (id TEXT PRIMARY KEY, text TEXT NOT NULL)')
+        # References filed under each category, once each, in first-seen order
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS category_refs (category TEXT NOT NULL, id TEXT NOT NULL, PRIMARY KEY (category, id))'
+        )
+        self._pending = 0
+
+    def clear(self):
+        self.conn.execute('DELETE FROM texts')
+        self.conn.commit()
+
+    def intern(self, text):
+        """Store a text if it is new and return its reference"""
+        ref = text_id(text)
+        cursor = self.conn.execute('INSERT OR IGNORE INTO texts (id, text) VALUES (?, ?)', (ref, text))
+        if cursor.rowcount:
+            self._pending += 1
+            if self._pending >= self.COMMIT_EVERY:
+                self.conn.commit()
+                self._pending = 0
+        return ref
+
+    def commit(self):
+        """Make every text interned so far durable"""
+        self.conn.commit()
+        self._pending = 0
+
+    def lookup(self, refs):
+        """Return a dict mapping each of the given references to its text"""
+        refs = list(set(refs))
+        texts = {}
+        for start in range(0, len(refs), MAX_VARIABLES):
+            chunk = refs[start:start + MAX_VARIABLES]
+            placeholders = ','.join('?' * len(chunk))
+            texts.update(self.conn.execute(f'SELECT id, text FROM texts WHERE id IN ({placeholders})', chunk))
+        return texts
+
+    def items(self):
+        """Stream (reference, text) pairs in first-seen order"""
+        yield from self.conn.execute('SELECT id, text FROM texts ORDER BY rowid')
+
+    def clear_categories(self):
+        self.conn.execute('DELETE FROM category_refs')
+
+    def file_refs(self, category, refs):
+        """File references under a category; returns how many it did not hold yet"""
+        cursor = self.conn.executemany(
+            'INSERT OR IGNORE INTO category_refs (category, id) VALUES (?, ?)', [(category, ref) for ref in refs]
+        )
+        return cursor.rowcount
+
+    def category_refs(self, category):
+        """Stream the references filed under a category, in first-seen order"""
+        for (ref,) in self.conn.execute('SELECT id FROM category_refs WHERE category = ? ORDER BY rowid', (category,)):
+            yield ref
+
+    def count(self):
+        return self.conn.execute('SELECT COUNT(*) FROM texts').fetchone()[0]
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
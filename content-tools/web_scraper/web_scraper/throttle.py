@@ -0,0 +1,145 @@
+"""
+Latency- and error-driven throttling of each downloader slot (domain)
+
+Every domain starts at the project's CONCURRENT_REQUESTS_PER_DOMAIN and
+DOWNLOAD_DELAY and is then adjusted by additive increase, multiplicative
+decrease (AIMD) from what its responses show:
+
+- a healthy response while the average latency is under the target lowers
+  the delay by a fixed step, and once the delay is at its floor adds one
+  concurrent request per round of responses;
+- an average latency over the target halves concurrency, and at the
+  concurrency floor raises the delay to the latency itself;
+- a 5xx, 429 or download error halves concurrency and doubles the delay;
+- a Retry-After header drops to the concurrency floor and holds the delay
+  at least that long, with no increase until it has passed.
+
+Decreases happen at most once per round trip, so one burst of concurrent
+failures counts once. Every change is logged with its reason.
+"""
+
+import time
+from email.utils import parsedate_to_datetime
+
+
+# Statuses that mean the server is overloaded or refusing us
+OVERLOAD_STATUSES = frozenset((429, 500, 502, 503, 504, 520, 521, 522, 523, 524))
+
+
+def retry_after_seconds(value):
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP-date), or None"""
+    if not value:
+        return None
+    value = value.decode('latin-1') if isinstance(value, bytes) else value
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class DomainThrottle:
+    """Adaptive concurrency and delay of one domain, within its floors and ceilings"""
+
+    # Weight of the newest sample in the latency and error averages
+    SMOOTHING = 0.2
+
+    def __init__(self, domain, concurrency, delay, min_concurrency=1, max_concurrency=8,
+                 min_delay=0.25, max_delay=60.0, target_latency=2.0, delay_step=0.1):
+        self.domain = domain
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.target_latency = target_latency
+        self.delay_step = delay_step
+        self.window = float(min(max(concurrency, min_concurrency), max_concurrency))
+        self.delay = min(max(delay, min_delay), max_delay)
+        self.latency = None
+        self.error_rate = 0.0
+        self.hold_until = 0.0
+        self.last_decrease = 0.0
+        self.responses = 0
+        self.decreases = {}
+
+    @property
+    def concurrency(self):
+        return int(self.window)
+
+    def settings(self):
+        """Current per-domain settings, for logs and stats"""
+        return {
+            'concurrency': self.concurrency,
+            'delay': round(self.delay, 2),
+            'latency': round(self.latency, 2) if self.latency is not None else None,
+            'error_rate': round(self.error_rate, 3),
+            'responses': self.responses,
+            'decreases': dict(self.decreases)
+        }
+
+    def _observe(self, latency, error):
+        self.responses += 1
+        if latency is not None:
+            self.latency = latency if self.latency is None else (
+                self.SMOOTHING * latency + (1 - self.SMOOTHING) * self.latency
+            )
+        self.error_rate = self.SMOOTHING * error + (1 - self.SMOOTHING) * self.error_rate
+
+    def _may_decrease(self, now):
+        # One decrease per round trip: responses to requests sent before the
+        # last decrease say nothing new
+        return now - self.last_decrease >= max(self.latency or 0.0, self.delay)
+
+    def _decrease(self, now, reason, delay):
+        self.window = max(float(self.min_concurrency), self.window / 2)
+        self.delay = min(self.max_delay, max(self.min_delay, delay))
+        self.last_decrease = now
+        self.decreases[reason] = self.decreases.get(reason, 0) + 1
+        return reason
+
+    def response(self, status, latency, retry_after=None, now=None):
+        """Update from a response; returns the reason for a change, or None"""
+        now = time.monotonic() if now is None else now
+        overloaded = status in OVERLOAD_STATUSES
+        self._observe(latency, 1.0 if overloaded else 0.0)
+
+        if retry_after is not None:
+            self.hold_until = max(self.hold_until, now + retry_after)
+            self.window = float(self.min_concurrency)
+            self.delay = min(self.max_delay, max(self.delay, retry_after))
+            self.last_decrease = now
+            self.decreases['retry-after'] = self.decreases.get('retry-after', 0) + 1
+            return f"HTTP {status} with Retry-After {retry_after:.0f}s"
+        if overloaded:
+            if self._may_decrease(now):
+                return self._decrease(now, f"HTTP {status}", max(self.delay * 2, 1.0))
+            return None
+        if self.latency is not None and self.latency > self.target_latency:
+            if self._may_decrease(now):
+                delay = self.latency if self.window <= self.min_concurrency else self.delay
+                return self._decrease(now, 'latency', delay)
+            return None
+        return self._increase(now)
+
+    def failure(self, reason, now=None):
+        """Update from a download error (timeout, refused connection, ...)"""
+        now = time.monotonic() if now is None else now
+        self._observe(None, 1.0)
+        if self._may_decrease(now):
+            return self._decrease(now, reason, max(self.delay * 2, 1.0))
+        return None
+
+    def _increase(self, now):
+        if now < self.hold_until:
+            return None
+        if self.delay > self.min_delay:
+            self.delay = max(self.min_delay, self.delay - self.delay_step)
+            return 'healthy'
+        if self.window < self.max_concurrency:
+            before = self.concurrency
+            self.window = min(float(self.max_concurrency), self.window + 1 / self.window)
+            if self.concurrency != before:
+                return 'healthy'
+        return None
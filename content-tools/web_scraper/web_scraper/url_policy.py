@@ -0,0 +1,102 @@
+"""
+URL canonicalization and per-site allow/deny policies
+
+A support site links to the same article through many URLs: other locales,
+search-result pages, query-string and fragment variants, and links carrying
+tracking parameters. Spiders run every link through a UrlPolicy before
+scheduling it. canonicalize() collapses the variants of a URL into one form
+and allows() applies the site's rules from url_policies.json, compiled into
+a single allow and a single deny regex, so each page is requested once.
+"""
+
+import json
+import os
+import re
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from w3lib.url import canonicalize_url
+
+
+POLICIES_FILE = os.path.join(os.path.dirname(__file__), 'url_policies.json')
+
+# Query parameters that only track where a click came from
+TRACKING_PARAMS = frozenset((
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', '_hsenc', '_hsmi', 'hsctatracking', 'mkt_tok', 'ref', 'source'
+))
+TRACKING_PREFIXES = ('utm_',)
+
+# Links that never lead to a page
+SKIPPED_PREFIXES = ('#', 'javascript:', 'mailto:', 'tel:')
+
+
+def _compile(patterns):
+    if not patterns:
+        return None
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns))
+
+
+class UrlPolicy:
+    """Canonical form and allow/deny rules for the URLs of one site"""
+
+    def __init__(self, allow=(), deny=(), keep_query=True):
+        self.allow = _compile(allow)
+        self.deny = _compile(deny)
+        self.keep_query = keep_query
+
+    def canonicalize(self, url):
+        """Canonical form of an absolute URL
+
+        Drops the fragment, tracking parameters (or the whole query string
+        when the site's pages do not depend on it) and default ports, and
+        normalizes case, percent-encoding and query parameter order.
+        """
+        parts = urlsplit(url)
+        netloc = parts.netloc.lower()
+        if (parts.scheme, parts.port) in (('http', 80), ('https', 443)):
+            netloc = netloc.rsplit(':', 1)[0]
+        query = ''
+        if self.keep_query:
+            query = urlencode([
+                (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                if name.lower() not in TRACKING_PARAMS and not name.lower().startswith(TRACKING_PREFIXES)
+            ])
+        return canonicalize_url(urlunsplit((parts.scheme.lower(), netloc, parts.path or '/', query, '')))
+
+    def allows(self, url):
+        """Whether a canonical URL may be crawled"""
+        if self.deny is not None and self.deny.search(url):
+            return False
+        return self.allow is None or self.allow.search(url) is not None
+
+    def links(self, base_url, links):
+        """Canonical, allowed, distinct URLs for the links found on a page"""
+        seen = set()
+        for link in links:
+            link = link.strip() if link else ''
+            if not link or link.startswith(SKIPPED_PREFIXES):
+                continue
+            try:
+                url = self.canonicalize(urljoin(base_url, link))
+            except ValueError:
+                # A malformed link (a port that is not a number, say) is skipped, not the whole page
+                continue
+            if url not in seen and self.allows(url):
+                seen.add(url)
+                yield url
+
+
+def load_url_policy(site, path=POLICIES_FILE):
+    """Return the UrlPolicy for a site from the policies file
+
+    A site without an entry gets a policy that canonicalizes but allows
+    every URL.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        policies = json.load(f)
+    policy = policies.get(site, {})
+    return UrlPolicy(
+        allow=policy.get('allow', ()),
+        deny=policy.get('deny', ()),
+        keep_query=policy.get('keep_query', True)
+    )
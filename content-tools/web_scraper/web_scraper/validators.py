@@ -0,0 +1,97 @@
+"""
+Persisted HTTP validators for incremental recrawls
+
+For every page a spider has extracted, the store keeps the ETag and
+Last-Modified headers it was served with, plus the records extracted from
+it. The next crawl sends those validators as If-None-Match /
+If-Modified-Since; a 304 response then reuses the stored records without
+downloading or parsing the page again.
+"""
+
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+
+class ValidatorStore:
+    """SQLite table of per-URL validators and the records extracted with them"""
+
+    # Commit after this many writes rather than after every page
+    COMMIT_EVERY = 100
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS validators ('
+            ' url TEXT PRIMARY KEY,'
+            ' etag TEXT,'
+            ' last_modified TEXT,'
+            ' records TEXT NOT NULL,'
+            ' updated_at TEXT NOT NULL)'
+        )
+        self._pending = 0
+
+    def lookup(self, url):
+        """Return (etag, last_modified, records) for a URL, or None if never stored"""
+        row = self.conn.execute(
+            'SELECT etag, last_modified, records FROM validators WHERE url = ?', (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2])
+
+    def conditional_headers(self, url):
+        """Request headers that make the server answer 304 if the page is unchanged"""
+        stored = self.lookup(url)
+        if stored is None:
+            return {}
+        etag, last_modified, _ = stored
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def remember(self, response, records):
+        """Store the validators of a 200 response with the records extracted from it"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        self.store(
+            response.url,
+            records,
+            etag=etag.decode('latin-1') if etag else None,
+            last_modified=last_modified.decode('latin-1') if last_modified else None
+        )
+
+    def store(self, url, records, etag=None, last_modified=None):
+        """Store the records extracted for a URL, with its validators if it has any"""
+        self.conn.execute(
+            'INSERT OR REPLACE INTO validators (url, etag, last_modified, records, updated_at)'
+            ' VALUES (?, ?, ?, ?, ?)',
+            (url, etag, last_modified, json.dumps(records, ensure_ascii=False), datetime.now().isoformat())
+        )
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+    def delete(self, url):
+        """Forget a URL and the records stored for it"""
+        self.conn.execute('DELETE FROM validators WHERE url = ?', (url,))
+        self._pending += 1
+        if self._pending >= self.COMMIT_EVERY:
+            self.conn.commit()
+            self._pending = 0
+
+    def urls(self):
+        """Every URL with stored records"""
+        return [row[0] for row in self.conn.execute('SELECT url FROM validators ORDER BY rowid')]
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()